@@ -1,11 +1,36 @@
+import contextvars
+import json
+import os
+import threading
 import dash
-from dash import dcc, html
-from sqlalchemy import create_engine, func
-from sqlalchemy.orm import sessionmaker
+from dash import dcc, html, ClientsideFunction, Input, Output, State, MATCH
+from flask import Response, has_request_context, jsonify, request
+from sqlalchemy import func, select
 from datetime import date 
-import pandas as pd
-import plotly.express as px
-from database_setup import Base, Race, Result, Driver 
+# 注意：pandas / plotly.express 不在這裡載入，而是延後到第一次建立圖表或表格時
+# (函數內 import)；若有預先輸出的靜態檔案，則完全不需要載入 (加快冷啟動)
+from database_setup import Race, Result, Driver, RatingHistory, get_data_version
+from league_pool import LeagueMiddleware, LeagueSession, current_league, league_pool
+from write_api import register_write_api, writer_queue
+from db_backup import start_backup_scheduler
+from snapshot_store import SNAPSHOT_DIR, load_shared_snapshot, save_shared_snapshot
+from async_queries import get_driver_drilldown, get_race_drilldown, season_order
+from driver_stats import compute_driver_stats, stats_records
+from teammate_battles import compute_teammate_battles
+from season_archive import (archived_position_counts, archived_race_results, archived_races, archived_seasons,
+                            season_of, season_standings)
+from whatif import (apply_edits_to_compact, countback_index, fetch_original_results, normalize_edit,
+                    upsert_edit, whatif_delta_rows, whatif_standings)
+from driver_ratings import update_ratings
+from change_log import register_change_feed
+from data_export import register_export_routes
+from standings_ranking import countback_standings
+from compact_frame import category_labels, combined_labels, compact_results_frame
+from standings_trajectory import compute_position_trajectory, create_bump_figure
+from query_cache import query_cache
+from standings_images import register_image_routes
+from league_view import (CHART_TOP_N, TABLE_PAGE_SIZE, chart_height, compact_view, search_driver_names,
+                         table_page, top_names)
 
 # ====================================================================
 # A. 全局設定與顏色配置
@@ -21,9 +46,9 @@ TEAM_COLORS = {
 # ----------------------------------------------------
 # 1. 資料庫連線設定
 # ----------------------------------------------------
-engine = create_engine('sqlite:///f1_records.db')
-Base.metadata.bind = engine
-Session = sessionmaker(bind=engine)
+# 每個聯賽有自己的資料庫 (league_pool)：Session() 回傳目前網址所屬聯賽的 session，
+# 沒有聯賽前綴 (以及命令列工具) 時使用預設聯賽 f1_records.db
+Session = LeagueSession()
 
 # ====================================================================
 # B. 數據查詢和圖表函數定義
@@ -32,26 +57,35 @@ Session = sessionmaker(bind=engine)
 # ----------------------------------------------------
 # 1. 獲取總積分排名 (用於排序基準)
 # ----------------------------------------------------
-def get_total_standings():
-    """從資料庫中獲取並計算總積分排名"""
+@query_cache.memoize
+def get_driver_position_counts():
+    """每位車手每個名次一列 (次數 + 積分)：積分榜與假設情境 (whatif) 共用的彙總"""
     session = Session()
     ranking_data = (session.query(
         Driver.name,
         Driver.team,
-        func.sum(Result.points).label('Total_Points') 
+        Result.position,
+        func.count(Result.result_id).label('Count'),
+        func.sum(Result.points).label('Points')
     )
     .join(Result, Driver.driver_id == Result.driver_id)
-    .group_by(Driver.driver_id, Driver.name, Driver.team)
-    .order_by(func.sum(Result.points).desc()) 
+    .group_by(Driver.driver_id, Driver.name, Driver.team, Result.position)
     .all())
     
     session.close()
-    df = pd.DataFrame(ranking_data, columns=['Driver', 'Team', 'Total_Points'])
-    return df
+    import pandas as pd
+    return pd.DataFrame(ranking_data, columns=['Driver', 'Team', 'Position', 'Count', 'Points'])
+
+@query_cache.memoize
+def get_total_standings():
+    """從資料庫中獲取並計算總積分排名 (同分依 F1 countback：冠軍次數、亞軍次數...)"""
+    # 排序交給 countback_standings
+    return countback_standings(get_driver_position_counts(), ['Driver', 'Team'])
 
 # ----------------------------------------------------
 # 2. 獲取詳細單場成績 (必須包含日期 Race_Date)
 # ----------------------------------------------------
+@query_cache.memoize
 def get_detailed_results():
     """從資料庫中獲取每位選手在每場比賽的詳細成績"""
     session = Session()
@@ -70,8 +104,10 @@ def get_detailed_results():
     .all())
     
     session.close()
+    import pandas as pd
     df = pd.DataFrame(detailed_data, columns=['Driver', 'Team', 'Race_Name', 'Race_Type', 'Race_Date', 'Points', 'Position'])
-    return df
+    # 類別欄位 / 小整數 / datetime (compact_frame)，大型聯賽的快照佔用的記憶體少很多
+    return compact_results_frame(df)
 
 # ----------------------------------------------------
 # 3. 繪製車手總積分圖表 (修正為非堆疊式 + 車隊顏色 + 高分在上)
@@ -82,14 +118,18 @@ def create_ranking_figure(df_detailed):
     2. 按比賽日期順序堆疊
     3. 右側顯示總分標籤
     """
-    # --- 步驟 A: 取得車手全局排序 (總分高的在前) ---
-    df_standings = get_total_standings()
+    # --- 步驟 A: 取得車手全局排序 (總分高的在前)；大型聯賽只畫前 CHART_TOP_N 名 ---
+    df_standings = get_total_standings().head(CHART_TOP_N)
     driver_order = df_standings['Driver'].tolist()
     
     # --- 步驟 B: 確保詳細資料是按日期排序 ---
+    df_detailed = df_detailed[df_detailed['Driver'].isin(driver_order)]
     df_detailed = df_detailed.sort_values(by=['Driver', 'Race_Date'], ascending=[True, True])
+    # 滑鼠提示顯示日期 (不含時間)
+    df_detailed = df_detailed.assign(Race_Date=df_detailed['Race_Date'].dt.strftime('%Y-%m-%d'))
     
     # --- 步驟 C: 繪圖 ---
+    import plotly.express as px
     fig = px.bar(
         df_detailed, 
         x='Points',      
@@ -99,19 +139,19 @@ def create_ranking_figure(df_detailed):
         orientation='h', 
         hover_data={'Points': True, 'Race_Name': True, 'Race_Date': True},
         color_discrete_map=TEAM_COLORS,
-        height=600,
+        height=chart_height(len(driver_order), 600),
         # 🚨 修正點：Plotly 從下往上畫，原本 driver_order 是 [高, 中, 低]
         # 傳入 [高, 中, 低] 會讓「高」在最下面。所以我們需要它反轉成 [低, 中, 高]
         # 這樣最高的「高」就會被畫在最上面。
         category_orders={"Driver": driver_order[::-1]} 
     )
 
-    # --- 步驟 D: 添加右側總分標籤 ---
+    # --- 步驟 D: 添加右側總分標籤 (同分時註明 countback 依據) ---
     for i, row in df_standings.iterrows():
         fig.add_annotation(
             x=row['Total_Points'],
             y=row['Driver'],
-            text=f"<b>{row['Total_Points']}</b>", 
+            text=total_label(row), 
             showarrow=False,
             xanchor='left',
             xshift=10,
@@ -131,32 +171,56 @@ def create_ranking_figure(df_detailed):
 # ----------------------------------------------------
 # 4. 獲取車隊總積分 (用於排序基準)
 # ----------------------------------------------------
-def get_team_standings():
+@query_cache.memoize
+def get_team_position_counts():
     session = Session()
 
+    # 車隊的 countback 計入旗下所有車手的名次
     team_points = session.query(
         Driver.team.label('Team'), 
-        func.sum(Result.points).label('Total_Points')
+        Result.position,
+        func.count(Result.result_id).label('Count'),
+        func.sum(Result.points).label('Points')
     )\
     .join(Result, Driver.driver_id == Result.driver_id) \
-    .group_by(Driver.team) \
-    .order_by(func.sum(Result.points).desc()).all()
+    .group_by(Driver.team, Result.position).all()
     
     session.close()
     
-    df_team_standings = pd.DataFrame(team_points, columns=['Team', 'Total_Points'])
-    return df_team_standings
+    import pandas as pd
+    return pd.DataFrame(team_points, columns=['Team', 'Position', 'Count', 'Points'])
+
+@query_cache.memoize
+def get_team_standings():
+    return countback_standings(get_team_position_counts(), ['Team'])
+
+# 假設情境用的 countback 索引 (每個資料版本建立一次，之後只套用差異)
+@query_cache.memoize
+def get_driver_countback_index():
+    return countback_index(get_driver_position_counts(), get_total_standings(), ['Driver', 'Team'])
+
+@query_cache.memoize
+def get_team_countback_index():
+    return countback_index(get_team_position_counts(), get_team_standings(), ['Team'])
+
+def total_label(row):
+    """排名圖右側的總分標籤；同分時附上 countback 依據 (例如 P1×2 P2×1)"""
+    if row['Tiebreak']:
+        return f"<b>{row['Total_Points']}</b> ({row['Tiebreak']})"
+    return f"<b>{row['Total_Points']}</b>"
 
 # ----------------------------------------------------
 # 5. 繪製車隊總積分排名圖表 (修正為非堆疊式 + 車隊顏色 + 高分在上)
 # ----------------------------------------------------
 def create_team_ranking_figure(df_detailed):
-    df_team_standings = get_team_standings() 
+    df_team_standings = get_team_standings().head(CHART_TOP_N)
     team_order = df_team_standings['Team'].tolist()
     
     # 車隊也依照日期排序堆疊
+    df_detailed = df_detailed[df_detailed['Team'].isin(team_order)]
     df_detailed = df_detailed.sort_values(by=['Team', 'Race_Date'], ascending=[True, True])
     
+    import plotly.express as px
     fig = px.bar(
         df_detailed, 
         x='Points',      
@@ -165,7 +229,7 @@ def create_team_ranking_figure(df_detailed):
         title='**車隊總積分組成**',
         orientation='h',       
         color_discrete_map=TEAM_COLORS,
-        height=400,
+        height=chart_height(len(team_order), 400),
         # 🚨 同理：反轉順序讓最高分在最上面 🚨
         category_orders={"Team": team_order[::-1]}
     )
@@ -174,7 +238,7 @@ def create_team_ranking_figure(df_detailed):
         fig.add_annotation(
             x=row['Total_Points'],
             y=row['Team'],
-            text=f"<b>{row['Total_Points']}</b>",
+            text=total_label(row),
             showarrow=False,
             xanchor='left',
             xshift=10,
@@ -192,6 +256,104 @@ def create_team_ranking_figure(df_detailed):
     
     return fig
 # ----------------------------------------------------
+# 6. 分類積分彙總 (正賽 / 衝刺賽)：一次查詢同時得到車手與車隊的分類積分
+# ----------------------------------------------------
+@query_cache.memoize
+def get_type_rollup():
+    """按 (車手, 比賽類型) 彙總積分；車隊的分類積分由同一份結果加總，不必再查一次"""
+    session = Session()
+    rollup_data = (session.query(
+        Driver.name,
+        Driver.team,
+        Race.type,
+        func.sum(Result.points).label('Points')
+    )
+    .join(Result, Driver.driver_id == Result.driver_id)
+    .join(Race, Race.race_id == Result.race_id)
+    .group_by(Driver.driver_id, Driver.name, Driver.team, Race.type)
+    .all())
+
+    session.close()
+    import pandas as pd
+    df = pd.DataFrame(rollup_data, columns=['Driver', 'Team', 'Race_Type', 'Points'])
+    return df
+
+def build_type_standings(df_rollup, driver_order=None, team_order=None):
+    """
+    由分類彙總產生車手與車隊的分類積分榜
+    欄位：Driver/Team、每種比賽類型一欄 (例如 Race_Points / Sprint_Points)、Total_Points
+    driver_order / team_order 是總排名的順序 (countback 後)，用來決定同分者的先後
+    """
+    def pivot(index, order):
+        df = df_rollup.pivot_table(index=index, columns='Race_Type', values='Points', aggfunc='sum', fill_value=0)
+        df.columns = [f'{race_type}_Points' for race_type in df.columns]
+        df['Total_Points'] = df.sum(axis=1)
+        df = df.reset_index()
+        if order is not None:
+            return df.set_index(index[0]).reindex([name for name in order if name in set(df[index[0]])]).reset_index()
+        return df.sort_values('Total_Points', ascending=False, kind='stable')
+
+    return {
+        'driver': pivot(['Driver', 'Team'], driver_order),
+        'team': pivot(['Team'], team_order),
+    }
+
+def get_race_drilldown_options():
+    """單場深入分析的下拉選單 (依賽季順序，value 為 race_id)；同名的比賽加上日期區分"""
+    session = Session()
+    try:
+        rows = session.execute(select(Race.race_id, Race.name, Race.date)
+                               .where(Race.race_id.in_(select(Result.race_id)))
+                               .order_by(*season_order())).all()
+    finally:
+        session.close()
+    names = [row.name for row in rows]
+    return [{'label': row.name if names.count(row.name) == 1 else f'{row.name} ({row.date})', 'value': row.race_id}
+            for row in rows]
+
+# ----------------------------------------------------
+# 7. 車手評分 (Elo) 走勢：評分由 driver_ratings.update_ratings 逐場增量計算
+# ----------------------------------------------------
+@query_cache.memoize
+def get_rating_history():
+    """讀取每位車手每場比賽的賽後評分 (依賽季中的先後排序，與排名走勢圖相同)"""
+    session = Session()
+    history_data = (session.query(
+        Driver.name.label('Driver'),
+        Driver.team.label('Team'),
+        Race.name.label('Race_Name'),
+        RatingHistory.race_date.label('Race_Date'),
+        RatingHistory.rating_after.label('Rating')
+    )
+    .join(RatingHistory, Driver.driver_id == RatingHistory.driver_id)
+    .join(Race, Race.race_id == RatingHistory.race_id)
+    .order_by(*season_order(), Driver.name)
+    .all())
+
+    session.close()
+    import pandas as pd
+    df = pd.DataFrame(history_data, columns=['Driver', 'Team', 'Race_Name', 'Race_Date', 'Rating'])
+    df['Rating'] = df['Rating'].astype(float).round(1)
+    return df
+
+def create_rating_figure(df_rating_history, driver_order):
+    """每位車手一條線；X 軸依比賽順序 (同一天有衝刺賽與正賽，不用日期當 X 軸)"""
+    import plotly.express as px
+    fig = px.line(
+        df_rating_history,
+        x='Race_Name',
+        y='Rating',
+        color='Driver',
+        markers=True,
+        title='**車手評分走勢 (Elo)**',
+        hover_data={'Team': True, 'Race_Date': True},
+        category_orders={'Race_Name': df_rating_history['Race_Name'].drop_duplicates().tolist(), 'Driver': driver_order},
+        height=500,
+    )
+    fig.update_layout(xaxis_title="比賽", yaxis_title="評分", legend_title_text="車手")
+    return fig
+
+# ----------------------------------------------------
 # 輔助函數：提取 GP 名稱
 # ----------------------------------------------------
 def extract_gp_name(race_name):
@@ -458,8 +620,7 @@ race_data = [
 # 6. 車手數據初始化 (確保車手存在)
 # ----------------------------------------------------
 def create_initial_drivers():
-    Session_temp = sessionmaker(bind=engine)
-    session = Session_temp()
+    session = Session()
     
     initial_drivers = [
         {'name': 'mimicethan', 'team': 'McLaren'},
@@ -483,12 +644,15 @@ def create_initial_drivers():
     session.close()
     print("--- 車手數據已確保存在於資料庫中 ---")
 def insert_all_race_data():
-    Session_temp = sessionmaker(bind=engine)
-    session = Session_temp()
+    session = Session()
     
     print("--- 正在檢查並插入所有比賽數據 ---")
+    # 已封存的賽季 (season_archive.py) 不再寫回熱資料庫
+    archived = set(archived_seasons(session))
     
     for race_info in race_data:
+        if season_of(race_info['date']) in archived:
+            continue
         race = find_or_create_race(session, race_info['name'], race_info['type'], race_info['date']) 
         
         for result_info in race_info['results']:
@@ -531,93 +695,938 @@ def insert_all_race_data():
 # 🚨 步驟 1: 數據庫初始化 🚨
 create_initial_drivers()
 insert_all_race_data() 
+# 補上新比賽的評分 (寫入端計算；儀表板只讀取評分)
+update_ratings(Session)
 # -----------------------------------------------------------------
 
 # 初始化 Dash 應用程式 (server 變量用於 Gunicorn 部署)
-app = dash.Dash(__name__)
+class LeagueDash(dash.Dash):
+    """瀏覽器端的 Dash 請求 (_dash-layout、_dash-update-component...) 加上聯賽前綴 /leagues/<名稱>"""
+    def _config(self):
+        config = super()._config()
+        config['requests_pathname_prefix'] = league_prefix() + config['requests_pathname_prefix']
+        return config
+
+    def get_relative_path(self, path):
+        return league_prefix() + super().get_relative_path(path)
+
+def league_prefix():
+    # LeagueMiddleware 把聯賽前綴放在 SCRIPT_NAME (Flask 的 request.script_root)
+    return request.script_root if has_request_context() else ''
+
+app = LeagueDash(__name__)
 server = app.server
+server.wsgi_app = LeagueMiddleware(server.wsgi_app)
+# 聯賽被淘汰 (LRU) 時一併丟掉它的查詢快取
+league_pool.on_evict.append(query_cache.invalidate)
 
 # --- A. 數據準備和圖表/表格創建 ---
 
-# 1. 獲取總積分排名數據 (Total Standings) - 用於排序
-df_standings = get_total_standings() 
+def build_dashboard_snapshot():
+    """從資料庫重新計算整個儀表板需要的資料 (排名、圖表、詳細表格)；只讀取，不寫入 (評分見 schedule_rating_update)"""
+    # 1. 獲取總積分排名數據 (Total Standings) - 用於排序
+    df_standings = get_total_standings() 
 
-# 2. 獲取詳細單場數據 (Detailed Results) - 🚨 必須先定義 df_detailed 🚨
-df_detailed = get_detailed_results()
+    # 2. 獲取詳細單場數據 (Detailed Results) - 🚨 必須先定義 df_detailed 🚨
+    df_detailed = get_detailed_results()
 
-# 3. 處理 df_detailed 並創建 'GP_Name' 欄位（用於修正計數錯誤）
-df_detailed['GP_Name'] = df_detailed['Race_Name'].apply(extract_gp_name)
-# 修正後的總大獎賽場次 (4 個 GP)
-total_grand_prix_count = len(df_detailed['GP_Name'].unique())
+    # 3. 處理 df_detailed 並創建 'GP_Name' 欄位（用於修正計數錯誤）
+    # 只對每個比賽名稱 (類別) 計算一次，不必每一列呼叫
+    df_detailed['GP_Name'] = category_labels(df_detailed['Race_Name'], extract_gp_name)
+    # 修正後的總大獎賽場次 (4 個 GP)
+    total_grand_prix_count = len(df_detailed['GP_Name'].unique())
 
-# 4. 創建圖表 (現在 df_detailed 已經定義，使用 df_standings 繪製總分)
-ranking_fig = create_ranking_figure(df_detailed) # 車手總分圖
+    # 4. 創建圖表 (現在 df_detailed 已經定義，使用 df_standings 繪製總分)
+    ranking_fig = create_ranking_figure(df_detailed) # 車手總分圖
 
-# 5. 創建車隊總積分圖表 (使用 df_detailed 繪製總分)
-team_ranking_fig = create_team_ranking_figure(df_detailed) 
+    # 5. 創建車隊總積分圖表 (使用 df_detailed 繪製總分)
+    team_ranking_fig = create_team_ranking_figure(df_detailed) 
 
-# --- 樞紐分析 (用於詳細表格) ---
-# 將 'Race_Type' 和 'Points/Position' 進行合併，以便進行樞紐分析
-df_detailed['Col_Name'] = df_detailed['Race_Type'] + '_' + df_detailed['Race_Name']
+    # --- 樞紐分析 (用於詳細表格) ---
+    # 將 'Race_Type' 和 'Points/Position' 進行合併，以便進行樞紐分析
+    df_detailed['Col_Name'] = combined_labels(df_detailed['Race_Type'], df_detailed['Race_Name'])
 
-# 執行樞紐分析 (Pivot): 以 Driver 和 Team 為索引，Col_Name 為欄位
-df_pivot = df_detailed.pivot_table(
-    index=['Driver', 'Team'], 
-    columns='Col_Name', 
-    values=['Points', 'Position'], 
-    aggfunc='first'
-).reset_index()
+    # 執行樞紐分析 (Pivot): 以 Driver 和 Team 為索引，Col_Name 為欄位
+    df_pivot = df_detailed.pivot_table(
+        index=['Driver', 'Team'], 
+        columns='Col_Name', 
+        values=['Points', 'Position'], 
+        aggfunc='first',
+        observed=True
+    ).reset_index()
 
-# 調整欄位名稱，使其更清晰
-df_pivot.columns = ['Driver', 'Team'] + [f'{col[0]}_{col[1]}' for col in df_pivot.columns.tolist() if col[0] in ['Driver', 'Team', 'Points', 'Position'] and col[0] not in ['Driver', 'Team']]
+    # 調整欄位名稱，使其更清晰
+    df_pivot.columns = ['Driver', 'Team'] + [f'{col[0]}_{col[1]}' for col in df_pivot.columns.tolist() if col[0] in ['Driver', 'Team', 'Points', 'Position'] and col[0] not in ['Driver', 'Team']]
 
-# 💡 NEW STEP: 合併車手總積分到詳細表格
-df_pivot_merged = pd.merge(
-    df_pivot,
-    df_standings[['Driver', 'Total_Points']],
-    on='Driver',
-    how='left'
-)
+    # 💡 NEW STEP: 合併車手總積分到詳細表格
+    import pandas as pd
+    df_pivot_merged = pd.merge(
+        df_pivot,
+        df_standings[['Driver', 'Total_Points']],
+        on='Driver',
+        how='left'
+    )
+
+    # 排序欄位以便顯示，並將 'Total_Points' 放在 'Team' 後面
+    desired_cols = ['Driver', 'Team', 'Total_Points'] + sorted([col for col in df_pivot_merged.columns if col not in ['Driver', 'Team', 'Total_Points']], key=lambda x: (x.split('_')[1], x.split('_')[0]))
+
+    df_final_table = df_pivot_merged[desired_cols]
+
+    snapshot = {
+        'df_standings': df_standings,
+        'df_detailed': df_detailed,
+        'total_grand_prix_count': total_grand_prix_count,
+        'ranking_fig': ranking_fig,
+        'team_ranking_fig': team_ranking_fig,
+        'df_final_table': df_final_table,
+    }
+    # 網頁直接使用的欄位 (預先輸出的靜態檔案也提供相同欄位)
+    snapshot['data_source_text'] = format_data_source_text(snapshot)
+    snapshot['table_columns'] = table_columns(df_final_table)
+    # 深入分析的下拉選單 (車手依總分排序、比賽依日期排序)；其他車手用名稱搜尋
+    snapshot['driver_options'] = top_names(df_standings['Driver'].tolist())
+    # 分類積分榜 (正賽 / 衝刺賽 / 合計)，車手與車隊來自同一份彙總
+    df_type_rollup = get_type_rollup()
+    df_team_standings = get_team_standings()
+    type_standings = build_type_standings(df_type_rollup, df_standings['Driver'].tolist(), df_team_standings['Team'].tolist())
+    snapshot['df_type_rollup'] = df_type_rollup
+    snapshot['df_team_standings'] = df_team_standings
+    snapshot['type_standings'] = {
+        'driver': type_standings['driver'].to_dict('records'),
+        'team': type_standings['team'].to_dict('records'),
+    }
+    snapshot['race_options'] = df_detailed.sort_values('Race_Date')['Race_Name'].drop_duplicates().tolist()
+    # 單場深入分析以 race_id 查詢 (比賽名稱可能重複)
+    snapshot['race_drilldown_options'] = get_race_drilldown_options()
+    # 車手成績統計 (冠軍、頒獎台、平均名次...)，一次 groupby 算完
+    snapshot['driver_stats'] = stats_records(compute_driver_stats(df_detailed, df_standings['Driver'].tolist()))
+    # 隊友對決 (同車隊、同場比賽一次 self-merge)
+    snapshot['teammate_battles'] = stats_records(compute_teammate_battles(df_detailed, df_standings['Driver'].tolist()))
+    # 給瀏覽器端篩選用的精簡欄式資料
+    snapshot['results_compact'] = SNAPSHOT_DERIVED['results_compact'](snapshot)
+    # 車手評分走勢 (放在積分圖旁邊)
+    df_rating_history = get_rating_history()
+    snapshot['df_rating_history'] = df_rating_history
+    # 走勢圖每位車手一條線，同樣只畫前 CHART_TOP_N 名
+    chart_drivers = top_names(df_standings['Driver'].tolist())
+    chart_teams = top_names(df_team_standings['Team'].tolist())
+    snapshot['rating_fig'] = create_rating_figure(
+        df_rating_history[df_rating_history['Driver'].isin(chart_drivers)], chart_drivers)
+    # 每站賽後的名次走勢 (bump chart)，車手與車隊各一次向量化計算 (名次以全部車手計算)
+    df_driver_trajectory = compute_position_trajectory(df_detailed, 'Driver')
+    df_team_trajectory = compute_position_trajectory(df_detailed, 'Team')
+    snapshot['driver_bump_fig'] = create_bump_figure(
+        df_driver_trajectory[df_driver_trajectory['Driver'].isin(chart_drivers)], 'Driver', '**每站賽後車手名次走勢**')
+    snapshot['team_bump_fig'] = create_bump_figure(
+        df_team_trajectory[df_team_trajectory['Team'].isin(chart_teams)], 'Team', '**每站賽後車隊名次走勢**', TEAM_COLORS)
+    return snapshot
+
+# ----------------------------------------------------
+# 精簡欄式資料：車手 / 車隊 / 比賽都換成整數代碼，只送一次到瀏覽器
+# ----------------------------------------------------
+def build_compact_results(df_detailed, df_standings, df_type_rollup, df_team_standings):
+    """
+    d / r / p / pos 四個欄位是每筆成績的 車手代碼 / 比賽代碼 / 積分 / 名次 (依比賽日期排序，沒有名次為 null)
+    drivers / teams 依總排名 (countback) 排序；driver_team、race_type 是對照表的代碼
+    driver_type_points[車手代碼][類型代碼] 是分類彙總，瀏覽器端直接用來排序與標示總分
+    type_position_counts[類型代碼] 是全聯賽各名次的次數 [[名次, 次數], ...]，決定 countback 比較哪些名次
+    (與 standings_ranking.countback_standings 的 P 欄位相同)
+    """
+    import pandas as pd
+    df = df_detailed.sort_values(['Race_Date', 'Race_Name'], kind='stable')
+    drivers = df_standings['Driver'].tolist()
+    teams = df_team_standings['Team'].tolist()
+    races = df.drop_duplicates('Race_Name')
+    types = sorted(races['Race_Type'].unique().tolist())
+    finishes = df.dropna(subset=['Position'])
+    position_counts = finishes.groupby([finishes['Race_Type'].astype(str), finishes['Position'].astype(int)]).size()
+    driver_type_points = (df_type_rollup
+        .pivot_table(index='Driver', columns='Race_Type', values='Points', aggfunc='sum', fill_value=0)
+        .reindex(index=drivers, columns=types, fill_value=0))
+    return {
+        'drivers': drivers,
+        'driver_team': pd.Categorical(df_standings['Team'], categories=teams).codes.tolist(),
+        'teams': teams,
+        'team_colors': [TEAM_COLORS.get(team) for team in teams],
+        'races': races['Race_Name'].tolist(),
+        'race_dates': races['Race_Date'].astype('datetime64[ns]').dt.strftime('%Y-%m-%d').tolist(),
+        'race_type': pd.Categorical(races['Race_Type'], categories=types).codes.tolist(),
+        'types': types,
+        'd': pd.Categorical(df['Driver'], categories=drivers).codes.tolist(),
+        'r': pd.Categorical(df['Race_Name'], categories=races['Race_Name'].tolist()).codes.tolist(),
+        'p': df['Points'].astype(int).tolist(),
+        'pos': df['Position'].astype('Int64').astype(object).where(df['Position'].notna(), None).tolist(),
+        'driver_type_points': driver_type_points.astype(int).values.tolist(),
+        'type_position_counts': [[[int(position), int(count)] for (race_type, position), count in position_counts.items()
+                                  if race_type == t] for t in types],
+    }
+
+# 共用快照 (snapshot_store) 不存這些欄位，讀取的 worker 第一次用到時才從 DataFrame 計算
+SNAPSHOT_DERIVED = {
+    'results_compact': lambda snapshot: build_compact_results(
+        snapshot['df_detailed'], snapshot['df_standings'], snapshot['df_type_rollup'], snapshot['df_team_standings']),
+}
+
+def detailed_table(snapshot):
+    """詳細表格的資料：有 df_final_table 時直接分頁 DataFrame，預先輸出的檔案則是 records"""
+    if 'df_final_table' in snapshot:
+        return snapshot['df_final_table']
+    return snapshot['table_data']
+
+# ----------------------------------------------------
+# 預先輸出的檔案 (export_static.py)：版本相符時直接讀取，不必載入 pandas / plotly
+# ----------------------------------------------------
+PRECOMPUTED_DIR = os.environ.get('F1_PRECOMPUTED_DIR', 'static_site')
+# 寫在 data/meta.json 內的小型欄位
+META_VIEWS = ('data_source_text', 'driver_options', 'race_options', 'race_drilldown_options', 'type_standings',
+              'driver_stats', 'teammate_battles')
+
+def load_precomputed_snapshot(version, base_dir=PRECOMPUTED_DIR):
+    """讀取與目前資料版本相符的預先輸出檔案；不存在或版本不符時回傳 None"""
+    def read_json(rel_path):
+        with open(os.path.join(base_dir, rel_path), encoding='utf-8') as f:
+            return json.load(f)
+    try:
+        manifest = read_json('manifest.json')
+        # 前 N 名的設定不同時，圖表與 results.json 的內容也不同
+        if manifest.get('data_version') != version or manifest.get('chart_top_n') != CHART_TOP_N:
+            return None
+        meta = read_json('data/meta.json')
+        table = read_json('data/table.json')
+        snapshot = {
+            'ranking_fig': read_json('data/driver_ranking.json'),
+            'team_ranking_fig': read_json('data/team_ranking.json'),
+            'rating_fig': read_json('data/rating_history.json'),
+            'driver_bump_fig': read_json('data/driver_bump.json'),
+            'team_bump_fig': read_json('data/team_bump.json'),
+            'table_columns': table['columns'],
+            'table_data': table['data'],
+            'results_compact': read_json('data/results.json'),
+        }
+        snapshot.update({name: meta[name] for name in META_VIEWS})
+        return snapshot
+    except (OSError, ValueError, KeyError):
+        return None
+
+# ----------------------------------------------------
+# 資料版本快取：只有 data_version 改變時才重新計算 (每個聯賽各自一份，見 league_pool.League)
+# ----------------------------------------------------
+# stale-while-revalidate：已經有快照時，版本改變後仍先回傳舊快照，
+# 由背景執行緒重新計算，算好才替換 (觀眾不必等待重算)。
+# single-flight：每個 process 每個聯賽同時只有一次重算 (league.refresh_lock)；
+# 第一次 (還沒有任何快照) 或 full=True 時才在請求中同步計算。
+def get_current_data_version():
+    """讀取資料庫中的 data_version (由觸發器維護)"""
+    with current_league().engine.connect() as conn:
+        return get_data_version(conn)
 
-# 排序欄位以便顯示，並將 'Total_Points' 放在 'Team' 後面
-desired_cols = ['Driver', 'Team', 'Total_Points'] + sorted([col for col in df_pivot_merged.columns if col not in ['Driver', 'Team', 'Total_Points']], key=lambda x: (x.split('_')[1], x.split('_')[0]))
+def sync_query_cache():
+    """
+    其他 process 寫入不會觸發本 process 的 commit 事件：直接讀取 memoize 查詢前先呼叫，
+    data_version 改變時清除查詢快取。回傳目前的資料版本
+    """
+    version = get_current_data_version()
+    query_cache.invalidate_for_version(version)
+    return version
+
+def load_or_build_snapshot(league, version, full=False):
+    snapshot = None if full else load_precomputed_snapshot(version, league.data_dir(PRECOMPUTED_DIR))
+    # 其他 worker 已經算好的共用快照 (mmap，不必查詢資料庫)
+    snapshot = snapshot or load_shared_snapshot(version, league.data_dir(SNAPSHOT_DIR), SNAPSHOT_DERIVED)
+    if snapshot is None:
+        snapshot = build_dashboard_snapshot()
+        save_shared_snapshot(version, snapshot, league.data_dir(SNAPSHOT_DIR))
+    return snapshot
+
+def get_dashboard_snapshot(full=False):
+    """
+    取得儀表板資料，回傳 (快照的資料版本, 快照)；版本改變時回傳舊快照並在背景重算
+    full=True 時保證是目前版本且包含 DataFrame (df_detailed 等)，不使用預先輸出的檔案
+    """
+    league = current_league()
+    version = sync_query_cache()
+    schedule_rating_update(league, version)
+    cache = league.snapshot_cache
+    if cache['snapshot'] is not None and not full:
+        if cache['version'] != version:
+            refresh_snapshot_in_background(league)
+        return cache['version'], cache['snapshot']
 
-df_final_table = df_pivot_merged[desired_cols]
+    # 還沒有快照：同步計算 (同時到達的請求等待同一次計算)
+    with league.snapshot_lock:
+        cache = league.snapshot_cache
+        if cache['version'] != version or (full and 'df_detailed' not in cache['snapshot']):
+            cache = {'version': version, 'snapshot': load_or_build_snapshot(league, version, full)}
+            league.snapshot_cache = cache
+        return cache['version'], cache['snapshot']
+
+def refresh_snapshot_in_background(league):
+    """啟動背景重算；已經有一次在進行時直接返回"""
+    if not league.refresh_lock.acquire(blocking=False):
+        return False
+    # 背景執行緒沿用目前的 context (聯賽)
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(_refresh_snapshot, league),
+                     name=f'f1-refresh-{league.name}', daemon=True).start()
+    return True
+
+def _refresh_snapshot(league):
+    try:
+        with league.snapshot_lock:
+            version = sync_query_cache()
+            if league.snapshot_cache['version'] != version:
+                # 算好之後一次替換整個 dict，讀取者不會拿到半新半舊的快照
+                league.snapshot_cache = {'version': version, 'snapshot': load_or_build_snapshot(league, version)}
+    except Exception as e:
+        # 重算失敗時保留舊快照，下一個請求會再嘗試
+        print(f"⚠️ 背景重算快照失敗 ({league.name}): {e!r}")
+    finally:
+        league.refresh_lock.release()
+
+# ----------------------------------------------------
+# 車手評分：衍生資料，只在寫入端計算 (寫入佇列)，儀表板請求不寫入資料庫
+# ----------------------------------------------------
+# 本 process 的寫入 API 在 commit 後直接更新 (refresh_after_write)；
+# 其他 process 的寫入 (insert_data.py、其他 worker) 或新開啟的聯賽，在發現資料版本改變時排入寫入佇列。
+# 評分有變化時 update_ratings 會讓 data_version +1，快照隨後重新計算。
+def schedule_rating_update(league, version):
+    """每個資料版本最多排入一次 (不等待結果)"""
+    if league.rating_version == version:
+        return
+    league.rating_version = version
+    writer_queue.submit(_update_ratings_in_writer)
+
+def _update_ratings_in_writer():
+    try:
+        update_ratings(Session)
+    except Exception:
+        server.logger.exception('更新車手評分失敗')
+
+def refresh_after_write():
+    """寫入 API commit 之後 (在寫入佇列內)：先更新評分，再觸發快照重算"""
+    update_ratings(Session)
+    get_dashboard_snapshot()
+
+def format_data_source_text(snapshot):
+    df_detailed = snapshot['df_detailed']
+    return f'資料來源: 已完成 {snapshot["total_grand_prix_count"]} 個大獎賽（共 {len(df_detailed.Race_Name.unique())} 場比賽）'
+
+def table_columns(df_final_table):
+    return [{"name": col.replace('_', ' '), "id": col} for col in df_final_table.columns]
+
+# ----------------------------------------------------
+# 資料版本 API：瀏覽器每隔幾秒輪詢一次，版本沒變時回 304 (幾乎零負載)
+# ----------------------------------------------------
+# 舊名稱 DATA_VERSION_POLL_MS 仍可使用
+DATA_VERSION_POLL_MS = int(os.environ.get('F1_DATA_VERSION_POLL_MS') or os.environ.get('DATA_VERSION_POLL_MS') or 15000)
+
+@server.route('/api/data-version')
+def data_version_endpoint():
+    # 回報「已經算好的快照」的版本：背景重算完成前，瀏覽器不會以為已經是新資料
+    # 多個 worker 各自重算，輪詢可能先打到新版本、再打到還沒算完的舊版本；
+    # 版本號只會增加，瀏覽器端只在版本比目前新時更新 (見下方 clientside_callback)
+    version, _ = get_dashboard_snapshot()
+    etag = f'"v{version}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = Response(status=304)
+    else:
+        response = jsonify(version=version)
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@server.route('/api/query-cache-stats')
+def query_cache_stats_endpoint():
+    return jsonify(query_cache.stats())
+
+@server.route('/api/leagues')
+def leagues_endpoint():
+    return jsonify(league_pool.stats())
+
+# 串流匯出 (CSV / JSON / Parquet)：成績、詳細表格、積分榜
+register_export_routes(server, Session, {'standings': get_total_standings, 'team-standings': get_team_standings})
+
+# 變更紀錄串流：外部程式記住 seq，只抓之後的新增 / 修改 / 刪除
+register_change_feed(server, Session)
+
+# 排名圖片 (PNG / SVG)，依資料版本與尺寸快取
+register_image_routes(server, get_dashboard_snapshot)
+
+# ----------------------------------------------------
+# 批次寫入 API：寫入成功後立即重新計算快取 (排名、圖表、表格)
+# ----------------------------------------------------
+register_write_api(server, Session, on_commit=refresh_after_write)
+
+# 定期線上備份 (db_backup.py)：設定 F1_BACKUP_INTERVAL_MINUTES 才會啟動，不會擋住網站讀取
+start_backup_scheduler()
 
 # ----------------------------------------------------
 # 6. 重新定義網站佈局 (使用修正後的計數)
 # ----------------------------------------------------
-app.layout = html.Div(children=[
-    html.H1(children='我們遊戲的 F1 總積分排名紀錄', style={'textAlign': 'center', 'color': '#FF1801', 'font-size': '36px'}),
-    # 🚨 修正: 使用 total_grand_prix_count 和實際賽事數量 🚨
-    html.Div(children=f'資料來源: 已完成 {total_grand_prix_count} 個大獎賽（共 {len(df_detailed.Race_Name.unique())} 場比賽）', style={'textAlign': 'center', 'margin-bottom': '20px'}),
+# 佈局改為函數：第一次有人開網頁時才建立圖表，啟動時不必計算任何資料
+TABLE_STYLE = {
+    'style_header': {'backgroundColor': '#E0E0E0', 'fontWeight': 'bold', 'border': '1px solid black'},
+    'style_cell': {'textAlign': 'center', 'minWidth': '100px', 'border': '1px solid #D0D0D0'},
+}
+
+def records_columns(records):
+    return [{"name": col.replace('_', ' '), "id": col} for col in (records[0].keys() if records else [])]
+
+def records_table(table_id, records):
+    """把 list[dict] 顯示成與詳細成績相同樣式的表格"""
+    return dash.dash_table.DataTable(
+        id=table_id,
+        columns=records_columns(records),
+        data=records,
+        sort_action="native",
+        page_action="native",
+        page_size=TABLE_PAGE_SIZE,
+        **TABLE_STYLE,
+    )
+
+# 每位車手一列的表格 (大型聯賽可能有上千列)：由伺服器分頁，瀏覽器一次只拿一頁
+PAGED_TABLES = {
+    'driver-type-standings': lambda snapshot: snapshot['type_standings']['driver'],
+    'team-type-standings': lambda snapshot: snapshot['type_standings']['team'],
+    'driver-stats': lambda snapshot: snapshot['driver_stats'],
+    'teammate-battles': lambda snapshot: snapshot['teammate_battles'],
+}
+
+def paged_table(name, snapshot):
+    records = PAGED_TABLES[name](snapshot)
+    first_page, page_count = table_page(records)
+    return dash.dash_table.DataTable(
+        id={'type': 'paged-table', 'name': name},
+        columns=records_columns(records),
+        data=first_page,
+        sort_action="custom",
+        sort_by=[],
+        page_action="custom",
+        page_current=0,
+        page_size=TABLE_PAGE_SIZE,
+        page_count=page_count,
+        **TABLE_STYLE,
+    )
+
+def type_standings_children(snapshot):
+    return [
+        html.H3(children='車手'),
+        paged_table('driver-type-standings', snapshot),
+        html.H3(children='車隊'),
+        paged_table('team-type-standings', snapshot),
+    ]
+
+def team_filter_options(compact):
+    return compact['teams'] if compact else []
+
+def merge_options(*option_lists):
+    """合併下拉選單選項 (保留順序、去除重複)"""
+    return list(dict.fromkeys(name for options in option_lists for name in (options or [])))
+
+WHATIF_HINT = '選擇車手與比賽後輸入新的名次 / 積分 (或勾選取消資格)；修改只影響這個畫面，不會寫入資料庫。'
+
+def build_layout(data_version, snapshot):
+    # 瀏覽器只拿到前 N 名 (與觀眾選擇的車手) 的成績；表格只送第一頁
+    compact = compact_view(snapshot['results_compact'])
+    first_page, page_count = table_page(detailed_table(snapshot))
+    return html.Div(children=[
+        html.H1(children='我們遊戲的 F1 總積分排名紀錄', style={'textAlign': 'center', 'color': '#FF1801', 'font-size': '36px'}),
+        # 🚨 修正: 使用 total_grand_prix_count 和實際賽事數量 🚨
+        html.Div(id='data-source-text', children=snapshot['data_source_text'], style={'textAlign': 'center', 'margin-bottom': '20px'}),
+
+        # 資料版本輪詢 (在瀏覽器端比對，版本改變才向伺服器要新圖表)
+        dcc.Store(id='data-version-store', data=data_version),
+        dcc.Store(id='data-version-url', data=app.get_relative_path('/api/data-version')),
+        dcc.Interval(id='data-version-poll', interval=DATA_VERSION_POLL_MS),
     
-    # 新增車隊總積分圖表 (現在是統一車隊顏色)
-    html.Div(children=[
-        dcc.Graph(
-            id='team-ranking-graph',
-            figure=team_ranking_fig
-        )
-    ], style={'padding': '20px'}),
+        # 篩選 (車隊 / 正賽或衝刺賽)：在瀏覽器端用 results-store 重新加總，不必回到伺服器
+        dcc.Store(id='results-store', data=compact),
+        html.Div(children=[
+            # 大型聯賽：圖表只畫前幾名，其他車手用名稱搜尋後加入
+            dcc.Dropdown(
+                id='driver-search',
+                options=[],
+                multi=True,
+                placeholder=f'排名圖只顯示前 {CHART_TOP_N} 名；輸入名稱開頭搜尋並加入其他車手',
+                style={'maxWidth': '600px', 'margin': '0 auto 10px'},
+            ),
+            dcc.Checklist(
+                id='team-filter',
+                options=team_filter_options(compact),
+                value=team_filter_options(compact),
+                inline=True,
+                inputStyle={'margin-left': '12px', 'margin-right': '4px'},
+            ),
+            dcc.RadioItems(
+                id='race-type-filter',
+                options=[
+                    {'label': '全部', 'value': 'all'},
+                    {'label': '正賽 (Race)', 'value': 'Race'},
+                    {'label': '衝刺賽 (Sprint)', 'value': 'Sprint'},
+                ],
+                value='all',
+                inline=True,
+                inputStyle={'margin-left': '12px', 'margin-right': '4px'},
+            ),
+        ], style={'textAlign': 'center'}),
+
+        # 新增車隊總積分圖表 (現在是統一車隊顏色)
+        html.Div(children=[
+            dcc.Graph(
+                id='team-ranking-graph',
+                figure=snapshot['team_ranking_fig']
+            )
+        ], style={'padding': '20px'}),
     
-    # 放置總積分圖表 (現在是統一車隊顏色)
-    dcc.Graph(
-        id='total-ranking-graph',
-        figure=ranking_fig,
-        style={'height': '500px'}
-    ),
+        # 放置總積分圖表 (現在是統一車隊顏色)
+        dcc.Graph(
+            id='total-ranking-graph',
+            figure=snapshot['ranking_fig'],
+            style={'height': '500px'}
+        ),
+
+        # 車手評分走勢 (Elo)：同樣的積分，贏過強敵的評分上升較多
+        dcc.Graph(
+            id='rating-history-graph',
+            figure=snapshot['rating_fig']
+        ),
+
+        # 每站賽後的名次走勢 (bump chart)
+        html.H2(children='每站賽後排名走勢', style={'margin-top': '40px'}),
+        dcc.Graph(id='driver-bump-graph', figure=snapshot['driver_bump_fig']),
+        dcc.Graph(id='team-bump-graph', figure=snapshot['team_bump_fig']),
     
-    html.H2(children='詳細單場成績', style={'margin-top': '40px'}),
-    # 放置詳細的單場成績表格 (已優化)
-    dash.dash_table.DataTable(
-        id='detailed-ranking-table',
-        columns=[{"name": col.replace('_', ' '), "id": col} for col in df_final_table.columns],
-        data=df_final_table.to_dict('records'),
-        style_header={'backgroundColor': '#E0E0E0', 'fontWeight': 'bold', 'border': '1px solid black'},
-        style_cell={'textAlign': 'center', 'minWidth': '100px', 'border': '1px solid #D0D0D0'},
-        sort_action="native",
+        html.H2(children='詳細單場成績', style={'margin-top': '40px'}),
+        # 放置詳細的單場成績表格 (伺服器端分頁與排序，一次只送一頁)
+        dash.dash_table.DataTable(
+            id='detailed-ranking-table',
+            columns=snapshot['table_columns'],
+            data=first_page,
+            sort_action="custom",
+            sort_by=[],
+            page_action="custom",
+            page_current=0,
+            page_size=TABLE_PAGE_SIZE,
+            page_count=page_count,
+            **TABLE_STYLE,
+        ),
+
+        # 分類積分榜 (正賽 / 衝刺賽 / 合計)
+        html.H2(children='分類積分榜 (正賽 / 衝刺賽)', style={'margin-top': '40px'}),
+        html.Div(id='type-standings', children=type_standings_children(snapshot)),
+
+        # 車手成績統計
+        html.H2(children='車手成績統計', style={'margin-top': '40px'}),
+        html.Div(id='driver-stats', children=paged_table('driver-stats', snapshot)),
+
+        # 隊友對決 (名次領先次數、積分佔比、平均名次差)
+        html.H2(children='隊友對決', style={'margin-top': '40px'}),
+        html.Div(id='teammate-battles', children=paged_table('teammate-battles', snapshot)),
+
+        # 假設情境：修改只存在瀏覽器 (whatif-edits)，積分榜與排名圖以差異重新計算，資料庫不變
+        html.H2(children='假設情境 (What-if)', style={'margin-top': '40px'}),
+        dcc.Store(id='whatif-edits', data=[]),
+        html.Div(children=[
+            dcc.Dropdown(id='whatif-driver', options=snapshot['driver_options'], placeholder='選擇車手',
+                         style={'width': '220px'}),
+            dcc.Dropdown(id='whatif-race', options=snapshot['race_options'], placeholder='選擇比賽',
+                         style={'width': '260px'}),
+            dcc.Input(id='whatif-position', type='number', min=1, step=1, placeholder='新名次'),
+            dcc.Input(id='whatif-points', type='number', min=0, step=1, placeholder='新積分'),
+            dcc.Checklist(id='whatif-dsq', options=[{'label': '取消資格', 'value': 'dsq'}], value=[]),
+            html.Button('加入修改', id='whatif-add'),
+            html.Button('清除全部', id='whatif-clear'),
+        ], style={'display': 'flex', 'gap': '8px', 'alignItems': 'center', 'flexWrap': 'wrap'}),
+        html.Div(id='whatif-message', style={'margin': '8px 0'}),
+        html.Div(id='whatif-result', children=html.P(WHATIF_HINT)),
+
+        # 歷史賽季：已封存的賽季 (season_archive.py)；排名讀熱資料庫中的彙總，單場成績才讀封存檔
+        html.H2(children='歷史賽季', style={'margin-top': '40px'}),
+        dcc.Dropdown(id='archive-season-select', options=[], placeholder='選擇封存的賽季'),
+        html.Div(id='archive-season-view'),
+        dcc.Dropdown(id='archive-race-select', options=[], placeholder='選擇封存賽季的比賽 (讀取封存檔)'),
+        html.Div(id='archive-race-view'),
+
+        # 車手 / 單場比賽深入分析 (async 回呼，多個查詢同時執行)
+        html.H2(children='車手深入分析', style={'margin-top': '40px'}),
+        dcc.Dropdown(id='driver-drilldown-select', options=snapshot['driver_options'], placeholder='選擇車手'),
+        html.Div(id='driver-drilldown'),
+
+        html.H2(children='單場比賽深入分析', style={'margin-top': '40px'}),
+        dcc.Dropdown(id='race-drilldown-select', options=snapshot['race_drilldown_options'], placeholder='選擇比賽'),
+        html.Div(id='race-drilldown'),
+    ])
+
+def serve_layout():
+    return build_layout(*get_dashboard_snapshot())
+
+# 用空白資料的佈局做元件驗證 (否則 Dash 會在啟動時呼叫 serve_layout 而提早計算)
+EMPTY_SNAPSHOT = {'data_source_text': '', 'ranking_fig': {}, 'team_ranking_fig': {}, 'rating_fig': {},
+                  'driver_bump_fig': {}, 'team_bump_fig': {},
+                  'table_columns': [], 'table_data': [],
+                  'driver_options': [], 'race_options': [], 'race_drilldown_options': [], 'results_compact': None,
+                  'type_standings': {'driver': [], 'team': []}, 'driver_stats': [],
+                  'teammate_battles': []}
+app.validation_layout = build_layout(None, EMPTY_SNAPSHOT)
+app.layout = serve_layout
+
+# ----------------------------------------------------
+# 7. 即時更新回呼
+# ----------------------------------------------------
+# 瀏覽器端：輪詢版本號，只有版本比目前新時才更新 data-version-store
+# (不同 worker 的快照版本可能暫時不同，舊版本的回應直接忽略，頁面不會來回切換)
+app.clientside_callback(
+    """
+    async function(n_intervals, url, current_version) {
+        const response = await fetch(url, {cache: 'no-cache'});
+        if (!response.ok) {
+            return window.dash_clientside.no_update;
+        }
+        const payload = await response.json();
+        if (current_version !== null && current_version !== undefined &&
+                !(payload.version > current_version)) {
+            return window.dash_clientside.no_update;
+        }
+        return payload.version;
+    }
+    """,
+    Output('data-version-store', 'data'),
+    Input('data-version-poll', 'n_intervals'),
+    State('data-version-url', 'data'),
+    State('data-version-store', 'data'),
+    prevent_initial_call=True,
+)
+
+# 伺服器端：版本改變後才重新下載資料與表格 (圖表由 results-store 在瀏覽器端重畫)
+@app.callback(
+    Output('detailed-ranking-table', 'columns'),
+    Output('data-source-text', 'children'),
+    Output('type-standings', 'children'),
+    Output('driver-stats', 'children'),
+    Output('teammate-battles', 'children'),
+    Output('rating-history-graph', 'figure'),
+    Output('driver-bump-graph', 'figure'),
+    Output('team-bump-graph', 'figure'),
+    Output('race-drilldown-select', 'options'),
+    Input('data-version-store', 'data'),
+    prevent_initial_call=True,
+)
+def refresh_dashboard(_version):
+    _, current = get_dashboard_snapshot()
+    return (
+        current['table_columns'],
+        current['data_source_text'],
+        type_standings_children(current),
+        paged_table('driver-stats', current),
+        paged_table('teammate-battles', current),
+        current['rating_fig'],
+        current['driver_bump_fig'],
+        current['team_bump_fig'],
+        current['race_drilldown_options'],
+    )
+
+# 伺服器端：版本改變或觀眾加入 / 移除車手時，重新挑選要送到瀏覽器的成績 (前 N 名 + 選擇的車手)
+@app.callback(
+    Output('results-store', 'data'),
+    Output('team-filter', 'options'),
+    Output('team-filter', 'value'),
+    Input('data-version-store', 'data'),
+    Input('driver-search', 'value'),
+    Input('whatif-edits', 'data'),
+    State('team-filter', 'value'),
+    State('team-filter', 'options'),
+    prevent_initial_call=True,
+)
+def update_results_store(_version, selected_drivers, whatif_edits, team_value, team_options):
+    _, current = get_dashboard_snapshot()
+    # 假設情境修改過的車手也一併送出，圖表才看得到變化
+    edited_drivers = [edit['driver'] for edit in whatif_edits or []]
+    compact = compact_view(current['results_compact'], merge_options(selected_drivers, edited_drivers))
+    compact = apply_edits_to_compact(compact, whatif_edits)
+    teams = team_filter_options(compact)
+    # 保留觀眾取消勾選的車隊；新出現的車隊預設勾選
+    unchecked = set(team_options or []) - set(team_value or [])
+    return compact, teams, [team for team in teams if team not in unchecked]
+
+# 伺服器端：車手名稱前綴搜尋 (索引查詢，只回傳前幾筆)
+def search_options(search_value, current_options):
+    session = Session()
+    try:
+        matches = search_driver_names(session, search_value)
+    finally:
+        session.close()
+    return merge_options(current_options, matches)
+
+@app.callback(
+    Output('driver-search', 'options'),
+    Input('driver-search', 'search_value'),
+    State('driver-search', 'value'),
+    prevent_initial_call=True,
+)
+def update_driver_search_options(search_value, selected_drivers):
+    if not search_value:
+        return dash.no_update
+    return search_options(search_value, selected_drivers)
+
+@app.callback(
+    Output('driver-drilldown-select', 'options'),
+    Input('driver-drilldown-select', 'search_value'),
+    State('driver-drilldown-select', 'value'),
+    prevent_initial_call=True,
+)
+def update_drilldown_options(search_value, driver_name):
+    if not search_value:
+        return dash.no_update
+    _, current = get_dashboard_snapshot()
+    return search_options(search_value, merge_options(current['driver_options'], [driver_name] if driver_name else []))
+
+@app.callback(
+    Output('whatif-driver', 'options'),
+    Input('whatif-driver', 'search_value'),
+    State('whatif-driver', 'value'),
+    prevent_initial_call=True,
+)
+def update_whatif_driver_options(search_value, driver_name):
+    if not search_value:
+        return dash.no_update
+    _, current = get_dashboard_snapshot()
+    return search_options(search_value, merge_options(current['driver_options'], [driver_name] if driver_name else []))
+
+# 伺服器端：假設情境 (whatif.py)
+@app.callback(
+    Output('whatif-edits', 'data'),
+    Output('whatif-message', 'children'),
+    Input('whatif-add', 'n_clicks'),
+    Input('whatif-clear', 'n_clicks'),
+    State('whatif-driver', 'value'),
+    State('whatif-race', 'value'),
+    State('whatif-position', 'value'),
+    State('whatif-points', 'value'),
+    State('whatif-dsq', 'value'),
+    State('whatif-edits', 'data'),
+    prevent_initial_call=True,
+)
+def update_whatif_edits(_add, _clear, driver_name, race_name, position, points, dsq, edits):
+    if dash.ctx.triggered_id == 'whatif-clear':
+        return [], '已清除所有修改'
+    try:
+        edit = normalize_edit({'driver': driver_name, 'race': race_name, 'points': points,
+                               'position': position, 'disqualified': 'dsq' in (dsq or [])})
+    except ValueError as e:
+        return dash.no_update, f'⚠️ {e}'
+    return upsert_edit(edits, edit), f'已加入：{driver_name} / {race_name}'
+
+@app.callback(
+    Output('whatif-result', 'children'),
+    Input('whatif-edits', 'data'),
+    Input('data-version-store', 'data'),
+    prevent_initial_call=True,
+)
+def update_whatif_result(edits, _version):
+    if not edits:
+        return html.P(WHATIF_HINT)
+    session = Session()
+    try:
+        originals = fetch_original_results(session, edits)
+    finally:
+        session.close()
+    delta, missing = whatif_delta_rows(edits, originals)
+    # 快取的 countback 索引 + 差異 (不必重新讀取成績或重新排序所有車手)
+    sync_query_cache()
+    driver_table = whatif_standings(get_driver_countback_index(), delta)
+    team_table = whatif_standings(get_team_countback_index(), delta)
+    children = [
+        html.H3(children='目前的修改'),
+        records_table('whatif-edits-table', [
+            {'Driver': e['driver'], 'Race': e['race'], 'Points': e['points'], 'Position': e['position'],
+             'Disqualified': '是' if e['disqualified'] else ''}
+            for e in edits
+        ]),
+    ]
+    if missing:
+        children.append(html.P('⚠️ 找不到成績，已略過：' + '、'.join(f"{e['driver']} / {e['race']}" for e in missing)))
+    children += [
+        html.H3(children='假設情境車手積分榜'),
+        records_table('whatif-driver-table', driver_table.to_dict('records')),
+        html.H3(children='假設情境車隊積分榜'),
+        records_table('whatif-team-table', team_table.to_dict('records')),
+        html.Details(children=[
+            html.Summary('寫入資料庫 (POST /api/results/edits，需要管理員權杖)'),
+            html.Pre(json.dumps({'edits': edits}, ensure_ascii=False, indent=2)),
+        ]),
+    ]
+    return children
+
+# 伺服器端：詳細成績表格分頁 / 排序
+@app.callback(
+    Output('detailed-ranking-table', 'data'),
+    Output('detailed-ranking-table', 'page_count'),
+    Input('detailed-ranking-table', 'page_current'),
+    Input('detailed-ranking-table', 'page_size'),
+    Input('detailed-ranking-table', 'sort_by'),
+    Input('data-version-store', 'data'),
+    prevent_initial_call=True,
+)
+def update_table_page(page_current, page_size, sort_by, _version):
+    _, current = get_dashboard_snapshot()
+    return table_page(detailed_table(current), page_current, page_size, sort_by)
+
+@app.callback(
+    Output({'type': 'paged-table', 'name': MATCH}, 'data'),
+    Output({'type': 'paged-table', 'name': MATCH}, 'page_count'),
+    Input({'type': 'paged-table', 'name': MATCH}, 'page_current'),
+    Input({'type': 'paged-table', 'name': MATCH}, 'page_size'),
+    Input({'type': 'paged-table', 'name': MATCH}, 'sort_by'),
+    State({'type': 'paged-table', 'name': MATCH}, 'id'),
+    prevent_initial_call=True,
+)
+def update_paged_table(page_current, page_size, sort_by, table_id):
+    _, current = get_dashboard_snapshot()
+    return table_page(PAGED_TABLES[table_id['name']](current), page_current, page_size, sort_by)
+
+# 瀏覽器端：依篩選條件重新加總並重畫兩張排名圖 (assets/ranking_filters.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='ranking', function_name='filterFigures'),
+    Output('total-ranking-graph', 'figure'),
+    Output('team-ranking-graph', 'figure'),
+    Input('team-filter', 'value'),
+    Input('race-type-filter', 'value'),
+    Input('results-store', 'data'),
+    State('total-ranking-graph', 'figure'),
+    State('team-ranking-graph', 'figure'),
+    prevent_initial_call=True,
+)
+
+# 伺服器端：歷史賽季 (season_archive.py)
+ALL_SEASONS = 'all'
+
+# 兩者都只讀熱資料庫 (名次彙總 + season_summaries)，隨資料版本快取
+@query_cache.memoize
+def get_all_time_standings(kind):
+    """熱資料庫的名次彙總 + 所有封存賽季的彙總 → 歷代總積分榜"""
+    import pandas as pd
+    session = Session()
+    try:
+        archived = archived_position_counts(session, kind)
+    finally:
+        session.close()
+    if kind == 'driver':
+        counts, keys = get_driver_position_counts(), ['Driver', 'Team']
+    else:
+        counts, keys = get_team_position_counts(), ['Team']
+    return countback_standings(pd.concat([counts, archived], ignore_index=True), keys).to_dict('records')
+
+@query_cache.memoize
+def get_season_standings(season, kind):
+    session = Session()
+    try:
+        return season_standings(session, season, kind)
+    finally:
+        session.close()
+
+@app.callback(
+    Output('archive-season-select', 'options'),
+    Input('data-version-store', 'data'),
+)
+def update_archive_seasons(_version):
+    session = Session()
+    try:
+        seasons = archived_seasons(session)
+    finally:
+        session.close()
+    if not seasons:
+        return []
+    return [{'label': '歷代總計 (含封存賽季)', 'value': ALL_SEASONS}] + [
+        {'label': f'{season} 賽季', 'value': season} for season in seasons]
+
+@app.callback(
+    Output('archive-season-view', 'children'),
+    Output('archive-race-select', 'options'),
+    Output('archive-race-select', 'value'),
+    Input('archive-season-select', 'value'),
+    prevent_initial_call=True,
+)
+def update_archive_season_view(season):
+    if not season:
+        return [], [], None
+    sync_query_cache()
+    if season == ALL_SEASONS:
+        return [
+            html.H3(children='歷代車手總積分'),
+            records_table('archive-driver-table', get_all_time_standings('driver')),
+            html.H3(children='歷代車隊總積分'),
+            records_table('archive-team-table', get_all_time_standings('team')),
+        ], [], None
+    return [
+        html.H3(children=f'{season} 賽季車手積分榜'),
+        records_table('archive-driver-table', get_season_standings(season, 'driver')),
+        html.H3(children=f'{season} 賽季車隊積分榜'),
+        records_table('archive-team-table', get_season_standings(season, 'team')),
+    ], archived_races(season), None
+
+@app.callback(
+    Output('archive-race-view', 'children'),
+    Input('archive-race-select', 'value'),
+    State('archive-season-select', 'value'),
+    prevent_initial_call=True,
+)
+def update_archive_race_view(race_name, season):
+    if not race_name or not season or season == ALL_SEASONS:
+        return []
+    return [
+        html.H3(children=f'{race_name} 完賽名次'),
+        records_table('archive-race-table', archived_race_results(season, race_name)),
+    ]
+
+# ----------------------------------------------------
+# 8. 深入分析回呼 (async：等待資料庫時不佔住 worker thread)
+# ----------------------------------------------------
+@app.callback(
+    Output('driver-drilldown', 'children'),
+    Input('driver-drilldown-select', 'value'),
+    prevent_initial_call=True,
+)
+async def update_driver_drilldown(driver_name):
+    if not driver_name:
+        return []
+    drilldown = await get_driver_drilldown(driver_name)
+
+    import plotly.express as px
+    progression_fig = px.line(
+        drilldown['progression'],
+        x='Race_Date',
+        y='Cumulative_Points',
+        hover_data=['Race_Name'],
+        markers=True,
+        title=f'**{driver_name} 累積積分走勢**',
     )
-])
+    progression_fig.update_layout(xaxis_title="比賽日期", yaxis_title="累積積分")
+
+    return [
+        dcc.Graph(id='driver-progression-graph', figure=progression_fig),
+        html.H3(children='與其他車手的名次對決'),
+        records_table('driver-head-to-head-table', drilldown['head_to_head']),
+        html.H3(children='單場成績'),
+        records_table('driver-results-table', drilldown['results']),
+    ]
+
+@app.callback(
+    Output('race-drilldown', 'children'),
+    Input('race-drilldown-select', 'value'),
+    State('race-drilldown-select', 'options'),
+    prevent_initial_call=True,
+)
+async def update_race_drilldown(race_id, race_options):
+    if race_id is None:
+        return []
+    drilldown = await get_race_drilldown(race_id)
+    race_name = next((option['label'] for option in race_options or [] if option['value'] == race_id), '')
+    return [
+        html.H3(children=f'{race_name} 完賽名次'),
+        records_table('race-results-table', drilldown['results']),
+        html.H3(children='賽後車手總積分排名'),
+        records_table('race-standings-table', drilldown['standings']),
+    ]
 
 if __name__ == '__main__':
     # 網站啟動時運行 insert_all_race_data()
@@ -0,0 +1,209 @@
+// ====================================================================
+// 瀏覽器端篩選：依車隊 / 比賽類型重新加總，重畫兩張排名圖 (不經過伺服器)
+// ====================================================================
+//
+// store 是 app.py build_compact_results() 產生的精簡欄式資料：
+//   d / r / p / pos  每筆成績的 車手代碼 / 比賽代碼 / 積分 / 名次 (已依比賽日期排序，沒有名次為 null)
+//   drivers        車手名稱 (依總分排序)，driver_team 是每位車手的車隊代碼
+//   races          比賽名稱，race_dates / race_type 是每場比賽的日期 / 類型代碼
+//   teams / types  車隊與比賽類型的對照表，team_colors 對應 TEAM_COLORS
+//   driver_type_points[車手代碼][類型代碼]  伺服器預先彙總的分類積分 (總分標示與排序直接用它)
+//   type_position_counts[類型代碼]  全聯賽各名次的次數，決定 countback 比較哪些名次
+//   driver_charted / team_charted  要畫在圖上的車手 / 車隊 (大型聯賽只有前 N 名 + 觀眾選的車手，
+//                  見 league_view.compact_view)；圖表高度為 row_height x 顯示的列數
+// 同分依 countback (P1 次數、P2 次數...) 排序並在總分旁標示，與 standings_ranking.countback_standings 相同。
+
+(function () {
+    function stackedBarTraces(store, rows, categoryOf, insideAnchor, charted) {
+        // 與 px.bar(color='Team') 相同：每個車隊一條 trace，每筆成績是一段
+        const traces = store.teams.map(function (team, t) {
+            const trace = {
+                type: 'bar',
+                orientation: 'h',
+                name: team,
+                legendgroup: team,
+                x: [],
+                y: [],
+                customdata: [],
+                texttemplate: '%{x}',
+                textposition: 'inside',
+                hovertemplate: 'Team=' + team + '<br>Points=%{x}<br>%{y}<br>Race_Name=%{customdata[0]}<br>Race_Date=%{customdata[1]}<extra></extra>',
+                marker: store.team_colors[t] ? {color: store.team_colors[t]} : {}
+            };
+            if (insideAnchor) {
+                trace.insidetextanchor = insideAnchor;
+            }
+            return trace;
+        });
+        rows.forEach(function (i) {
+            const d = store.d[i];
+            if (!charted(d)) {
+                return;
+            }
+            const r = store.r[i];
+            const trace = traces[store.driver_team[d]];
+            trace.x.push(store.p[i]);
+            trace.y.push(categoryOf(d));
+            trace.customdata.push([store.races[r], store.race_dates[r]]);
+        });
+        return traces.filter(function (trace) { return trace.x.length > 0; });
+    }
+
+    function rankingFigure(baseFigure, traces, totals, rangeFactor, minHeight, rowHeight) {
+        // totals 是 [名稱, 總分, countback 說明]，已依排名排序；Plotly 由下往上畫，所以反轉
+        const layout = JSON.parse(JSON.stringify((baseFigure && baseFigure.layout) || {}));
+        layout.height = Math.max(minHeight, rowHeight * totals.length);
+        const names = totals.map(function (item) { return item[0]; });
+        const maxTotal = totals.reduce(function (m, item) { return Math.max(m, item[1]); }, 0);
+        layout.yaxis = Object.assign({}, layout.yaxis, {
+            categoryorder: 'array',
+            categoryarray: names.slice().reverse()
+        });
+        layout.xaxis = Object.assign({}, layout.xaxis, {range: [0, (maxTotal || 1) * rangeFactor]});
+        layout.annotations = totals.map(function (item) {
+            return {
+                x: item[1],
+                y: item[0],
+                text: '<b>' + item[1] + '</b>' + (item[2] ? ' (' + item[2] + ')' : ''),
+                showarrow: false,
+                xanchor: 'left',
+                xshift: 10,
+                font: {size: 14, color: 'black'}
+            };
+        });
+        layout.barmode = 'stack';
+        return {data: traces, layout: layout};
+    }
+
+    function positionColumns(store, typeCode) {
+        // countback 比較的名次：這個比賽類型 (全部 = 所有類型) 全聯賽出現過的名次，由小到大
+        const seen = new Set();
+        (store.type_position_counts || []).forEach(function (pairs, t) {
+            if (typeCode === -1 || t === typeCode) {
+                pairs.forEach(function (pair) {
+                    if (pair[1] > 0) {
+                        seen.add(pair[0]);
+                    }
+                });
+            }
+        });
+        return Array.from(seen).sort(function (a, b) { return a - b; });
+    }
+
+    function firstDifference(a, b, columns) {
+        for (let k = 0; k < columns.length; k++) {
+            if ((a[columns[k]] || 0) !== (b[columns[k]] || 0)) {
+                return k;
+            }
+        }
+        return -1;
+    }
+
+    function sortedTotals(names, totals, histograms, columns) {
+        // 總分 → P1、P2... 次數由多到少；完全相同時保留原本順序 (drivers / teams 已依名稱排在同分者之間)
+        const items = names
+            .map(function (name, i) { return {name: name, total: totals[i], histogram: histograms[i], index: i}; })
+            .filter(function (item) { return item.total !== null; })
+            .sort(function (a, b) {
+                if (a.total !== b.total) {
+                    return b.total - a.total;
+                }
+                const k = firstDifference(a.histogram, b.histogram, columns);
+                return k === -1
+                    ? a.index - b.index
+                    : (b.histogram[columns[k]] || 0) - (a.histogram[columns[k]] || 0);
+            });
+        // 同分的一組列出比到第幾名才分出勝負，例如 "P1×2 P2×1" (與 standings_ranking._tiebreak_text 相同)
+        const labels = items.map(function () { return ''; });
+        let start = 0;
+        while (start < items.length) {
+            let end = start + 1;
+            while (end < items.length && items[end].total === items[start].total) {
+                end++;
+            }
+            if (end - start > 1 && columns.length) {
+                let depth = 1;
+                for (let i = start; i + 1 < end; i++) {
+                    const k = firstDifference(items[i].histogram, items[i + 1].histogram, columns);
+                    depth = Math.max(depth, k === -1 ? columns.length : k + 1);
+                }
+                for (let i = start; i < end; i++) {
+                    labels[i] = columns.slice(0, depth).map(function (position) {
+                        return 'P' + position + '×' + (items[i].histogram[position] || 0);
+                    }).join(' ');
+                }
+            }
+            start = end;
+        }
+        return items.map(function (item, i) { return [item.name, item.total, labels[i]]; });
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        ranking: {
+            filterFigures: function (selectedTeams, raceType, store, driverFigure, teamFigure) {
+                if (!store) {
+                    return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+                }
+                const teamSet = new Set(selectedTeams || []);
+                const typeCode = raceType === 'all' ? -1 : store.types.indexOf(raceType);
+                const rows = [];
+                const driverShown = store.drivers.map(function () { return false; });
+                // 篩選後每位車手的名次直方圖 {名次: 次數} (countback 用)
+                const driverHistograms = store.drivers.map(function () { return {}; });
+                const driverCharted = function (d) { return !store.driver_charted || store.driver_charted[d]; };
+                const teamCharted = function (d) {
+                    return !store.team_charted || store.team_charted[store.driver_team[d]];
+                };
+                for (let i = 0; i < store.d.length; i++) {
+                    const d = store.d[i];
+                    if (!teamSet.has(store.teams[store.driver_team[d]])) {
+                        continue;
+                    }
+                    if (typeCode !== -1 && store.race_type[store.r[i]] !== typeCode) {
+                        continue;
+                    }
+                    rows.push(i);
+                    driverShown[d] = true;
+                    const position = store.pos ? store.pos[i] : null;
+                    if (position !== null) {
+                        driverHistograms[d][position] = (driverHistograms[d][position] || 0) + 1;
+                    }
+                }
+
+                // 總分：直接取分類彙總 (全部 = 各類型相加)，不必逐筆成績加總
+                const driverTotals = store.drivers.map(function () { return null; });
+                const teamTotals = store.teams.map(function () { return null; });
+                const teamHistograms = store.teams.map(function () { return {}; });
+                store.drivers.forEach(function (name, d) {
+                    if (!driverShown[d]) {
+                        return;
+                    }
+                    const byType = store.driver_type_points[d];
+                    const total = typeCode === -1
+                        ? byType.reduce(function (a, b) { return a + b; }, 0)
+                        : byType[typeCode];
+                    const t = store.driver_team[d];
+                    if (driverCharted(d)) {
+                        driverTotals[d] = total;
+                    }
+                    if (teamCharted(d)) {
+                        teamTotals[t] = (teamTotals[t] || 0) + total;
+                        Object.keys(driverHistograms[d]).forEach(function (position) {
+                            teamHistograms[t][position] = (teamHistograms[t][position] || 0) + driverHistograms[d][position];
+                        });
+                    }
+                });
+
+                const driverTraces = stackedBarTraces(store, rows, function (d) { return store.drivers[d]; }, 'middle', driverCharted);
+                const teamTraces = stackedBarTraces(store, rows, function (d) { return store.teams[store.driver_team[d]]; }, null, teamCharted);
+                const columns = positionColumns(store, typeCode);
+                return [
+                    rankingFigure(driverFigure, driverTraces, sortedTotals(store.drivers, driverTotals, driverHistograms, columns),
+                                  1.15, 600, store.row_height),
+                    rankingFigure(teamFigure, teamTraces, sortedTotals(store.teams, teamTotals, teamHistograms, columns),
+                                  1.1, 400, store.row_height)
+                ];
+            }
+        }
+    });
+})();
@@ -0,0 +1,139 @@
+import asyncio
+
+from sqlalchemy import and_, case, func, select, tuple_
+from sqlalchemy.orm import aliased
+
+from database_setup import Race, Result, Driver
+from league_pool import current_league
+from standings_ranking import countback_standings
+
+# ====================================================================
+# 非同步查詢層 (SQLAlchemy asyncio + aiosqlite)：給車手 / 比賽的深入分析回呼使用
+# ====================================================================
+#
+# 每個深入分析需要好幾個互不相依的查詢，這裡用 asyncio.gather 同時發出，
+# 等待資料庫時不會佔住 worker thread，其他觀眾的請求不會被卡住。
+# 注意：Dash 的 async 回呼每個請求都在自己的 event loop 內執行，
+# aiosqlite 連線不能跨 event loop 重複使用，所以連線池使用 NullPool (見 league_pool.League.AsyncSession)。
+# 查詢的是目前網址所屬聯賽的資料庫。
+
+
+async def _fetch_all(stmt):
+    """執行查詢並回傳 list[dict] (每個查詢使用自己的 session，才能同時執行)"""
+    async with current_league().AsyncSession() as session:
+        result = await session.execute(stmt)
+        return [dict(row._mapping) for row in result]
+
+
+# ----------------------------------------------------
+# 1. 車手查詢
+# ----------------------------------------------------
+async def get_driver_results(driver_name):
+    """車手每一場的成績 (按日期排序)"""
+    stmt = (select(
+        Race.name.label('Race_Name'),
+        Race.type.label('Race_Type'),
+        Race.date.label('Race_Date'),
+        Result.position.label('Position'),
+        Result.points.label('Points')
+    )
+    .join(Result, Race.race_id == Result.race_id)
+    .join(Driver, Driver.driver_id == Result.driver_id)
+    .where(Driver.name == driver_name)
+    .order_by(Race.date, Race.race_id))
+    return await _fetch_all(stmt)
+
+async def get_driver_head_to_head(driver_name):
+    """與其他每位車手同場比賽時，誰的名次較前 (results 自我關聯一次算完)"""
+    mine, theirs = aliased(Result), aliased(Result)
+    me, rival = aliased(Driver), aliased(Driver)
+    stmt = (select(
+        rival.name.label('Rival'),
+        rival.team.label('Team'),
+        func.count().label('Races'),
+        func.sum(case((mine.position < theirs.position, 1), else_=0)).label('Ahead'),
+        func.sum(case((mine.position > theirs.position, 1), else_=0)).label('Behind')
+    )
+    .select_from(mine)
+    .join(me, me.driver_id == mine.driver_id)
+    .join(theirs, and_(theirs.race_id == mine.race_id, theirs.driver_id != mine.driver_id))
+    .join(rival, rival.driver_id == theirs.driver_id)
+    .where(me.name == driver_name)
+    .group_by(rival.driver_id, rival.name, rival.team)
+    .order_by(rival.name))
+    return await _fetch_all(stmt)
+
+async def get_driver_progression(driver_name):
+    """車手累積積分走勢 (SQLite window function)"""
+    stmt = (select(
+        Race.name.label('Race_Name'),
+        Race.date.label('Race_Date'),
+        func.sum(Result.points).over(order_by=(Race.date, Race.race_id)).label('Cumulative_Points')
+    )
+    .join(Result, Race.race_id == Result.race_id)
+    .join(Driver, Driver.driver_id == Result.driver_id)
+    .where(Driver.name == driver_name)
+    .order_by(Race.date, Race.race_id))
+    return await _fetch_all(stmt)
+
+async def get_driver_drilldown(driver_name):
+    """同時執行車手的三個查詢"""
+    results, head_to_head, progression = await asyncio.gather(
+        get_driver_results(driver_name),
+        get_driver_head_to_head(driver_name),
+        get_driver_progression(driver_name),
+    )
+    return {'results': results, 'head_to_head': head_to_head, 'progression': progression}
+
+
+# ----------------------------------------------------
+# 2. 比賽查詢 (以 race_id 指定比賽：比賽名稱可能重複)
+# ----------------------------------------------------
+def season_order(race=Race):
+    """
+    比賽在賽季中的先後：日期、同一天先衝刺賽後正賽、最後依 race_id
+    (與 standings_trajectory.race_rounds 的站次相同)
+    """
+    return (race.date, case((race.type == 'Sprint', 0), else_=1), race.race_id)
+
+async def get_race_results(race_id):
+    """單場比賽的完賽名次"""
+    stmt = (select(
+        Result.position.label('Position'),
+        Driver.name.label('Driver'),
+        Driver.team.label('Team'),
+        Result.points.label('Points')
+    )
+    .join(Driver, Driver.driver_id == Result.driver_id)
+    .where(Result.race_id == race_id)
+    .order_by(Result.position))
+    return await _fetch_all(stmt)
+
+async def get_standings_after_race(race_id):
+    """該場比賽結束後的車手總積分排名 (同分依 countback)；同一天之後才進行的比賽不計入"""
+    target = aliased(Race)
+    cutoff = select(*season_order(target)).where(target.race_id == race_id).subquery()
+    stmt = (select(
+        Driver.name.label('Driver'),
+        Driver.team.label('Team'),
+        Result.position.label('Position'),
+        func.count(Result.result_id).label('Count'),
+        func.sum(Result.points).label('Points')
+    )
+    .join(Result, Driver.driver_id == Result.driver_id)
+    .join(Race, Race.race_id == Result.race_id)
+    .join(cutoff, tuple_(*season_order()) <= tuple_(*cutoff.c))
+    .group_by(Driver.driver_id, Driver.name, Driver.team, Result.position))
+    rows = await _fetch_all(stmt)
+
+    import pandas as pd
+    df_by_position = pd.DataFrame(rows, columns=['Driver', 'Team', 'Position', 'Count', 'Points'])
+    return countback_standings(df_by_position, ['Driver', 'Team']).to_dict('records')
+
+async def get_race_drilldown(race_id):
+    """同時執行比賽的兩個查詢"""
+    results, standings = await asyncio.gather(
+        get_race_results(race_id),
+        get_standings_after_race(race_id),
+    )
+    return {'results': results, 'standings': standings}
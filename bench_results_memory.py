@@ -0,0 +1,87 @@
+# bench_results_memory.py
+#
+# 成績 DataFrame 記憶體比較：原本的字串物件欄位 vs compact_frame 的精簡型別
+#   python bench_results_memory.py --sizes 10000,100000,1000000
+#
+# 每個大小會用假資料 (不需資料庫) 建立與 get_detailed_results 相同欄位的 DataFrame，
+# 再加上快照中的 GP_Name / Col_Name 衍生欄位，分別量測：
+#   1. 原本的寫法：object 字串、int64、字串日期，衍生欄位逐列計算
+#   2. compact_results_frame + category_labels / combined_labels
+# 記憶體為 DataFrame.memory_usage(deep=True)，包含字串物件本身。
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from compact_frame import category_labels, combined_labels, compact_results_frame
+
+RACE_POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+
+
+def gp_name(race_name):
+    # 與 app.extract_gp_name 相同 (不 import app，才不會碰到資料庫)
+    for suffix in ('衝刺賽', '正賽'):
+        if suffix in race_name:
+            return race_name.split(suffix)[0]
+    return race_name
+
+def synthetic_results(n_rows, n_drivers):
+    """n_rows 筆成績：每場 n_drivers 位車手，每個大獎賽一場衝刺賽 + 一場正賽"""
+    n_races = max(1, n_rows // n_drivers)
+    race_index = np.arange(n_races).repeat(n_drivers)[:n_rows]
+    driver_index = np.tile(np.arange(n_drivers), n_races)[:n_rows]
+    is_sprint = race_index % 2 == 0
+    gp = race_index // 2
+    position = (driver_index + race_index) % n_drivers + 1
+    dates = pd.Timestamp('2020-01-05') + pd.to_timedelta(gp * 7 + (~is_sprint).astype(int), unit='D')
+    points = np.where(position <= len(RACE_POINTS),
+                      np.array(RACE_POINTS + [0])[np.minimum(position, len(RACE_POINTS)) - 1], 0)
+    # 每一格都是獨立的 Python 字串 (與資料庫讀出來的結果相同)
+    return pd.DataFrame({
+        'Driver': [f'driver{d:05d}' for d in driver_index],
+        'Team': [f'Team {d // 2:04d}' for d in driver_index],
+        'Race_Name': [f'大獎賽{g:04d}{"衝刺賽" if s else "正賽"}' for g, s in zip(gp, is_sprint)],
+        'Race_Type': ['Sprint' if s else 'Race' for s in is_sprint],
+        'Race_Date': [d.strftime('%Y-%m-%d') for d in dates],
+        'Points': np.where(is_sprint, points // 3, points).astype('int64'),
+        'Position': position.astype('int64'),
+    })
+
+def object_frame(df):
+    df = df.copy()
+    df['GP_Name'] = df['Race_Name'].apply(gp_name)
+    df['Col_Name'] = df['Race_Type'] + '_' + df['Race_Name']
+    return df
+
+def compact_frame(df):
+    df = compact_results_frame(df)
+    df['GP_Name'] = category_labels(df['Race_Name'], gp_name)
+    df['Col_Name'] = combined_labels(df['Race_Type'], df['Race_Name'])
+    return df
+
+def measure(build, df):
+    start = time.perf_counter()
+    result = build(df)
+    elapsed = time.perf_counter() - start
+    return result.memory_usage(deep=True).sum() / 2 ** 20, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='成績 DataFrame 記憶體比較')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='成績筆數，以逗號分隔')
+    parser.add_argument('--drivers', type=int, default=40, help='每場比賽的車手數量')
+    args = parser.parse_args()
+
+    print(f"{'成績筆數':>10} {'原本 MB':>9} {'精簡 MB':>9} {'縮小倍數':>8} {'原本 s':>8} {'精簡 s':>8}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        df = synthetic_results(size, args.drivers)
+        object_mb, object_s = measure(object_frame, df)
+        compact_mb, compact_s = measure(compact_frame, df)
+        print(f"{size:>10} {object_mb:>9.1f} {compact_mb:>9.1f} {object_mb / compact_mb:>8.1f}x "
+              f"{object_s:>8.2f} {compact_s:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+from flask import abort, jsonify, request
+from sqlalchemy import func, select, text, update
+
+from database_setup import ChangeCheckpoint, ChangeLog
+
+# ====================================================================
+# 變更紀錄 (change data capture)：記下每一筆 drivers / races / results 的新增、修改、刪除
+# ====================================================================
+#
+# 觸發器 (database_setup.ensure_change_log) 把每次寫入附加到 change_log，seq 單調遞增，
+# insert_data.py、寫入 API、sqlite3 CLI 的寫入都會被記錄。
+#
+# 衍生資料的使用者 (consumer) 在 change_checkpoints 記住自己處理到哪個 seq：
+#   last_seq = claim_checkpoint(session, 'driver_ratings')  # 同時取得寫鎖，多個 worker 不會重複處理
+#   changes = read_changes(session, last_seq)
+#   ... 只重算受影響的部分 ...
+#   save_checkpoint(session, 'driver_ratings', changes)     # 與衍生資料在同一個 transaction 內 commit
+#
+# 外部程式 (匯出、其他服務) 可以輪詢 GET /api/changes?since=<seq>，自己保存 seq。
+
+CHANGE_FEED_LIMIT = 1000
+
+
+# ----------------------------------------------------
+# 1. 讀取變更 / 檢查點
+# ----------------------------------------------------
+def latest_seq(session):
+    return session.scalar(select(func.max(ChangeLog.seq))) or 0
+
+def read_changes(session, since_seq, tables=None, limit=None):
+    """回傳 seq > since_seq 的變更 (依 seq 排序)；tables 可限定表格名稱"""
+    stmt = select(ChangeLog).where(ChangeLog.seq > since_seq).order_by(ChangeLog.seq)
+    if tables:
+        stmt = stmt.where(ChangeLog.table_name.in_(list(tables)))
+    if limit:
+        stmt = stmt.limit(limit)
+    return session.scalars(stmt).all()
+
+def claim_checkpoint(session, consumer):
+    """
+    讀取 consumer 的檢查點 (第一次使用時建立為 0)。
+    這是一個寫入語句，會先取得 SQLite 寫鎖，同一時間只有一個 worker 能處理同一批變更。
+    """
+    return session.execute(
+        text("INSERT INTO change_checkpoints (consumer, last_seq) VALUES (:consumer, 0) "
+             "ON CONFLICT(consumer) DO UPDATE SET last_seq = last_seq RETURNING last_seq"),
+        {'consumer': consumer},
+    ).scalar()
+
+def save_checkpoint(session, consumer, changes):
+    """把檢查點移到這批變更的最後一筆 (沒有變更時不動)"""
+    if changes:
+        session.execute(
+            update(ChangeCheckpoint)
+            .where(ChangeCheckpoint.consumer == consumer)
+            .values(last_seq=changes[-1].seq)
+        )
+
+def changed_race_ids(changes):
+    """這批變更影響到的比賽 (成績修改前 / 後的比賽都算)"""
+    race_ids = set()
+    for change in changes:
+        race_ids.update(r for r in (change.race_id, change.old_race_id) if r is not None)
+    return race_ids
+
+
+# ----------------------------------------------------
+# 2. 變更串流 API
+# ----------------------------------------------------
+def change_record(change):
+    return {
+        'seq': change.seq, 'table': change.table_name, 'op': change.op, 'row_id': change.row_id,
+        'race_id': change.race_id, 'driver_id': change.driver_id,
+        'old_race_id': change.old_race_id, 'old_driver_id': change.old_driver_id,
+        'changed_at': change.changed_at,
+    }
+
+def register_change_feed(server, Session):
+    """GET /api/changes?since=<seq>&limit=<n>：回傳之後的變更與下一次要帶的 since"""
+
+    @server.route('/api/changes')
+    def change_feed():
+        try:
+            since = int(request.args.get('since', 0))
+            limit = min(CHANGE_FEED_LIMIT, int(request.args.get('limit', CHANGE_FEED_LIMIT)))
+        except ValueError:
+            abort(400)
+        with Session() as session:
+            changes = read_changes(session, since, limit=max(1, limit))
+            latest = latest_seq(session)
+        next_since = changes[-1].seq if changes else since
+        return jsonify(
+            changes=[change_record(change) for change in changes],
+            next_since=next_since,
+            latest_seq=latest,
+            has_more=next_since < latest,
+        )
+
+    return change_feed
@@ -0,0 +1,111 @@
+# check_export_static.py
+#
+# 增量靜態輸出的回歸檢查 (export_static.py 的指紋是否涵蓋所有輸入)：
+#   python check_export_static.py
+#
+# 檢查項目：
+#   1. 讓兩位車手的積分與名次分佈完全相同 (countback 也同分，依名稱排序)，完整輸出一次
+#   2. 只把其中一位的一次完賽名次往前一名 (積分不變)，兩人的 countback 順序因此交換
+#   3. 在同一個資料夾增量輸出，結果必須與在空資料夾完整輸出的每個檔案完全相同
+#      (且排名圖確實與修改前不同，確認這次修改有影響輸出)
+# 在暫存資料夾內使用資料庫副本執行，不會修改 f1_records.db。
+# 失敗時以非零代碼結束。
+
+import filecmp
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+# 總分第 2、3 名的車手 (第 1 名通常遙遙領先)
+PAIR_SQL = """
+SELECT d.driver_id, d.name FROM drivers d JOIN results r ON r.driver_id = d.driver_id
+GROUP BY d.driver_id ORDER BY SUM(r.points) DESC, d.name LIMIT 2 OFFSET 1
+"""
+
+def export(workdir, out_dir):
+    subprocess.run([sys.executable, 'export_static.py', out_dir], cwd=workdir, check=True, capture_output=True)
+
+def make_tie(db_path):
+    """
+    第二位車手每場的積分 / 名次改成與第一位相同 (內建資料每位車手都參加每一場)
+    回傳名稱在後的車手 (同分時排在後面)
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        (a_id, a_name), (b_id, b_name) = conn.execute(PAIR_SQL).fetchall()
+        conn.execute(
+            "UPDATE results SET (points, position) = "
+            "(SELECT a.points, a.position FROM results a WHERE a.driver_id = ? AND a.race_id = results.race_id) "
+            "WHERE driver_id = ? AND race_id IN (SELECT race_id FROM results WHERE driver_id = ?)",
+            (a_id, b_id, a_id))
+        conn.commit()
+        return max((a_id, a_name), (b_id, b_name), key=lambda driver: driver[1])
+    finally:
+        conn.close()
+
+def improve_worst_finish(db_path, driver_id):
+    """把車手最差的一次完賽往前一名 (只改名次)，回傳被修改的 result_id"""
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT result_id FROM results WHERE driver_id = ? AND position > 1 "
+                           "ORDER BY position DESC, result_id LIMIT 1", (driver_id,)).fetchone()
+        conn.execute("UPDATE results SET position = position - 1 WHERE result_id = ?", row)
+        conn.commit()
+        return row[0]
+    finally:
+        conn.close()
+
+def _same_content(left, right):
+    # JSON 比較解析後的內容：圖表可能來自 Figure 物件或共用快照的 dict，屬性順序不同但內容相同
+    if left.endswith('.json'):
+        with open(left, encoding='utf-8') as f, open(right, encoding='utf-8') as g:
+            return json.load(f) == json.load(g)
+    return filecmp.cmp(left, right, shallow=False)
+
+def different_files(left, right):
+    """回傳兩個資料夾內容不同 (或只存在一邊) 的檔案"""
+    left_files = {os.path.relpath(p, left) for p in glob.glob(os.path.join(left, '**', '*'), recursive=True) if os.path.isfile(p)}
+    right_files = {os.path.relpath(p, right) for p in glob.glob(os.path.join(right, '**', '*'), recursive=True) if os.path.isfile(p)}
+    different = sorted(left_files ^ right_files)
+    for rel_path in sorted(left_files & right_files):
+        if not _same_content(os.path.join(left, rel_path), os.path.join(right, rel_path)):
+            different.append(rel_path)
+    return different
+
+
+def check_export_static(src_dir='.'):
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for path in glob.glob(os.path.join(src_dir, '*.py')):
+            shutil.copy(path, workdir)
+        shutil.copy(os.path.join(src_dir, 'f1_records.db'), workdir)
+
+        db_path = os.path.join(workdir, 'f1_records.db')
+        driver_id, name = make_tie(db_path)
+        export(workdir, 'incremental')
+        shutil.copytree(os.path.join(workdir, 'incremental'), os.path.join(workdir, 'before'))
+
+        result_id = improve_worst_finish(db_path, driver_id)
+        print(f"已修改 {name} 的名次 (result_id={result_id})")
+        export(workdir, 'incremental')
+        export(workdir, 'full')
+        for rel_path in different_files(os.path.join(workdir, 'incremental'), os.path.join(workdir, 'full')):
+            failures.append(f"增量輸出與完整輸出不同: {rel_path}")
+        if 'data/driver_ranking.json' not in different_files(os.path.join(workdir, 'before'), os.path.join(workdir, 'full')):
+            failures.append("修改名次後排名圖沒有改變，檢查無效")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ 增量輸出檢查通過")
+    return not failures
+
+
+if __name__ == '__main__':
+    src = os.path.dirname(os.path.abspath(__file__))
+    sys.exit(0 if check_export_static(src) else 1)
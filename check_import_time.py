@@ -0,0 +1,88 @@
+# check_import_time.py
+#
+# 冷啟動回歸檢查 (用 python -X importtime 量測 `import app` 的時間)：
+#   python check_import_time.py [預算毫秒數，預設 3000]
+#
+# 檢查項目：
+#   1. `import app` 的累計載入時間不可超過預算
+#   2. `import app` 時不可載入 pandas / plotly.express (必須延後到第一次建圖)
+#   3. 有預先輸出的檔案 (export_static.py) 時，連建立網頁佈局都不可載入它們
+# 在暫存資料夾內使用資料庫副本執行，不會修改 f1_records.db。
+# 任何一項失敗都會以非零代碼結束，可直接放進部署前的檢查流程。
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+DEFAULT_BUDGET_MS = 3000
+LAZY_MODULES = ('pandas', 'plotly.express')
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 輸出，回傳 {模組名稱: 累計微秒}"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+def run_importtime(workdir, code):
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=workdir, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"執行失敗:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+def prepare_workdir(src_dir, workdir, with_precomputed):
+    for path in glob.glob(os.path.join(src_dir, '*.py')):
+        shutil.copy(path, workdir)
+    # 舊的 WAL 檔配上新複製的資料庫會損毀 (同一個資料夾準備第二次時)
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(os.path.join(workdir, 'f1_records.db' + suffix)):
+            os.remove(os.path.join(workdir, 'f1_records.db' + suffix))
+    shutil.copy(os.path.join(src_dir, 'f1_records.db'), workdir)
+    if with_precomputed:
+        subprocess.run([sys.executable, 'export_static.py'], cwd=workdir, check=True, capture_output=True)
+
+
+def check_import_time(budget_ms=DEFAULT_BUDGET_MS, src_dir='.'):
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare_workdir(src_dir, workdir, with_precomputed=False)
+
+        # 第一次執行會建立資料表與觸發器，先暖身一次，避免量到一次性的初始化
+        run_importtime(workdir, 'import app')
+        timings = run_importtime(workdir, 'import app')
+        app_ms = timings['app'] / 1000
+        print(f"import app: {app_ms:.0f} ms (預算 {budget_ms} ms)")
+        if app_ms > budget_ms:
+            failures.append(f"import app 花費 {app_ms:.0f} ms，超過預算 {budget_ms} ms")
+        for module in LAZY_MODULES:
+            if module in timings:
+                failures.append(f"import app 時不應載入 {module}")
+
+        # 有預先輸出的檔案時，建立佈局也不應載入 pandas / plotly.express
+        prepare_workdir(src_dir, workdir, with_precomputed=True)
+        timings = run_importtime(workdir, 'import app; app.serve_layout()')
+        for module in LAZY_MODULES:
+            if module in timings:
+                failures.append(f"使用預先輸出的檔案時不應載入 {module}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ 冷啟動檢查通過")
+    return not failures
+
+
+if __name__ == '__main__':
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS
+    src = os.path.dirname(os.path.abspath(__file__))
+    sys.exit(0 if check_import_time(budget, src) else 1)
@@ -0,0 +1,116 @@
+# check_whatif.py
+#
+# 假設情境積分榜的回歸檢查 (whatif.whatif_standings 的差異更新是否等於重新計算)：
+#   python check_whatif.py [次數，預設 500]
+#
+# 檢查項目：
+#   隨機產生小型聯賽 (名次範圍小、積分選項少，容易出現同分與 countback)，
+#   隨機修改幾筆成績 (改積分 / 改名次 / 取消資格，名次可能超出原本出現過的範圍)，
+#   whatif_standings 的結果必須與「套用修改後的成績」重新執行 countback_standings 完全相同
+#   (車手與車隊兩種積分榜，Rank / Rank_Change / Total_Points / Points_Change / Tiebreak 整個表格比較)
+# 不使用資料庫 (在暫存資料夾內執行，匯入 database_setup 不會修改 f1_records.db)；
+# 失敗時印出重現用的亂數種子並以非零代碼結束。
+
+import os
+import random
+import sys
+import tempfile
+
+DEFAULT_TRIALS = 500
+KINDS = (['Driver', 'Team'], ['Team'])
+
+
+def random_league(rng):
+    """回傳 {(車手, 比賽): (車隊, 積分, 名次)}；少數成績沒有名次 (未完賽)"""
+    drivers = [(f'driver{d}', f'team{d % rng.randint(2, 4)}') for d in range(rng.randint(3, 9))]
+    races = [f'race{r}' for r in range(rng.randint(1, 5))]
+    results = {}
+    for race in races:
+        for (driver, team), position in zip(drivers, rng.sample(range(1, len(drivers) + 1), len(drivers))):
+            if rng.random() < 0.1:
+                results[(driver, race)] = (team, 0, None)
+            else:
+                results[(driver, race)] = (team, rng.choice([0, 1, 2, 3]), position)
+    return results
+
+def random_edits(rng, results):
+    from whatif import normalize_edit, upsert_edit
+    edits = []
+    for driver, race in rng.sample(sorted(results), rng.randint(1, min(4, len(results)))):
+        edit = {'driver': driver, 'race': race, 'disqualified': rng.random() < 0.2}
+        if rng.random() < 0.7:
+            edit['position'] = rng.randint(1, 12)
+        if rng.random() < 0.7 or 'position' not in edit:
+            edit['points'] = rng.choice([0, 1, 2, 3])
+        edits = upsert_edit(edits, normalize_edit(edit))
+    return edits
+
+def position_counts(results, keys):
+    """與 app.get_driver_position_counts / get_team_position_counts 相同欄位的名次彙總"""
+    import pandas as pd
+    rows = [(driver, team, position, points) for (driver, _), (team, points, position) in results.items()]
+    frame = pd.DataFrame(rows, columns=['Driver', 'Team', 'Position', 'Points'])
+    return (frame.groupby(keys + ['Position'], dropna=False)
+            .agg(Count=('Points', 'size'), Points=('Points', 'sum')).reset_index())
+
+def apply_edits(results, edits):
+    from whatif import edited_result
+    edited = dict(results)
+    for edit in edits:
+        team, points, position = edited[(edit['driver'], edit['race'])]
+        edited[(edit['driver'], edit['race'])] = (team, *edited_result(edit, points, position))
+    return edited
+
+def expected_standings(results, edited, keys):
+    """重新計算的結果，加上與原本積分榜比較的 Rank_Change / Points_Change"""
+    from standings_ranking import countback_standings
+    from whatif import WHATIF_COLUMNS
+    before = countback_standings(position_counts(results, keys), keys).set_index(keys)
+    after = countback_standings(position_counts(edited, keys), keys)
+    indexed = after.set_index(keys)
+    after['Rank_Change'] = [before['Rank'][key] - rank for key, rank in zip(indexed.index, indexed['Rank'])]
+    after['Points_Change'] = [total - before['Total_Points'][key]
+                              for key, total in zip(indexed.index, indexed['Total_Points'])]
+    return after[keys + WHATIF_COLUMNS]
+
+def check_trial(seed):
+    """回傳失敗訊息 (通過時為 None)"""
+    import pandas as pd
+    from standings_ranking import countback_standings
+    from whatif import countback_index, whatif_delta_rows, whatif_standings
+    rng = random.Random(seed)
+    results = random_league(rng)
+    edits = random_edits(rng, results)
+    edited = apply_edits(results, edits)
+    delta, missing = whatif_delta_rows(edits, results)
+    assert not missing
+    for keys in KINDS:
+        counts = position_counts(results, keys)
+        index = countback_index(counts, countback_standings(counts, keys), keys)
+        actual = whatif_standings(index, delta)
+        expected = expected_standings(results, edited, keys)
+        try:
+            pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True),
+                                          check_dtype=False)
+        except AssertionError as e:
+            return f"種子 {seed} ({'/'.join(keys)})：{edits}\n{e}"
+    return None
+
+
+def check_whatif(trials=DEFAULT_TRIALS):
+    failures = [failure for failure in map(check_trial, range(trials)) if failure]
+    for failure in failures[:5]:
+        print(f"❌ {failure}")
+    if failures:
+        print(f"❌ {len(failures)} / {trials} 次不一致")
+    else:
+        print(f"✅ 假設情境積分榜檢查通過 ({trials} 次)")
+    return not failures
+
+
+if __name__ == '__main__':
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_TRIALS
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        ok = check_whatif(trials)
+    sys.exit(0 if ok else 1)
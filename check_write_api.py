@@ -0,0 +1,99 @@
+# check_write_api.py
+#
+# 批次寫入 API 的回歸檢查 (write_api.py)：
+#   python check_write_api.py
+#
+# 檢查項目：
+#   1. 格式錯誤的 payload (name / type / driver_name / position 是 list 或 dict) 回 400 與逐筆錯誤，不可以 500
+#   2. 同名同類型但日期不同的比賽 (下一個賽季) 建立新的比賽，原本的比賽日期與成績不變
+#   3. 同名同類型同日期再送一次只覆寫成績，不會多出比賽
+# 在暫存資料夾內使用資料庫副本執行，不會修改 f1_records.db。
+# 失敗時以非零代碼結束。
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+TOKEN = 'check-write-api'
+MALFORMED = {'races': [{
+    'name': ['日本正賽'], 'type': {'Race': 1}, 'date': '2026-01-08',
+    'results': [{'driver_name': ['mimicethan'], 'points': 25, 'position': [1]}],
+}]}
+
+
+def post(client, payload):
+    return client.post('/api/results', json=payload, headers={'Authorization': f'Bearer {TOKEN}'})
+
+def first_race(db_path):
+    """回傳第一場比賽的 (race_id, 名稱, 類型, 日期, 成績筆數) 與一位參賽車手"""
+    conn = sqlite3.connect(db_path)
+    try:
+        race = conn.execute("SELECT r.race_id, r.name, r.type, r.date, COUNT(s.result_id) FROM races r "
+                            "JOIN results s ON s.race_id = r.race_id GROUP BY r.race_id ORDER BY r.race_id LIMIT 1").fetchone()
+        driver = conn.execute("SELECT d.name FROM drivers d JOIN results s ON s.driver_id = d.driver_id "
+                              "WHERE s.race_id = ? ORDER BY d.name LIMIT 1", race[:1]).fetchone()[0]
+        return race, driver
+    finally:
+        conn.close()
+
+def race_rows(db_path, name, race_type):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT r.race_id, r.date, COUNT(s.result_id) FROM races r "
+                            "LEFT JOIN results s ON s.race_id = r.race_id WHERE r.name = ? AND r.type = ? "
+                            "GROUP BY r.race_id ORDER BY r.race_id", (name, race_type)).fetchall()
+    finally:
+        conn.close()
+
+
+def check_write_api(src_dir):
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        shutil.copy(os.path.join(src_dir, 'f1_records.db'), workdir)
+        # database_setup 以相對路徑開啟 f1_records.db：切換到暫存資料夾後才匯入
+        os.chdir(workdir)
+        from flask import Flask
+        from sqlalchemy.orm import sessionmaker
+        from database_setup import engine
+        from write_api import ADMIN_TOKEN_ENV, register_write_api
+
+        os.environ[ADMIN_TOKEN_ENV] = TOKEN
+        server = Flask(__name__)
+        register_write_api(server, sessionmaker(bind=engine))
+        client = server.test_client()
+        db_path = os.path.join(workdir, 'f1_records.db')
+
+        response = post(client, MALFORMED)
+        details = (response.get_json(silent=True) or {}).get('details', [])
+        if response.status_code != 400:
+            failures.append(f"格式錯誤的 payload 應回 400，實際為 {response.status_code}")
+        for field in ('name', 'type', 'driver_name', 'position'):
+            if not any(field in detail for detail in details):
+                failures.append(f"格式錯誤的 payload 沒有回報 {field} 的錯誤: {details}")
+
+        (race_id, name, race_type, race_date, result_count), driver = first_race(db_path)
+        next_season = f'{int(race_date[:4]) + 1}{race_date[4:]}'
+        payload = {'races': [{'name': name, 'type': race_type, 'date': next_season,
+                              'results': [{'driver_name': driver, 'points': 1, 'position': 1}]}]}
+        for attempt in range(2):
+            response = post(client, payload)
+            if response.status_code != 200:
+                failures.append(f"寫入下一個賽季的 {name} 失敗 ({response.status_code}): {response.get_data(as_text=True)}")
+        rows = race_rows(db_path, name, race_type)
+        if (race_id, race_date, result_count) not in rows:
+            failures.append(f"原本的 {name} ({race_date}) 被修改: {rows}")
+        if len(rows) != 2 or rows[-1][1:] != (next_season, 1):
+            failures.append(f"下一個賽季的 {name} 應只建立一場比賽 ({next_season}, 1 筆成績): {rows}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ 寫入 API 檢查通過")
+    return not failures
+
+
+if __name__ == '__main__':
+    src = os.path.dirname(os.path.abspath(__file__))
+    sys.exit(0 if check_write_api(src) else 1)
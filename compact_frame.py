@@ -0,0 +1,55 @@
+# ====================================================================
+# 精簡的成績 DataFrame：類別欄位用 categorical、數字用小整數、日期用 datetime
+# ====================================================================
+#
+# get_detailed_results 每位車手每場比賽一列，Driver / Team / Race_Name / Race_Type 大量重複，
+# 以 Python 字串物件存放時每一格都要一個指標 + 一個字串物件 (約 60~100 bytes)。
+#   - 文字欄位 → category (每列只存 int8/int16 代碼，字串本身只存一份)
+#   - Points → int32，Position → int16 (有缺少名次時為 float32)
+#   - Race_Date → datetime64 (排序、比較不必再比字串)
+# 由比賽名稱衍生的欄位 (GP_Name、Col_Name) 也只對類別本身計算 (category_labels / combined_labels)，
+# 不必每一列呼叫一次 Python 函數。
+# 類別一律依字母排序，排序結果與原本的字串欄位相同；groupby / pivot_table 需指定 observed=True。
+# 記憶體比較：python bench_results_memory.py
+
+CATEGORY_COLUMNS = ['Driver', 'Team', 'Race_Name', 'Race_Type']
+
+
+def compact_results_frame(df):
+    """把 get_detailed_results 的 DataFrame 轉成精簡型別 (回傳新的 DataFrame)"""
+    import pandas as pd
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        df[col] = df[col].astype('category')
+    df['Race_Date'] = pd.to_datetime(df['Race_Date'], errors='coerce')
+    df['Points'] = _small_number(df['Points'], 'int32')
+    df['Position'] = _small_number(df['Position'], 'int16')
+    return df
+
+def _small_number(series, dtype):
+    """沒有缺值時轉成指定的整數型別，否則轉成 float32 (NaN 代表缺值)"""
+    if series.isna().any():
+        return series.astype('float32')
+    return series.astype(dtype)
+
+
+def category_labels(series, func):
+    """對 categorical 的每個類別呼叫 func (而不是每一列)，回傳新的 categorical Series"""
+    import numpy as np
+    import pandas as pd
+    label_codes, labels = pd.factorize(series.cat.categories.map(func), sort=True)
+    codes = series.cat.codes.to_numpy()
+    new_codes = np.where(codes >= 0, label_codes[codes], -1) if len(label_codes) else codes
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories=labels), index=series.index)
+
+def combined_labels(left, right, sep='_'):
+    """left + sep + right，只對實際出現過的 (left, right) 組合組出字串"""
+    import numpy as np
+    import pandas as pd
+    width = len(right.cat.categories)
+    pair_codes, pairs = pd.factorize(left.cat.codes.to_numpy().astype('int64') * width
+                                     + right.cat.codes.to_numpy().astype('int64'))
+    left_of, right_of = pairs // width, pairs % width
+    names = [f'{left.cat.categories[l]}{sep}{right.cat.categories[r]}' for l, r in zip(left_of, right_of)]
+    categories, order = np.unique(names, return_inverse=True)
+    return pd.Series(pd.Categorical.from_codes(order[pair_codes], categories=categories), index=left.index)
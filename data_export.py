@@ -0,0 +1,199 @@
+import csv
+import io
+import json
+import os
+from itertools import groupby
+
+from flask import Response, abort
+from sqlalchemy import select
+
+from database_setup import Race, Result, Driver, get_data_version
+from query_cache import query_cache
+
+# ====================================================================
+# 串流匯出 (CSV / JSON / Parquet)：整個歷史成績直接下載成試算表，不必整批載入記憶體
+# ====================================================================
+#
+# GET /export/results.csv    - 每位車手每場比賽一列 (同 get_detailed_results)
+# GET /export/table.json     - 詳細成績表格 (每位車手一列、每場比賽 Points_ / Position_ 欄位)
+# GET /export/standings.parquet / team-standings.csv - 車手 / 車隊積分榜 (含 countback 名次)
+#
+# 1. 成績以 yield_per 逐批讀取 (SQLite cursor 本身就是邊讀邊取)，經由 generator 輸出
+# 2. Response 沒有 Content-Length，HTTP/1.1 會以 chunked transfer 傳送
+# 3. Parquet 每一批寫成一個 row group，寫完就把那段位元組送出
+# 積分榜本身每位車手只有一列 (countback 需要全部車手才能排序)，直接使用 app 的查詢結果
+# (查詢前先比對 data_version：其他 process 寫入過就清除查詢快取，不會匯出舊的積分榜)。
+
+EXPORT_BATCH_ROWS = int(os.environ.get('F1_EXPORT_BATCH_ROWS', 5000))
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+    'parquet': 'application/vnd.apache.parquet',
+}
+RESULT_COLUMNS = ['Driver', 'Team', 'Race_Name', 'Race_Type', 'Race_Date', 'Points', 'Position']
+STANDINGS_COLUMNS = {
+    'standings': ['Driver', 'Team', 'Total_Points', 'Rank', 'Tiebreak'],
+    'team-standings': ['Team', 'Total_Points', 'Rank', 'Tiebreak'],
+}
+# Parquet 欄位型別 (其餘欄位為字串)
+INTEGER_COLUMNS = {'Points', 'Position', 'Total_Points', 'Rank'}
+
+
+# ----------------------------------------------------
+# 1. 資料來源：每個都是 (欄位名稱, 產生「一批 dict」的 generator)
+# ----------------------------------------------------
+def _stream(session, stmt):
+    """以伺服器端 cursor 逐批讀取，每批最多 EXPORT_BATCH_ROWS 列"""
+    result = session.execute(stmt, execution_options={'yield_per': EXPORT_BATCH_ROWS})
+    yield from result.partitions()
+
+def stream_results(session):
+    stmt = (select(Driver.name, Driver.team, Race.name, Race.type, Race.date, Result.points, Result.position)
+            .join(Result, Driver.driver_id == Result.driver_id)
+            .join(Race, Race.race_id == Result.race_id)
+            .order_by(Driver.name, Race.date))
+    for rows in _stream(session, stmt):
+        yield [dict(zip(RESULT_COLUMNS, row)) for row in rows]
+
+def table_columns(session):
+    """與儀表板的詳細表格相同的欄位順序 (Points_ / Position_ + 比賽類型_比賽名稱)"""
+    # 儀表板的樞紐表格來自成績 join 比賽：還沒有成績的比賽不會有欄位
+    stmt = select(Race.name, Race.type).join(Result, Race.race_id == Result.race_id).distinct()
+    col_names = {f'{race_type}_{name}' for name, race_type in session.execute(stmt)}
+    race_columns = [f'{value}_{col}' for col in col_names for value in ('Points', 'Position')]
+    # 儀表板是對已排序的樞紐欄位做穩定排序，所以最後再依完整名稱排序
+    return ['Driver', 'Team', 'Total_Points'] + sorted(race_columns, key=lambda x: (x.split('_')[1], x.split('_')[0], x))
+
+def stream_table(session, columns):
+    """成績依車手排序後逐位車手組成一列 (一次只保留一位車手的成績)"""
+    stmt = (select(Driver.driver_id, Driver.name, Driver.team, Race.type, Race.name, Result.points, Result.position)
+            .join(Result, Driver.driver_id == Result.driver_id)
+            .join(Race, Race.race_id == Result.race_id)
+            .order_by(Driver.name, Driver.driver_id, Race.date))
+    known = set(columns)
+    batch = []
+    rows = (row for rows in _stream(session, stmt) for row in rows)
+    for _, driver_rows in groupby(rows, key=lambda row: row.driver_id):
+        driver_rows = list(driver_rows)
+        record = dict.fromkeys(columns)
+        record.update(Driver=driver_rows[0].name, Team=driver_rows[0].team,
+                      Total_Points=sum(row.points or 0 for row in driver_rows))
+        for _, _, _, race_type, race_name, points, position in driver_rows:
+            col = f'{race_type}_{race_name}'
+            # 同一場只取第一筆 (與 pivot_table aggfunc='first' 相同)；匯出途中新增的比賽略過
+            if f'Points_{col}' in known and record[f'Points_{col}'] is None:
+                record[f'Points_{col}'] = points
+                record[f'Position_{col}'] = position
+        batch.append(record)
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ----------------------------------------------------
+# 2. 輸出格式：把一批批的 dict 轉成位元組
+# ----------------------------------------------------
+def write_csv(columns, batches):
+    # UTF-8 BOM：Excel 才會正確顯示中文
+    yield '\ufeff'.encode('utf-8')
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def write_json(columns, batches):
+    yield b'['
+    first = True
+    for batch in batches:
+        chunk = ',\n'.join(json.dumps({col: row.get(col) for col in columns}, ensure_ascii=False) for row in batch)
+        if chunk:
+            yield ((b'\n' if first else b',\n') + chunk.encode('utf-8'))
+            first = False
+    yield b'\n]'
+
+class _ChunkSink(io.RawIOBase):
+    """ParquetWriter 的輸出目標：寫入的位元組暫存起來，由 take() 取走後送出"""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def write_parquet(columns, batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([
+        (col, pa.int64() if col in INTEGER_COLUMNS or col.startswith(('Points_', 'Position_')) else pa.string())
+        for col in columns
+    ])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            # 每一批一個 row group
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+WRITERS = {'csv': write_csv, 'json': write_json, 'parquet': write_parquet}
+
+
+# ----------------------------------------------------
+# 3. 註冊路由
+# ----------------------------------------------------
+def register_export_routes(server, Session, standings_queries):
+    """standings_queries：{'standings': get_total_standings, 'team-standings': get_team_standings}"""
+
+    def export_batches(dataset):
+        """回傳 (欄位, batches)；資料庫連線在 generator 結束 (或用戶端中斷) 時才關閉"""
+        if dataset in standings_queries:
+            columns = STANDINGS_COLUMNS[dataset]
+            with Session() as session:
+                query_cache.invalidate_for_version(get_data_version(session.connection()))
+            records = standings_queries[dataset]()[columns].to_dict('records')
+            return columns, iter([records[i:i + EXPORT_BATCH_ROWS] for i in range(0, len(records), EXPORT_BATCH_ROWS)])
+        session = Session()
+        try:
+            columns = RESULT_COLUMNS if dataset == 'results' else table_columns(session)
+        except Exception:
+            session.close()
+            raise
+
+        def batches():
+            try:
+                yield from stream_results(session) if dataset == 'results' else stream_table(session, columns)
+            finally:
+                session.close()
+        return columns, batches()
+
+    @server.route('/export/<dataset>.<fmt>')
+    def export_dataset(dataset, fmt):
+        if fmt not in EXPORT_FORMATS or dataset not in ('results', 'table', *standings_queries):
+            abort(404)
+        columns, batches = export_batches(dataset)
+        response = Response(WRITERS[fmt](columns, batches), mimetype=EXPORT_FORMATS[fmt])
+        response.headers['Content-Disposition'] = f'attachment; filename=f1_{dataset}.{fmt}'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    return export_dataset
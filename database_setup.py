@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 
 # --- 1. 資料庫連線設定 ---
@@ -18,6 +18,9 @@ class Driver(Base):
     # 設置關係，方便查詢某選手的所有成績
     results = relationship("Result", back_populates="driver")
 
+    # 車手名稱前綴搜尋 (不分大小寫，LIKE 'abc%' 可以直接使用這個索引)
+    __table_args__ = (Index('ix_drivers_name_nocase', name.collate('NOCASE')),)
+
 class Race(Base):
     __tablename__ = 'races'
     race_id = Column(Integer, primary_key=True)
@@ -40,9 +43,141 @@ class Result(Base):
     driver = relationship("Driver", back_populates="results")
     race = relationship("Race", back_populates="results")
 
+class DataMeta(Base):
+    __tablename__ = 'data_meta'
+    key = Column(String, primary_key=True) # 例如: data_version
+    value = Column(Integer, nullable=False, default=0)
+
+# --- 車手評分 (Elo)：由 driver_ratings.py 依比賽日期逐場更新 ---
+class DriverRating(Base):
+    __tablename__ = 'driver_ratings'
+    driver_id = Column(Integer, ForeignKey('drivers.driver_id'), primary_key=True)
+    rating = Column(Float, nullable=False)   # 目前評分 (最後一場賽後)
+    races = Column(Integer, nullable=False, default=0) # 已計入的比賽場數
+
+class RatingHistory(Base):
+    __tablename__ = 'rating_history'
+    history_id = Column(Integer, primary_key=True)
+    driver_id = Column(Integer, ForeignKey('drivers.driver_id'), nullable=False)
+    race_id = Column(Integer, ForeignKey('races.race_id'), nullable=False)
+    race_date = Column(String, nullable=False) # 計算當時的比賽日期 (比賽被刪除或改日期時用來倒帶)
+    position = Column(Integer)
+    rating_before = Column(Float, nullable=False)
+    rating_after = Column(Float, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('driver_id', 'race_id'),
+        Index('ix_rating_history_order', 'race_date', 'race_id'),
+    )
+
+# --- 變更紀錄 (change data capture)：由觸發器寫入，只新增不修改 ---
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+    seq = Column(Integer, primary_key=True) # 遞增序號 (AUTOINCREMENT，刪除舊紀錄後也不會重複使用)
+    table_name = Column(String, nullable=False) # drivers / races / results
+    op = Column(String, nullable=False)         # INSERT / UPDATE / DELETE
+    row_id = Column(Integer, nullable=False)    # 該列的主鍵
+    race_id = Column(Integer)       # 受影響的比賽 (races / results；DELETE 時為被刪除列的值)
+    driver_id = Column(Integer)     # 受影響的車手 (drivers / results)
+    old_race_id = Column(Integer)   # UPDATE results 時修改前的值 (成績可能被移到別場比賽)
+    old_driver_id = Column(Integer)
+    changed_at = Column(String, server_default=text('CURRENT_TIMESTAMP'))
+
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class ChangeCheckpoint(Base):
+    __tablename__ = 'change_checkpoints'
+    consumer = Column(String, primary_key=True) # 例如: driver_ratings
+    last_seq = Column(Integer, nullable=False, default=0) # 已處理到的 change_log.seq
+
+# --- 封存賽季的彙總 (season_archive.py)：比賽與成績移到 Parquet 封存檔，這裡每位車手 / 每個車隊留一列 ---
+class SeasonSummary(Base):
+    __tablename__ = 'season_summaries'
+    season = Column(String, primary_key=True)  # 比賽日期的年份，例如 2025
+    kind = Column(String, primary_key=True)    # driver / team
+    name = Column(String, primary_key=True)    # 車手或車隊名稱
+    team = Column(String)                      # 車手當時的車隊 (kind = team 時與 name 相同)
+    races = Column(Integer, nullable=False)    # 出賽場數
+    points = Column(Integer, nullable=False)
+    type_points = Column(String, nullable=False)      # JSON：{"Race": 120, "Sprint": 30}
+    position_counts = Column(String, nullable=False)  # JSON：{"1": 3, "2": 1} (countback 用)
+    rating = Column(Float)                     # 賽季結束時的評分 (只有車手)
+    archive_file = Column(String, nullable=False)     # 封存檔路徑 (相對於執行目錄)
+
+
+# --- 3. 資料版本號 (由 SQLite 觸發器自動遞增) ---
+# 任何寫入 drivers / races / results 的動作 (包括 insert_data.py、sqlite3 CLI)
+# 都會讓 data_meta.data_version +1，網頁只要比對這個數字就知道資料有沒有變。
+VERSIONED_TABLES = ['drivers', 'races', 'results']
+
+def ensure_data_version(engine):
+    """建立 data_version 初始值與觸發器 (可重複執行)"""
+    with engine.begin() as conn:
+        conn.execute(text("INSERT OR IGNORE INTO data_meta (key, value) VALUES ('data_version', 0)"))
+        for table in VERSIONED_TABLES:
+            for action in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{action.lower()}_version "
+                    f"AFTER {action} ON {table} BEGIN "
+                    f"UPDATE data_meta SET value = value + 1 WHERE key = 'data_version'; "
+                    f"END"
+                ))
+
+# 每個表格的 (row_id, race_id, driver_id, old_race_id, old_driver_id) 取值方式；{row} 為 NEW 或 OLD
+CHANGE_LOG_COLUMNS = {
+    'drivers': ('{row}.driver_id', 'NULL', '{row}.driver_id'),
+    'races': ('{row}.race_id', '{row}.race_id', 'NULL'),
+    'results': ('{row}.result_id', '{row}.race_id', '{row}.driver_id'),
+}
+# 舊版的評分待處理清單 (已由 change_log 取代)
+LEGACY_RATING_TRIGGERS = ['results_insert', 'results_update', 'results_delete', 'races_update', 'races_delete']
+
+def ensure_change_log(engine):
+    """建立變更紀錄的觸發器 (可重複執行)"""
+    with engine.begin() as conn:
+        for table, (row_id, race_id, driver_id) in CHANGE_LOG_COLUMNS.items():
+            for action in ('INSERT', 'UPDATE', 'DELETE'):
+                row = 'OLD' if action == 'DELETE' else 'NEW'
+                old_race_id, old_driver_id = 'NULL', 'NULL'
+                if action == 'UPDATE' and table == 'results':
+                    old_race_id, old_driver_id = 'OLD.race_id', 'OLD.driver_id'
+                values = ', '.join(v.format(row=row) for v in (row_id, race_id, driver_id)) + f', {old_race_id}, {old_driver_id}'
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{action.lower()}_change_log "
+                    f"AFTER {action} ON {table} BEGIN "
+                    f"INSERT INTO change_log (table_name, op, row_id, race_id, driver_id, old_race_id, old_driver_id) "
+                    f"VALUES ('{table}', '{action}', {values}); "
+                    f"END"
+                ))
+        for name in LEGACY_RATING_TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{name}_rating_pending"))
+        conn.execute(text("DROP TABLE IF EXISTS rating_pending"))
+
+def ensure_indexes(engine):
+    """替既有的資料表補上索引 (create_all 不會替已存在的表格建立新索引)"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+def get_data_version(conn):
+    """讀取目前的資料版本號 (單列查詢，成本極低)"""
+    return conn.execute(text("SELECT value FROM data_meta WHERE key = 'data_version'")).scalar() or 0
+
+def bump_data_version(conn):
+    """衍生資料 (例如車手評分) 改變時手動 +1，網頁會像成績改變時一樣重新計算"""
+    conn.execute(text("UPDATE data_meta SET value = value + 1 WHERE key = 'data_version'"))
+
+
+def init_database(engine):
+    """建立所有表格、觸發器與索引 (可重複執行；每個聯賽的資料庫都用這個初始化)"""
+    Base.metadata.create_all(engine)
+    ensure_data_version(engine)
+    ensure_change_log(engine)
+    ensure_indexes(engine)
+
 
-# --- 3. 執行創建 ---
+# --- 4. 執行創建 ---
 # 根據上面定義的 Class，在資料庫中創建對應的表格
-Base.metadata.create_all(engine)
+init_database(engine)
 
 print("✅ 資料庫 f1_records.db 和所有表格已成功創建！")
\ No newline at end of file
@@ -0,0 +1,245 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from league_pool import DEFAULT_LEAGUE, league_data_dir, league_database, league_exists, league_names
+
+# ====================================================================
+# 線上備份：網站與寫入都在進行中時，也能複製出一致、完整的資料庫快照
+# ====================================================================
+#
+#   python db_backup.py                     # 備份預設聯賽一次
+#   python db_backup.py --all-leagues       # 備份所有聯賽
+#   python db_backup.py --every 60          # 排程：每 60 分鐘備份一次 (持續執行)
+#   python db_backup.py list                # 列出現有的備份
+# 網站內排程：設定 F1_BACKUP_INTERVAL_MINUTES 後由 app 啟動 start_backup_scheduler()
+# (多個 worker 以檔案鎖互斥，同一時間只有一個在備份)。
+#
+# 直接 cp 資料庫檔案可能複製到寫一半的頁面，鎖住整個檔案又會卡住讀取，所以：
+# 1. 使用 SQLite 線上備份 API，每次只複製 BACKUP_PAGES 頁，兩批之間釋放讀鎖並稍停；
+#    WAL 模式下讀取者與寫入者都不會被擋住。備份途中來源被其他連線寫入時 SQLite 會從頭重來，
+#    重來超過 BACKUP_MAX_RESTARTS 次 (寫入太頻繁) 就改用 VACUUM INTO (單一讀取 transaction，不會重來)
+# 2. 先寫到暫存檔，PRAGMA integrity_check 通過後才改名成正式的備份檔 (journal_mode 改回 DELETE，單一檔案即可還原)
+# 3. 每個聯賽只保留最新的 BACKUP_KEEP 份
+# 還原：停止網站後把備份檔複製回 f1_records.db (或 leagues/<名稱>.db)，並刪除舊的 -wal / -shm。
+
+BACKUP_DIR = os.environ.get('F1_BACKUP_DIR', 'backups')
+BACKUP_KEEP = int(os.environ.get('F1_BACKUP_KEEP', 7))
+BACKUP_PAGES = int(os.environ.get('F1_BACKUP_PAGES', 1024))
+BACKUP_SLEEP = float(os.environ.get('F1_BACKUP_SLEEP', 0.01))
+BACKUP_MAX_RESTARTS = 3
+BACKUP_INTERVAL_ENV = 'F1_BACKUP_INTERVAL_MINUTES'
+LOCK_NAME = '.backup.lock'
+
+
+class BackupError(RuntimeError):
+    """備份失敗 (暫存檔已刪除，舊的備份不受影響)"""
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+# ----------------------------------------------------
+# 1. 複製 (線上備份 API，必要時改用 VACUUM INTO)
+# ----------------------------------------------------
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute('PRAGMA busy_timeout=5000')
+    return connection
+
+def _copy_with_backup_api(source, tmp_path, pages, sleep):
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        # 剩餘頁數變多代表來源被寫入、備份從頭開始
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=sleep)
+    finally:
+        target.close()
+
+def _copy_with_vacuum(source, tmp_path):
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    source.execute('VACUUM INTO ?', (tmp_path,))
+
+def copy_database(source_path, tmp_path, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+    """回傳使用的方法 ('backup' / 'vacuum')"""
+    source = _connect(source_path)
+    try:
+        try:
+            _copy_with_backup_api(source, tmp_path, pages, sleep)
+            return 'backup'
+        except _TooManyRestarts:
+            _copy_with_vacuum(source, tmp_path)
+            return 'vacuum'
+    finally:
+        source.close()
+
+
+# ----------------------------------------------------
+# 2. 驗證
+# ----------------------------------------------------
+def verify_backup(path):
+    """完整性檢查並改成單一檔案模式，回傳備份中的資料版本；失敗時丟出 BackupError"""
+    connection = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in connection.execute('PRAGMA integrity_check')]
+        if problems != ['ok']:
+            raise BackupError(f'完整性檢查失敗: {"; ".join(problems[:5])}')
+        connection.execute('PRAGMA journal_mode=DELETE')
+        row = connection.execute("SELECT value FROM data_meta WHERE key = 'data_version'").fetchone()
+        return row[0] if row else 0
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f'無法讀取備份: {e}') from e
+    finally:
+        connection.close()
+
+
+# ----------------------------------------------------
+# 3. 備份一個聯賽 + 輪替
+# ----------------------------------------------------
+def backup_dir(league):
+    return league_data_dir(league, BACKUP_DIR)
+
+def list_backups(league):
+    """依時間由新到舊排列的備份檔"""
+    directory = backup_dir(league)
+    if not os.path.isdir(directory):
+        return []
+    prefix = f'{league}-'
+    names = [f for f in os.listdir(directory) if f.startswith(prefix) and f.endswith('.db')]
+    return [os.path.join(directory, f) for f in sorted(names, reverse=True)]
+
+def rotate_backups(league, keep=BACKUP_KEEP):
+    """只保留最新的 keep 份，回傳刪除的檔案"""
+    removed = list_backups(league)[keep:]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+@contextmanager
+def _backup_lock(directory):
+    """同一個備份資料夾同時只有一個備份在進行 (其他 worker / 排程直接略過)；沒有 fcntl 時不上鎖"""
+    try:
+        import fcntl
+    except ImportError:
+        yield True
+        return
+    with open(os.path.join(directory, LOCK_NAME), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def backup_league(league, keep=BACKUP_KEEP, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, min_age=0):
+    """
+    備份一個聯賽，回傳摘要 dict；另一個備份正在進行、或最新的備份比 min_age 秒還新時 skipped 為 True
+    (網站的每個 worker 都有排程，先到的 worker 備份，其他的看到新備份就略過)
+    """
+    directory = backup_dir(league)
+    os.makedirs(directory, exist_ok=True)
+    with _backup_lock(directory) as acquired:
+        if not acquired:
+            return {'league': league, 'skipped': True}
+        latest = list_backups(league)[:1]
+        if min_age and latest and time.time() - os.path.getmtime(latest[0]) < min_age:
+            return {'league': league, 'skipped': True}
+        start = time.perf_counter()
+        tmp_path = os.path.join(directory, f'.{league}-{uuid.uuid4().hex}.tmp')
+        try:
+            method = copy_database(league_database(league), tmp_path, pages, sleep)
+            version = verify_backup(tmp_path)
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            path = os.path.join(directory, f'{league}-{stamp}-v{version}.db')
+            os.replace(tmp_path, path)
+        except sqlite3.Error as e:
+            raise BackupError(f'{league}: {e}') from e
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        removed = rotate_backups(league, keep)
+        return {'league': league, 'skipped': False, 'path': path, 'method': method, 'version': version,
+                'bytes': os.path.getsize(path), 'seconds': round(time.perf_counter() - start, 2),
+                'removed': removed}
+
+
+# ----------------------------------------------------
+# 4. 排程
+# ----------------------------------------------------
+def backup_all(leagues=None, report=print, min_age=0):
+    """逐一備份；單一聯賽失敗不影響其他聯賽"""
+    for league in leagues or league_names():
+        try:
+            summary = backup_league(league, min_age=min_age)
+        except BackupError as e:
+            report(f'⚠️ 備份失敗 {e}')
+            continue
+        if summary['skipped']:
+            report(f'{league}: 另一個備份正在進行或剛完成，略過')
+        else:
+            report(f"✅ {league}: {summary['path']} ({summary['method']}, v{summary['version']}, "
+                   f"{summary['bytes'] / 2 ** 20:.1f} MB, {summary['seconds']} 秒)")
+
+def start_backup_scheduler(interval_minutes=None):
+    """網站內的定期備份 (daemon thread)；未設定 F1_BACKUP_INTERVAL_MINUTES 時不啟動，回傳 thread 或 None"""
+    interval_minutes = interval_minutes or float(os.environ.get(BACKUP_INTERVAL_ENV, 0) or 0)
+    if interval_minutes <= 0:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval_minutes * 60)
+            # 保留一點誤差：其他 worker 稍早完成的備份也算數
+            backup_all(min_age=interval_minutes * 60 * 0.9)
+
+    thread = threading.Thread(target=run, name='f1-backup', daemon=True)
+    thread.start()
+    return thread
+
+
+# ----------------------------------------------------
+# 5. 命令列
+# ----------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='SQLite 線上備份 (不會擋住網站讀取)')
+    parser.add_argument('command', nargs='?', choices=('backup', 'list'), default='backup')
+    parser.add_argument('--league', action='append', help='聯賽名稱 (可重複；預設為主要聯賽)')
+    parser.add_argument('--all-leagues', action='store_true', help='備份所有聯賽')
+    parser.add_argument('--every', type=float, metavar='MINUTES', help='每隔幾分鐘備份一次 (持續執行)')
+    args = parser.parse_args()
+
+    leagues = league_names() if args.all_leagues else (args.league or [DEFAULT_LEAGUE])
+    for league in leagues:
+        if not league_exists(league):
+            sys.exit(f'找不到聯賽: {league}')
+    if args.command == 'list':
+        for league in leagues:
+            for path in list_backups(league):
+                print(f'{path}  {os.path.getsize(path) / 2 ** 20:.1f} MB')
+        return
+    backup_all(leagues)
+    while args.every:
+        time.sleep(args.every * 60)
+        backup_all(league_names() if args.all_leagues else leagues)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+from sqlalchemy import delete, exists, insert, select
+
+from async_queries import season_order
+from change_log import changed_race_ids, claim_checkpoint, read_changes, save_checkpoint
+from database_setup import DriverRating, Race, RatingHistory, Result, bump_data_version
+
+# ====================================================================
+# 車手評分 (多人 Elo)：積分看不出對手強弱，評分會把「贏了誰」算進去
+# ====================================================================
+#
+# 每場比賽把完賽名次拆成兩兩對決：名次較前得 1 分、同名次各 0.5 分，
+# 與 Elo 預期勝率 1 / (1 + 10^((對手 - 自己) / 400)) 比較，
+#   新評分 = 舊評分 + K * (實際得分 - 預期得分) / (出賽人數 - 1)
+# 一場比賽最多變動 K 分，與參賽人數無關。
+#
+# 增量更新 (不重播整個歷史)：
+#   - driver_ratings 存每位車手目前的評分，rating_history 存每場賽前 / 賽後的評分
+#   - 新比賽只需讀取該場車手的目前評分，成本只與該場的參賽人數有關 (以 numpy 向量化計算)
+#   - 從 change_log 讀取上次處理後的成績 / 比賽變更 (檢查點 RATING_CONSUMER)，
+#     從最早受影響那一天的第一場倒帶 (還原 rating_before)，之後的比賽再依序重算
+#   - 比賽的先後與其他圖表相同 (async_queries.season_order：日期、同一天先衝刺賽後正賽、race_id)
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 32.0
+# 一次計算多少位車手的預期勝率 (RATING_CHUNK x 出賽人數 的矩陣)
+RATING_CHUNK = 512
+# change_log 檢查點名稱
+RATING_CONSUMER = 'driver_ratings'
+
+
+# ----------------------------------------------------
+# 1. 單場比賽的評分變化
+# ----------------------------------------------------
+def race_rating_deltas(ratings, positions):
+    """ratings / positions 為同順序的 list，回傳每位車手的評分變化"""
+    import numpy as np
+    n = len(ratings)
+    if n < 2:
+        return [0.0] * n
+    ratings = np.asarray(ratings, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+
+    # 實際得分：贏過的人數 + 同名次人數 x 0.5 (排序後二分搜尋，不必兩兩比較)
+    ordered = np.sort(positions)
+    after = np.searchsorted(ordered, positions, side='right')
+    before = np.searchsorted(ordered, positions, side='left')
+    actual = (n - after) + 0.5 * (after - before - 1)
+
+    # 預期得分：對每位對手的 Elo 勝率加總 (扣掉自己對自己的 0.5)；分批計算，大型聯賽也不會佔用大量記憶體
+    expected = np.empty(n)
+    for start in range(0, n, RATING_CHUNK):
+        block = ratings[start:start + RATING_CHUNK, None]
+        expected[start:start + RATING_CHUNK] = (1.0 / (1.0 + 10 ** ((ratings[None, :] - block) / 400.0))).sum(axis=1) - 0.5
+    return (K_FACTOR * (actual - expected) / (n - 1)).tolist()
+
+def apply_race(session, race_id, race_date):
+    """計算一場比賽並寫入 rating_history / driver_ratings"""
+    results = session.execute(
+        select(Result.driver_id, Result.position).where(Result.race_id == race_id)
+    ).all()
+    driver_ids = [driver_id for driver_id, _ in results]
+    current = {
+        rating.driver_id: rating
+        for rating in session.scalars(select(DriverRating).where(DriverRating.driver_id.in_(driver_ids)))
+    }
+    before = [current[d].rating if d in current else INITIAL_RATING for d in driver_ids]
+    # 沒有名次的成績視為最後一名
+    positions = [position if position is not None else float('inf') for _, position in results]
+    deltas = race_rating_deltas(before, positions)
+
+    history = []
+    for (driver_id, position), rating_before, delta in zip(results, before, deltas):
+        rating_after = rating_before + delta
+        history.append({
+            'driver_id': driver_id, 'race_id': race_id, 'race_date': race_date, 'position': position,
+            'rating_before': rating_before, 'rating_after': rating_after,
+        })
+        if driver_id in current:
+            current[driver_id].rating = rating_after
+            current[driver_id].races += 1
+        else:
+            session.add(DriverRating(driver_id=driver_id, rating=rating_after, races=1))
+    if history:
+        session.execute(insert(RatingHistory), history)
+    return len(history)
+
+
+# ----------------------------------------------------
+# 2. 倒帶：刪除某一天 (含) 之後的評分紀錄，並把車手評分還原成當時的賽前評分
+# ----------------------------------------------------
+# 以日期為單位倒帶：同一天的先後取決於比賽類型，被修改或刪除的比賽可能已經查不到當時的類型，
+# 整天重算最多多算幾場，不會漏掉
+def rewind_ratings(session, from_date):
+    """刪除 race_date >= from_date 的評分紀錄"""
+    rows = session.execute(
+        select(RatingHistory.driver_id, RatingHistory.rating_before)
+        .where(RatingHistory.race_date >= from_date)
+        # history_id 就是當時計算的順序
+        .order_by(RatingHistory.race_date, RatingHistory.history_id)
+    ).all()
+    if not rows:
+        return 0
+
+    restored, removed = {}, {}
+    for driver_id, rating_before in rows:
+        restored.setdefault(driver_id, rating_before)
+        removed[driver_id] = removed.get(driver_id, 0) + 1
+    for rating in session.scalars(select(DriverRating).where(DriverRating.driver_id.in_(list(restored)))):
+        rating.rating = restored[rating.driver_id]
+        rating.races -= removed[rating.driver_id]
+    session.execute(delete(RatingHistory).where(RatingHistory.race_date >= from_date))
+    return len(rows)
+
+
+# ----------------------------------------------------
+# 3. 增量更新 (只在寫入端呼叫：啟動時、寫入佇列 commit 之後、封存賽季前；沒有新資料時只做兩個小查詢)
+# 儀表板只讀取 rating_history；評分有變化時讓 data_version +1，各 worker 會重新計算快照
+# ----------------------------------------------------
+def _unrated_races(session):
+    """有成績但還沒有評分紀錄的比賽，依賽季中的先後排序 (season_order)"""
+    has_results = exists().where(Result.race_id == Race.race_id)
+    is_rated = exists().where(RatingHistory.race_id == Race.race_id)
+    return session.execute(
+        select(Race.race_id, Race.date)
+        .where(has_results, ~is_rated, Race.date.isnot(None))
+        .order_by(*season_order())
+    ).all()
+
+def update_ratings(Session):
+    """處理新比賽與被修改的比賽，回傳這次計算的比賽場數"""
+    session = Session()
+    try:
+        # 先讀取檢查點 (第一個語句就是寫入，取得寫鎖，多個 worker 不會重複計算)
+        last_seq = claim_checkpoint(session, RATING_CONSUMER)
+        changes = read_changes(session, last_seq)
+        # 新增的比賽還沒有成績，不影響評分；車手資料的變更也不影響
+        pending_ids = list(changed_race_ids(
+            c for c in changes if c.table_name == 'results' or (c.table_name == 'races' and c.op != 'INSERT')
+        ))
+        unrated = _unrated_races(session)
+
+        # 倒帶起點：被修改比賽的舊日期 / 新日期，以及日期早於已評分比賽的新比賽
+        dates = [race_date for _, race_date in unrated]
+        if pending_ids:
+            dates += session.scalars(
+                select(RatingHistory.race_date).where(RatingHistory.race_id.in_(pending_ids)).distinct()
+            ).all()
+            dates += session.scalars(
+                select(Race.date).where(Race.race_id.in_(pending_ids), Race.date.isnot(None))
+            ).all()
+        rewound = rewind_ratings(session, min(dates)) if dates else 0
+        if rewound:
+            unrated = _unrated_races(session)
+
+        for race_id, race_date in unrated:
+            apply_race(session, race_id, race_date)
+        save_checkpoint(session, RATING_CONSUMER, changes)
+        if rewound or unrated:
+            bump_data_version(session.connection())
+        session.commit()
+        return len(unrated)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
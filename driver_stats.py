@@ -0,0 +1,56 @@
+# ====================================================================
+# 車手成績統計：一次 groupby 算出所有指標 (不必每個指標各查一次資料庫)
+# ====================================================================
+#
+# 依據 Result.position / Result.points：
+#   Starts           出賽場數
+#   Wins             冠軍次數 (position == 1)
+#   Podiums          頒獎台次數 (position <= 3)
+#   Points_Finishes  得分場數 (points > 0)
+#   Avg_Position     平均完賽名次
+#   Median_Position  完賽名次中位數
+#   Best / Worst     最佳 / 最差名次
+#   Position_Std     名次標準差 (越小越穩定)
+# 沒有名次的成績 (例如取消資格) 計入出賽場數，但不計入名次相關的指標。
+# SQLite 沒有 median / stddev 聚合函數，所以在已經讀出的 df_detailed 上做一次向量化 groupby。
+
+STAT_COLUMNS = ['Driver', 'Team', 'Starts', 'Wins', 'Podiums', 'Points_Finishes',
+                'Avg_Position', 'Median_Position', 'Best', 'Worst', 'Position_Std']
+
+
+def compute_driver_stats(df_detailed, driver_order=None):
+    """由 df_detailed (每位車手每場一列) 計算統計表；driver_order 用來指定排序 (例如總分排名)"""
+    position = df_detailed['Position'].astype('float64')
+    points = df_detailed['Points'].astype('int64')
+    df = df_detailed[['Driver', 'Team']].assign(
+        Position=position,
+        Win=(position == 1).astype('int64'),
+        Podium=(position <= 3).astype('int64'),
+        Points_Finish=(points > 0).astype('int64'),
+    )
+
+    stats = df.groupby('Driver', sort=False, observed=True).agg(
+        Team=('Team', 'first'),
+        Starts=('Position', 'size'),
+        Wins=('Win', 'sum'),
+        Podiums=('Podium', 'sum'),
+        Points_Finishes=('Points_Finish', 'sum'),
+        Avg_Position=('Position', 'mean'),
+        Median_Position=('Position', 'median'),
+        Best=('Position', 'min'),
+        Worst=('Position', 'max'),
+        Position_Std=('Position', 'std'),
+    )
+    if driver_order is not None:
+        stats = stats.reindex([d for d in driver_order if d in stats.index])
+
+    stats[['Best', 'Worst']] = stats[['Best', 'Worst']].astype('Int64')
+    stats[['Avg_Position', 'Median_Position', 'Position_Std']] = (
+        stats[['Avg_Position', 'Median_Position', 'Position_Std']].round(2)
+    )
+    return stats.reset_index()[STAT_COLUMNS]
+
+
+def stats_records(df_stats):
+    """轉成 DataTable 用的 list[dict] (只出賽一場時標準差為 NaN，轉成 None)"""
+    return df_stats.astype(object).where(df_stats.notna(), None).to_dict('records')
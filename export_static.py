@@ -0,0 +1,197 @@
+# export_static.py
+#
+# 把目前的排名輸出成純靜態網站 (不需要 Python / 資料庫即可瀏覽)：
+#   python export_static.py [輸出資料夾，預設 static_site]
+#
+# 輸出內容：
+#   index.html              - 網頁外殼 (用 Plotly.js 畫圖、用 JS 產生表格)
+#   plotly.min.js           - Plotly 函式庫 (隨 plotly 版本更新)
+#   data/meta.json          - 大獎賽數量文字、深入分析選單、分類積分榜、隊友對決 (app.META_VIEWS)
+#   data/team_ranking.json  - create_team_ranking_figure 的圖表 JSON
+#   data/driver_ranking.json - create_ranking_figure 的圖表 JSON
+#   data/rating_history.json - create_rating_figure 的車手評分走勢圖
+#   data/driver_bump.json / data/team_bump.json - 每站賽後的車手 / 車隊名次走勢
+#   data/table.json         - 詳細單場成績表格
+#   data/results.json       - 精簡欄式成績資料 (給 Dash 版瀏覽器端篩選使用)
+#
+# 增量輸出：manifest.json 記錄每個檔案「輸入資料」的指紋，
+# 輸入沒變的檔案不會重新序列化、也不會被覆寫 (檔案時間不變，CDN 快取也不會失效)。
+# 指紋必須涵蓋所有會影響內容的輸入：名次 (Position) 會改變 countback 排名與名次走勢，
+# 排名表 (Rank / Tiebreak) 決定圖表的順序與標籤，CHART_TOP_N 決定畫哪些車手 / 車隊。
+# manifest 也記錄 chart_top_n，設定不同時 app.load_precomputed_snapshot 不會使用這些檔案。
+
+import hashlib
+import json
+import os
+import sys
+
+import pandas as pd
+import plotly
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+import app
+
+MANIFEST_NAME = 'manifest.json'
+
+INDEX_HTML = """<!DOCTYPE html>
+<html lang="zh-Hant">
+<head>
+<meta charset="utf-8">
+<title>我們遊戲的 F1 總積分排名紀錄</title>
+<script src="plotly.min.js"></script>
+<style>
+  body { font-family: sans-serif; margin: 20px; }
+  h1 { text-align: center; color: #FF1801; font-size: 36px; }
+  #data-source-text { text-align: center; margin-bottom: 20px; }
+  table { border-collapse: collapse; margin-top: 10px; }
+  th { background-color: #E0E0E0; font-weight: bold; border: 1px solid black; padding: 4px; }
+  td { text-align: center; min-width: 100px; border: 1px solid #D0D0D0; padding: 4px; }
+</style>
+</head>
+<body>
+<h1>我們遊戲的 F1 總積分排名紀錄</h1>
+<div id="data-source-text"></div>
+<div id="team-ranking-graph" style="padding: 20px"></div>
+<div id="total-ranking-graph"></div>
+<div id="rating-history-graph"></div>
+<h2 style="margin-top: 40px">每站賽後排名走勢</h2>
+<div id="driver-bump-graph"></div>
+<div id="team-bump-graph"></div>
+<h2 style="margin-top: 40px">詳細單場成績</h2>
+<table id="detailed-ranking-table"></table>
+<script>
+async function loadJson(path) {
+  const response = await fetch(path, {cache: 'no-cache'});
+  return response.json();
+}
+function drawTable(table) {
+  const el = document.getElementById('detailed-ranking-table');
+  const header = '<tr>' + table.columns.map(c => '<th>' + c.name + '</th>').join('') + '</tr>';
+  const rows = table.data.map(row =>
+    '<tr>' + table.columns.map(c => '<td>' + (row[c.id] ?? '') + '</td>').join('') + '</tr>');
+  el.innerHTML = header + rows.join('');
+}
+(async function () {
+  const [meta, teamFig, driverFig, ratingFig, driverBumpFig, teamBumpFig, table] = await Promise.all([
+    loadJson('data/meta.json'), loadJson('data/team_ranking.json'),
+    loadJson('data/driver_ranking.json'), loadJson('data/rating_history.json'),
+    loadJson('data/driver_bump.json'), loadJson('data/team_bump.json'), loadJson('data/table.json')]);
+  document.getElementById('data-source-text').textContent = meta.data_source_text;
+  Plotly.newPlot('team-ranking-graph', teamFig.data, teamFig.layout);
+  Plotly.newPlot('total-ranking-graph', driverFig.data, driverFig.layout);
+  Plotly.newPlot('rating-history-graph', ratingFig.data, ratingFig.layout);
+  Plotly.newPlot('driver-bump-graph', driverBumpFig.data, driverBumpFig.layout);
+  Plotly.newPlot('team-bump-graph', teamBumpFig.data, teamBumpFig.layout);
+  drawTable(table);
+})();
+</script>
+</body>
+</html>
+"""
+
+
+# ----------------------------------------------------
+# 1. 指紋計算 (只看產生該檔案所需的輸入資料)
+# ----------------------------------------------------
+def fingerprint_text(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def fingerprint_frame(df):
+    """DataFrame 內容指紋 (欄位名稱 + 每列雜湊)"""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    return fingerprint_text(list(df.columns), hashlib.sha256(row_hashes.tobytes()).hexdigest())
+
+
+# ----------------------------------------------------
+# 2. 定義每個輸出檔案：(路徑, 輸入指紋, 產生內容的函數)
+# ----------------------------------------------------
+def build_artifacts(snapshot):
+    df_detailed = snapshot['df_detailed']
+    df_final_table = snapshot['df_final_table']
+    figure_inputs = ['Driver', 'Team', 'Race_Name', 'Race_Type', 'Race_Date', 'Points', 'Position']
+    # 排名表 (含 Rank / Tiebreak) 與前 N 名的設定：決定圖表畫哪些車手 / 車隊、順序與總分標籤
+    driver_order = fingerprint_text(fingerprint_frame(snapshot['df_standings']), app.CHART_TOP_N)
+    team_order = fingerprint_text(fingerprint_frame(snapshot['df_team_standings']), app.CHART_TOP_N)
+
+    return [
+        ('plotly.min.js', fingerprint_text(plotly.__version__), get_plotlyjs),
+        ('index.html', fingerprint_text(INDEX_HTML), lambda: INDEX_HTML),
+        ('data/meta.json',
+         fingerprint_text(*[json.dumps(snapshot[name], ensure_ascii=False) for name in app.META_VIEWS]),
+         lambda: json.dumps({name: snapshot[name] for name in app.META_VIEWS}, ensure_ascii=False)),
+        ('data/team_ranking.json',
+         fingerprint_text(plotly.__version__, fingerprint_frame(df_detailed[['Team', 'Race_Date', 'Points']]), team_order),
+         lambda: pio.to_json(snapshot['team_ranking_fig'])),
+        ('data/driver_ranking.json',
+         fingerprint_text(plotly.__version__, fingerprint_frame(df_detailed[figure_inputs]), driver_order),
+         lambda: pio.to_json(snapshot['ranking_fig'])),
+        ('data/rating_history.json',
+         fingerprint_text(plotly.__version__, fingerprint_frame(snapshot['df_rating_history']), driver_order),
+         lambda: pio.to_json(snapshot['rating_fig'])),
+        ('data/driver_bump.json',
+         fingerprint_text(plotly.__version__, fingerprint_frame(df_detailed[figure_inputs]), driver_order),
+         lambda: pio.to_json(snapshot['driver_bump_fig'])),
+        ('data/team_bump.json',
+         fingerprint_text(plotly.__version__, fingerprint_frame(df_detailed[figure_inputs]), team_order, app.TEAM_COLORS),
+         lambda: pio.to_json(snapshot['team_bump_fig'])),
+        ('data/results.json',
+         fingerprint_text(fingerprint_frame(df_detailed[figure_inputs]), driver_order, team_order, app.TEAM_COLORS),
+         lambda: json.dumps(snapshot['results_compact'], ensure_ascii=False)),
+        ('data/table.json',
+         fingerprint_frame(df_final_table),
+         lambda: json.dumps({
+             'columns': snapshot['table_columns'],
+             'data': json.loads(df_final_table.to_json(orient='records')),
+         }, ensure_ascii=False)),
+    ]
+
+
+# ----------------------------------------------------
+# 3. 增量寫入
+# ----------------------------------------------------
+def _write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def export_static_site(out_dir='static_site'):
+    """輸出靜態網站，回傳實際被重寫的檔案清單"""
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    version, snapshot = app.get_dashboard_snapshot(full=True)
+    written = []
+    for rel_path, fingerprint, render in build_artifacts(snapshot):
+        path = os.path.join(out_dir, rel_path)
+        if manifest.get(rel_path) == fingerprint and os.path.exists(path):
+            continue
+        _write_atomic(path, render())
+        manifest[rel_path] = fingerprint
+        written.append(rel_path)
+
+    manifest['data_version'] = version
+    manifest['chart_top_n'] = app.CHART_TOP_N
+    _write_atomic(manifest_path, json.dumps(manifest, indent=2, ensure_ascii=False))
+    return written
+
+
+if __name__ == '__main__':
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else 'static_site'
+    written = export_static_site(out_dir)
+    if written:
+        for rel_path in written:
+            print(f"已更新: {rel_path}")
+    else:
+        print("所有檔案皆為最新，無需更新。")
+    print(f"✅ 靜態網站已輸出至 {out_dir}/")
@@ -0,0 +1,210 @@
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database_setup import init_database
+
+# ====================================================================
+# 多聯賽：同一個伺服器依網址前綴服務多個聯賽，每個聯賽有自己的資料庫與快取
+# ====================================================================
+#
+#   /                      → 預設聯賽 (f1_records.db，與原本相同)
+#   /leagues/<名稱>/...     → leagues/<名稱>.db (只服務已存在的檔案，網址不會建立新資料庫)
+#
+# 1. LeagueMiddleware 把前綴移到 SCRIPT_NAME，並把聯賽名稱放進 ContextVar，
+#    之後的 Dash / Flask 路由都不必知道前綴 (瀏覽器端的請求路徑見 app.LeagueDash)
+# 2. 每個聯賽的 engine、session、儀表板快照放在 League 物件內，
+#    LeaguePool 以 LRU 保留最多 MAX_OPEN_LEAGUES 個，閒置的聯賽會被淘汰 (關閉連線、丟掉快照)
+# 3. Session = LeagueSession()：用法與 sessionmaker 相同，回傳目前聯賽的 session
+#
+# 建立新聯賽：python league_pool.py <名稱>
+
+DEFAULT_LEAGUE = os.environ.get('F1_DEFAULT_LEAGUE', 'main')
+DEFAULT_DATABASE = 'f1_records.db'
+LEAGUE_DIR = os.environ.get('F1_LEAGUE_DIR', 'leagues')
+LEAGUE_URL_PREFIX = '/leagues/'
+MAX_OPEN_LEAGUES = int(os.environ.get('F1_MAX_OPEN_LEAGUES', 8))
+LEAGUE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+_current_league = ContextVar('f1_league', default=DEFAULT_LEAGUE)
+
+
+# ----------------------------------------------------
+# 1. 目前的聯賽 (每個請求各自的 context)
+# ----------------------------------------------------
+def current_league_name():
+    return _current_league.get()
+
+@contextmanager
+def use_league(name):
+    """在這個區塊內使用指定聯賽 (給命令列工具使用)"""
+    token = _current_league.set(name)
+    try:
+        yield
+    finally:
+        _current_league.reset(token)
+
+def league_database(name):
+    if name == DEFAULT_LEAGUE:
+        return DEFAULT_DATABASE
+    return os.path.join(LEAGUE_DIR, f'{name}.db')
+
+def league_exists(name):
+    if name == DEFAULT_LEAGUE:
+        return True
+    return bool(LEAGUE_NAME_PATTERN.match(name)) and os.path.isfile(league_database(name))
+
+def league_names():
+    """預設聯賽 + leagues/ 內所有已建立的聯賽"""
+    names = []
+    if os.path.isdir(LEAGUE_DIR):
+        names = sorted(f[:-3] for f in os.listdir(LEAGUE_DIR)
+                       if f.endswith('.db') and LEAGUE_NAME_PATTERN.match(f[:-3]))
+    return [DEFAULT_LEAGUE] + [name for name in names if name != DEFAULT_LEAGUE]
+
+def league_data_dir(name, base_dir):
+    """聯賽自己的檔案目錄 (共用快照、預先輸出檔案、封存、備份)；預設聯賽沿用原本的位置"""
+    if name == DEFAULT_LEAGUE:
+        return base_dir
+    return os.path.join(base_dir, 'leagues', name)
+
+
+# ----------------------------------------------------
+# 2. 單一聯賽：engine + session + 儀表板快照
+# ----------------------------------------------------
+# WAL 模式：寫入時讀取者仍可讀取舊版本，不會被寫鎖卡住
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA busy_timeout=5000')
+    cursor.close()
+
+class League:
+    def __init__(self, name):
+        self.name = name
+        self.database = league_database(name)
+        self.engine = create_engine(f'sqlite:///{self.database}')
+        event.listen(self.engine, 'connect', _set_sqlite_pragmas)
+        init_database(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self._async_session = None
+        # app.get_dashboard_snapshot 的快取 (整個 dict 一次替換)；refresh_lock 確保同時只有一次背景重算
+        self.snapshot_lock = threading.Lock()
+        self.snapshot_cache = {'version': None, 'snapshot': None}
+        self.refresh_lock = threading.Lock()
+        # 最後一次排入寫入佇列的評分更新是哪個資料版本 (app.schedule_rating_update)
+        self.rating_version = None
+
+    @property
+    def AsyncSession(self):
+        """深入分析用的 aiosqlite session (第一次使用時才建立)"""
+        if self._async_session is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+            from sqlalchemy.pool import NullPool
+            async_engine = create_async_engine(f'sqlite+aiosqlite:///{self.database}', poolclass=NullPool)
+            self._async_session = async_sessionmaker(async_engine, expire_on_commit=False)
+        return self._async_session
+
+    def data_dir(self, base_dir):
+        return league_data_dir(self.name, base_dir)
+
+    def close(self):
+        self.engine.dispose()
+        self.snapshot_cache = {'version': None, 'snapshot': None}
+        self.rating_version = None
+
+
+# ----------------------------------------------------
+# 3. LRU 聯賽池
+# ----------------------------------------------------
+class LeaguePool:
+    def __init__(self, maxsize=MAX_OPEN_LEAGUES):
+        self.maxsize = maxsize
+        self._leagues = OrderedDict()
+        self._lock = threading.Lock()
+        # 聯賽被淘汰時呼叫 (參數為聯賽名稱)，例如清除查詢快取
+        self.on_evict = []
+        self.opened = 0
+        self.evictions = 0
+
+    def get(self, name):
+        with self._lock:
+            league = self._leagues.get(name)
+            if league is not None:
+                self._leagues.move_to_end(name)
+                return league
+            league = League(name)
+            self._leagues[name] = league
+            self.opened += 1
+            evicted = []
+            while len(self._leagues) > self.maxsize:
+                evicted.append(self._leagues.popitem(last=False)[1])
+                self.evictions += 1
+        # 還在使用中的連線會在歸還時才關閉，不影響進行中的請求
+        for old in evicted:
+            old.close()
+            for callback in self.on_evict:
+                callback(old.name)
+        return league
+
+    def stats(self):
+        with self._lock:
+            return {
+                'open': list(self._leagues),
+                'maxsize': self.maxsize,
+                'opened': self.opened,
+                'evictions': self.evictions,
+            }
+
+
+league_pool = LeaguePool()
+
+def current_league():
+    return league_pool.get(current_league_name())
+
+class LeagueSession:
+    """用法與 sessionmaker 相同：Session() 回傳目前聯賽的 session"""
+    def __call__(self, **kwargs):
+        return current_league().Session(**kwargs)
+
+
+# ----------------------------------------------------
+# 4. WSGI middleware：/leagues/<名稱>/... → 該聯賽
+# ----------------------------------------------------
+class LeagueMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        name = DEFAULT_LEAGUE
+        if path.startswith(LEAGUE_URL_PREFIX):
+            name, _, rest = path[len(LEAGUE_URL_PREFIX):].partition('/')
+            if not league_exists(name):
+                start_response('404 NOT FOUND', [('Content-Type', 'text/plain; charset=utf-8')])
+                return [f'找不到聯賽: {name}'.encode('utf-8')]
+            environ = dict(environ,
+                           SCRIPT_NAME=environ.get('SCRIPT_NAME', '') + LEAGUE_URL_PREFIX + name,
+                           PATH_INFO='/' + rest)
+        token = _current_league.set(name)
+        try:
+            return self.app(environ, start_response)
+        finally:
+            _current_league.reset(token)
+
+
+if __name__ == '__main__':
+    # 建立新聯賽的空白資料庫：python league_pool.py <名稱> [<名稱> ...]
+    for league_name in sys.argv[1:]:
+        if not LEAGUE_NAME_PATTERN.match(league_name):
+            sys.exit(f'聯賽名稱只能包含英數字、- 與 _: {league_name}')
+        os.makedirs(LEAGUE_DIR, exist_ok=True)
+        League(league_name).close()
+        print(f'✅ 已建立聯賽 {league_name}: {league_database(league_name)}')
@@ -0,0 +1,134 @@
+import os
+
+from sqlalchemy import select
+
+from database_setup import Driver
+
+# ====================================================================
+# 大型聯賽模式：車手再多，網頁大小與繪圖時間也大致固定
+# ====================================================================
+#
+# 1. 排名圖只畫前 CHART_TOP_N 名車手 (車隊圖只畫前 N 名車隊)，再加上觀眾自己選的車手
+#    → 送到瀏覽器的 results-store 也只有這些車手的成績 (compact_view)
+# 2. 詳細成績表格與每位車手一列的表格由伺服器分頁 (table_page)，一次只送一頁
+# 3. 車手搜尋框：名稱前綴查詢走 ix_drivers_name_nocase 索引 (search_driver_names)，不掃描整個表
+# 車手人數不超過 N 時，畫面與原本完全相同。
+
+CHART_TOP_N = int(os.environ.get('F1_CHART_TOP_N', 20))
+TABLE_PAGE_SIZE = int(os.environ.get('F1_TABLE_PAGE_SIZE', 25))
+SEARCH_LIMIT = 20
+# 每個長條 / 每列需要的高度 (像素)；圖表至少維持原本的高度
+ROW_HEIGHT = 30
+
+
+def chart_height(n_rows, min_height):
+    return max(min_height, ROW_HEIGHT * n_rows)
+
+
+# ----------------------------------------------------
+# 1. 車手名稱前綴搜尋
+# ----------------------------------------------------
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_driver_names(session, prefix, limit=SEARCH_LIMIT):
+    """回傳名稱以 prefix 開頭的車手 (不分大小寫，依名稱排序，最多 limit 位)"""
+    prefix = (prefix or '').strip()
+    if not prefix:
+        return []
+    stmt = (select(Driver.name)
+            .where(Driver.name.like(_escape_like(prefix) + '%', escape='\\'))
+            .order_by(Driver.name.collate('NOCASE'))
+            .limit(limit))
+    return session.scalars(stmt).all()
+
+
+# ----------------------------------------------------
+# 2. 圖表用的精簡資料：前 N 名 + 觀眾選的車手
+# ----------------------------------------------------
+def top_names(names, top_n=CHART_TOP_N):
+    """names 已依排名排序"""
+    return list(names[:top_n])
+
+def compact_view(compact, selected_drivers=(), top_n=CHART_TOP_N):
+    """
+    從完整的 results_compact 取出要送到瀏覽器的部分：
+      - 車手圖：前 top_n 名車手 + selected_drivers
+      - 車隊圖：前 top_n 名車隊 (包含這些車隊的所有車手，車隊總分才會正確)
+    driver_charted / team_charted 標示哪些車手 / 車隊要畫在圖上；row_height 給瀏覽器端計算圖表高度
+    """
+    if not compact:
+        return compact
+    drivers, teams = compact['drivers'], compact['teams']
+    selected = set(selected_drivers or ())
+    charted_teams = set(range(min(top_n, len(teams))))
+    charted_drivers = {d for d, name in enumerate(drivers) if d < top_n or name in selected}
+    keep = sorted(charted_drivers | {d for d, t in enumerate(compact['driver_team']) if t in charted_teams})
+    if len(keep) == len(drivers):
+        return dict(compact, driver_charted=[d in charted_drivers for d in range(len(drivers))],
+                    team_charted=[t in charted_teams for t in range(len(teams))], row_height=ROW_HEIGHT)
+
+    # 重新編碼車手 / 車隊代碼 (順序不變，仍依排名)
+    new_driver = {d: i for i, d in enumerate(keep)}
+    keep_teams = sorted({compact['driver_team'][d] for d in keep})
+    new_team = {t: i for i, t in enumerate(keep_teams)}
+    rows = [i for i, d in enumerate(compact['d']) if d in new_driver]
+    return dict(
+        compact,
+        drivers=[drivers[d] for d in keep],
+        driver_team=[new_team[compact['driver_team'][d]] for d in keep],
+        teams=[teams[t] for t in keep_teams],
+        team_colors=[compact['team_colors'][t] for t in keep_teams],
+        d=[new_driver[compact['d'][i]] for i in rows],
+        r=[compact['r'][i] for i in rows],
+        p=[compact['p'][i] for i in rows],
+        pos=[compact['pos'][i] for i in rows],
+        driver_type_points=[compact['driver_type_points'][d] for d in keep],
+        driver_charted=[d in charted_drivers for d in keep],
+        team_charted=[t in charted_teams for t in keep_teams],
+        row_height=ROW_HEIGHT,
+    )
+
+
+# ----------------------------------------------------
+# 3. 表格分頁 (伺服器端排序 + 切片)
+# ----------------------------------------------------
+def table_page(records, page_current=0, page_size=TABLE_PAGE_SIZE, sort_by=None):
+    """
+    回傳 (這一頁的資料, 總頁數)；sort_by 是 DataTable 的 sort_by 屬性
+    records 也可以是 DataFrame (例如共用快照 mmap 的 df_final_table)：只有這一頁會轉成 records
+    """
+    if hasattr(records, 'iloc'):
+        return _frame_page(records, page_current, page_size, sort_by)
+    records = list(records or [])
+    for sort in reversed(sort_by or []):
+        column = sort['column_id']
+        # None 一律排在最後
+        present = [row for row in records if row.get(column) is not None]
+        missing = [row for row in records if row.get(column) is None]
+        present.sort(key=lambda row: row[column], reverse=sort['direction'] == 'desc')
+        records = present + missing
+    page_count = max(1, -(-len(records) // page_size))
+    start = (page_current or 0) * page_size
+    return records[start:start + page_size], page_count
+
+def _frame_page(frame, page_current, page_size, sort_by):
+    if sort_by:
+        # 多欄排序是穩定的 lexsort，缺值一律排在最後 (與上面的 records 版本相同)
+        frame = frame.sort_values([sort['column_id'] for sort in sort_by],
+                                  ascending=[sort['direction'] != 'desc' for sort in sort_by],
+                                  na_position='last', kind='stable', key=_sortable)
+    page_count = max(1, -(-len(frame) // page_size))
+    start = (page_current or 0) * page_size
+    page = frame.iloc[start:start + page_size]
+    # 缺值轉成 None (JSON 的 null)
+    page = page.astype(object).where(page.notna(), None)
+    return page.to_dict('records'), page_count
+
+def _sortable(series):
+    # mmap 的 Arrow dictionary 欄位 (Driver / Team) 無法直接排序，先換回字串
+    dtype = getattr(series.dtype, 'pyarrow_dtype', None)
+    if dtype is not None and hasattr(dtype, 'value_type'):
+        import pandas as pd
+        return series.astype(pd.ArrowDtype(dtype.value_type))
+    return series
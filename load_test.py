@@ -0,0 +1,218 @@
+# load_test.py
+#
+# 本機並發壓力測試：用假資料庫啟動 gunicorn (app:server)，模擬多位觀眾同時開網頁
+#   python load_test.py --configs 1x1,2x4,4x8 --clients 32 --requests 20
+#
+# 每個設定 (workers x threads) 會：
+#   1. 在暫存資料夾建立假資料庫 (--drivers 位車手、--races 場比賽，不需網路)
+#   2. 啟動 gunicorn 並等待就緒、先暖身一次 (讓快照建好)
+#   3. --clients 個客戶端各送出 --requests 個請求 (輪流打下面的端點)
+#   4. 回報吞吐量 (req/s) 與 p50 / p95 / p99 延遲
+# 端點：/_dash-layout、/_dash-dependencies、/api/data-version，
+# 以及車手深入分析的回呼 (/_dash-update-component)，可用 --endpoints 指定。
+
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+RACE_POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+SPRINT_POINTS = [8, 7, 6, 5, 4, 3, 2, 1]
+
+
+# ----------------------------------------------------
+# 1. 假資料庫
+# ----------------------------------------------------
+def build_synthetic_database(workdir, n_drivers, n_races, seed=2558):
+    # 先讓 database_setup 建立資料表 (與正式環境相同的結構與觸發器)
+    subprocess.run([sys.executable, '-c', 'import database_setup'], cwd=workdir, check=True, capture_output=True)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(os.path.join(workdir, 'f1_records.db'))
+    with conn:
+        driver_ids = []
+        for i in range(n_drivers):
+            cur = conn.execute('INSERT INTO drivers (name, team) VALUES (?, ?)', (f'driver_{i:04d}', f'Team {i // 2:03d}'))
+            driver_ids.append(cur.lastrowid)
+        for r in range(n_races):
+            race_type = 'Sprint' if r % 2 == 0 else 'Race'
+            points_table = SPRINT_POINTS if race_type == 'Sprint' else RACE_POINTS
+            race_date = f'{2020 + r // 200}-{(r // 20) % 10 + 1:02d}-{r % 20 + 1:02d}'
+            cur = conn.execute('INSERT INTO races (name, type, date) VALUES (?, ?, ?)',
+                               (f'Synthetic GP {r:04d} {race_type}', race_type, race_date))
+            order = driver_ids[:]
+            rng.shuffle(order)
+            conn.executemany(
+                'INSERT INTO results (driver_id, race_id, points, position) VALUES (?, ?, ?, ?)',
+                [(d, cur.lastrowid, points_table[p] if p < len(points_table) else 0, p + 1) for p, d in enumerate(order)]
+            )
+    conn.close()
+
+def prepare_workdir(src_dir, n_drivers, n_races):
+    workdir = tempfile.mkdtemp(prefix='f1-load-')
+    for path in glob.glob(os.path.join(src_dir, '*.py')):
+        shutil.copy(path, workdir)
+    shutil.copytree(os.path.join(src_dir, 'assets'), os.path.join(workdir, 'assets'))
+    build_synthetic_database(workdir, n_drivers, n_races)
+    return workdir
+
+
+# ----------------------------------------------------
+# 2. 啟動 gunicorn
+# ----------------------------------------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(workdir, workers, threads, port):
+    log_path = os.path.join(workdir, 'gunicorn.log')
+    with open(log_path, 'wb') as log:
+        proc = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'app:server',
+             '--workers', str(workers), '--threads', str(threads),
+             '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', '--graceful-timeout', '5'],
+            cwd=workdir, stdout=subprocess.DEVNULL, stderr=log,
+            env=dict(os.environ, F1_PRECOMPUTED_DIR=os.path.join(workdir, 'static_site')),
+        )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            with open(log_path, encoding='utf-8', errors='replace') as f:
+                raise RuntimeError(f"gunicorn 啟動失敗:\n{f.read()[-2000:]}")
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/data-version', timeout=1).read()
+            return proc
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError('gunicorn 啟動逾時')
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+# ----------------------------------------------------
+# 3. 客戶端
+# ----------------------------------------------------
+def driver_drilldown_request(driver_name):
+    body = {
+        'output': 'driver-drilldown.children',
+        'outputs': {'id': 'driver-drilldown', 'property': 'children'},
+        'inputs': [{'id': 'driver-drilldown-select', 'property': 'value', 'value': driver_name}],
+        'changedPropIds': ['driver-drilldown-select.value'],
+    }
+    return ('POST', '/_dash-update-component', json.dumps(body).encode())
+
+ENDPOINTS = {
+    'layout': lambda: ('GET', '/_dash-layout', None),
+    'dependencies': lambda: ('GET', '/_dash-dependencies', None),
+    'data-version': lambda: ('GET', '/api/data-version', None),
+    'driver-drilldown': lambda: driver_drilldown_request('driver_0000'),
+}
+
+def timed_request(base_url, method, path, body):
+    request = urllib.request.Request(base_url + path, data=body, method=method,
+                                     headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            ok = response.status < 400
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        ok = False
+    return time.perf_counter() - start, ok
+
+def run_clients(base_url, endpoint_names, clients, requests_per_client):
+    def client(client_id):
+        samples = []
+        for i in range(requests_per_client):
+            method, path, body = ENDPOINTS[endpoint_names[(client_id + i) % len(endpoint_names)]]()
+            samples.append(timed_request(base_url, method, path, body))
+        return samples
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        samples = [s for batch in pool.map(client, range(clients)) for s in batch]
+    return samples, time.perf_counter() - start
+
+
+# ----------------------------------------------------
+# 4. 統計
+# ----------------------------------------------------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return float('nan')
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, ok in samples if ok)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+def parse_configs(text):
+    configs = []
+    for item in text.split(','):
+        workers, _, threads = item.strip().partition('x')
+        configs.append((int(workers), int(threads or 1)))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='F1 排名網站本機壓力測試')
+    parser.add_argument('--configs', default='1x1,1x4,2x4,4x4', help='workers x threads，以逗號分隔')
+    parser.add_argument('--clients', type=int, default=16, help='同時連線的客戶端數量')
+    parser.add_argument('--requests', type=int, default=25, help='每個客戶端送出的請求數')
+    parser.add_argument('--drivers', type=int, default=40, help='假資料庫的車手數量')
+    parser.add_argument('--races', type=int, default=40, help='假資料庫的比賽數量')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help=f'要測試的端點 ({", ".join(ENDPOINTS)})')
+    args = parser.parse_args()
+
+    endpoint_names = [name.strip() for name in args.endpoints.split(',')]
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    print(f"假資料庫：{args.drivers} 位車手 x {args.races} 場比賽；"
+          f"{args.clients} 個客戶端 x {args.requests} 個請求；端點：{', '.join(endpoint_names)}")
+    print(f"{'設定':>8} {'請求數':>6} {'錯誤':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+    for workers, threads in parse_configs(args.configs):
+        workdir = prepare_workdir(src_dir, args.drivers, args.races)
+        port = free_port()
+        proc = start_server(workdir, workers, threads, port)
+        base_url = f'http://127.0.0.1:{port}'
+        try:
+            # 暖身：每個 worker 都建立好快照後再開始計時
+            run_clients(base_url, endpoint_names, workers * threads, len(endpoint_names))
+            samples, elapsed = run_clients(base_url, endpoint_names, args.clients, args.requests)
+        finally:
+            stop_server(proc)
+            shutil.rmtree(workdir, ignore_errors=True)
+        result = summarize(samples, elapsed)
+        print(f"{f'{workers}x{threads}':>8} {result['requests']:>6} {result['errors']:>4} {result['throughput']:>8.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
+from database_setup import Race, Result, Driver
+from league_pool import current_league_name
+
+# ====================================================================
+# 查詢結果快取：get_total_standings / get_team_standings / get_detailed_results ...
+# ====================================================================
+#
+# 1. 以 (函數名稱, 參數) 為 key 記住查詢結果，超過上限時淘汰最久沒用到的 (LRU)
+# 2. 任何 session commit 了 Result / Race / Driver 的新增、修改、刪除，就清空快取
+#    (SQLAlchemy after_flush 記錄、after_commit 清除；rollback 則不清除)
+# 3. 其他 process (別的 gunicorn worker、insert_data.py) 寫入時不會觸發本 process 的事件，
+#    所以呼叫端在發現 data_version 改變時也要呼叫 invalidate_for_version()
+# 4. 每次清除都會讓該聯賽的世代編號 +1；查詢前先記下世代編號，查詢期間被清除過 (查詢途中有人 commit)
+#    就不存入結果，舊資料不會被當成新版本的結果留在快取中
+# 5. stats() 提供命中率等統計
+# 每個聯賽 (league_pool) 的結果分開存放：key 含聯賽名稱，清除時也只清除該聯賽
+
+WATCHED_MODELS = (Result, Race, Driver)
+_DIRTY_FLAG = 'query_cache_dirty'
+
+
+class QueryCache:
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = {}
+        # 每個聯賽的世代編號；_epoch 在全部清除時 +1
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def memoize(self, func):
+        """裝飾查詢函數；DataFrame 結果每次回傳副本，呼叫端修改不會污染快取"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            league = current_league_name()
+            key = (league, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return _copy(self._entries[key])
+                self.misses += 1
+                # 查詢「之前」的世代：查詢途中 commit 的資料可能沒有被讀到
+                generation = self._generation(league)
+
+            value = func(*args, **kwargs)
+            with self._lock:
+                if self._generation(league) == generation:
+                    self._entries[key] = value
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            return _copy(value)
+
+        wrapper.cache = self
+        return wrapper
+
+    def invalidate(self, league=None):
+        """清除某個聯賽的結果；league=None 時全部清除"""
+        with self._lock:
+            if league is None:
+                self._entries.clear()
+                self._epoch += 1
+            else:
+                for key in [key for key in self._entries if key[0] == league]:
+                    del self._entries[key]
+                self._generations[league] = self._generations.get(league, 0) + 1
+            self.invalidations += 1
+
+    def _generation(self, league):
+        # 呼叫端需持有 self._lock
+        return self._epoch, self._generations.get(league, 0)
+
+    def invalidate_for_version(self, version):
+        """目前聯賽的資料版本改變 (可能是其他 process 寫入) 時清空該聯賽的快取"""
+        league = current_league_name()
+        with self._lock:
+            previous = self._versions.get(league)
+            self._versions[league] = version
+        if previous is not None and previous != version:
+            self.invalidate(league)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def _copy(value):
+    return value.copy() if hasattr(value, 'copy') else value
+
+
+query_cache = QueryCache(maxsize=int(os.environ.get('F1_QUERY_CACHE_SIZE', 64)))
+
+
+# ----------------------------------------------------
+# commit 時自動清除 (掛在所有 Session 上，包括 sessionmaker 建立的)
+# ----------------------------------------------------
+def _touches_watched_models(session):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, WATCHED_MODELS):
+            return True
+    return False
+
+@event.listens_for(OrmSession, 'before_flush')
+def _track_changes(session, flush_context, instances):
+    if _touches_watched_models(session):
+        session.info[_DIRTY_FLAG] = True
+
+@event.listens_for(OrmSession, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop(_DIRTY_FLAG, False):
+        query_cache.invalidate(current_league_name())
+
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def _forget_on_rollback(session, previous_transaction):
+    session.info.pop(_DIRTY_FLAG, None)
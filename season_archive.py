@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import sys
+import uuid
+
+from sqlalchemy import delete, func, select, update
+
+from change_log import claim_checkpoint, latest_seq
+from database_setup import ChangeCheckpoint, Driver, Race, RatingHistory, Result, SeasonSummary
+from driver_ratings import RATING_CONSUMER, update_ratings
+from league_pool import DEFAULT_LEAGUE, current_league, league_exists, use_league
+
+# ====================================================================
+# 封存賽季：已結束賽季的比賽與成績移到壓縮的 Parquet 檔，熱資料庫只留每位車手 / 車隊一列彙總
+# ====================================================================
+#
+#   python season_archive.py list [--league 名稱]     # 各賽季的比賽場數與封存狀態
+#   python season_archive.py archive 2025 [--league 名稱] [--force]
+#
+# 賽季 = 比賽日期的年份。封存時：
+# 1. 先把車手評分更新到最新，讀出該賽季的所有成績 (已封存過的賽季會與原本的封存檔合併)
+# 2. 寫成 <F1_ARCHIVE_DIR>/season_<賽季>.parquet (zstd 壓縮、依比賽日期排序，每場比賽落在相鄰的 row group)
+# 3. 同一個 transaction 內：寫入 season_summaries (總分、分類積分、名次次數、賽季結束時的評分)，
+#    刪除該賽季的 races / results / rating_history，並把評分的 change_log 檢查點移過這些刪除
+#    (目前評分已包含封存的比賽，不需要倒帶重算)
+# 儀表板的即時圖表只讀熱資料庫；「歷史賽季」區塊的排名只讀 season_summaries，
+# 只有選擇某一場封存的比賽時才讀 Parquet (只讀該場，依 Race_Name 過濾 row group)。
+# pyarrow 只有封存與讀取封存檔時才需要。
+
+ARCHIVE_DIR = os.environ.get('F1_ARCHIVE_DIR', 'archive')
+ARCHIVE_COMPRESSION = 'zstd'
+ARCHIVE_ROW_GROUP_ROWS = int(os.environ.get('F1_ARCHIVE_ROW_GROUP_ROWS', 10000))
+ARCHIVE_COLUMNS = ['Driver', 'Team', 'Race_Name', 'Race_Type', 'Race_Date', 'Points', 'Position']
+# 評分檢查點被其他寫入搶先時，重新更新評分再試的次數
+ARCHIVE_ATTEMPTS = 3
+
+
+class ArchiveError(RuntimeError):
+    """無法封存 (賽季還在進行、沒有比賽、評分無法更新到最新)"""
+
+
+def season_of(race_date):
+    return str(race_date)[:4]
+
+def archive_path(season):
+    """目前聯賽的封存檔路徑 (預設聯賽為 archive/，其他聯賽為 archive/leagues/<名稱>/)"""
+    return os.path.join(current_league().data_dir(ARCHIVE_DIR), f'season_{season}.parquet')
+
+def _archive_schema():
+    import pyarrow as pa
+    return pa.schema([(col, pa.int64() if col in ('Points', 'Position') else pa.string()) for col in ARCHIVE_COLUMNS])
+
+
+# ----------------------------------------------------
+# 1. 讀取熱資料庫中的賽季
+# ----------------------------------------------------
+def season_counts(session):
+    """{賽季: 比賽場數} (熱資料庫中仍有的賽季)"""
+    season = func.substr(Race.date, 1, 4)
+    return dict(session.execute(select(season, func.count(Race.race_id)).where(Race.date.isnot(None)).group_by(season)).all())
+
+def archived_seasons(session):
+    return session.scalars(select(SeasonSummary.season).distinct().order_by(SeasonSummary.season.desc())).all()
+
+def _season_race_ids(session, season):
+    return session.scalars(select(Race.race_id).where(func.substr(Race.date, 1, 4) == season)).all()
+
+def _season_rows(session, race_ids):
+    stmt = (select(Driver.name, Driver.team, Race.name, Race.type, Race.date, Result.points, Result.position)
+            .join(Result, Driver.driver_id == Result.driver_id)
+            .join(Race, Race.race_id == Result.race_id)
+            .where(Race.race_id.in_(race_ids)))
+    return [dict(zip(ARCHIVE_COLUMNS, row)) for row in session.execute(stmt)]
+
+def _season_end_ratings(session, race_ids):
+    """每位車手在這些比賽中最後一場的賽後評分"""
+    stmt = (select(Driver.name, RatingHistory.rating_after)
+            .join(Driver, Driver.driver_id == RatingHistory.driver_id)
+            .where(RatingHistory.race_id.in_(race_ids))
+            .order_by(RatingHistory.race_date, RatingHistory.race_id))
+    return dict(session.execute(stmt).all())
+
+
+# ----------------------------------------------------
+# 2. 彙總 (每位車手 / 每個車隊一列)
+# ----------------------------------------------------
+def summarize_season(df, season, ratings, file_path):
+    """df 為整個賽季的成績 (ARCHIVE_COLUMNS)，回傳 season_summaries 的列"""
+    rows = []
+    for kind, key in (('driver', 'Driver'), ('team', 'Team')):
+        for name, group in df.groupby(key, sort=True):
+            positions = group['Position'].dropna().astype(int).value_counts().sort_index()
+            rows.append({
+                'season': season, 'kind': kind, 'name': name,
+                'team': group['Team'].iloc[-1] if kind == 'driver' else name,
+                'races': len(group),
+                'points': int(group['Points'].fillna(0).sum()),
+                'type_points': json.dumps({t: int(p) for t, p in group.groupby('Race_Type')['Points'].sum().items()}),
+                'position_counts': json.dumps({str(p): int(c) for p, c in positions.items()}),
+                'rating': ratings.get(name) if kind == 'driver' else None,
+                'archive_file': file_path,
+            })
+    return rows
+
+
+# ----------------------------------------------------
+# 3. 封存
+# ----------------------------------------------------
+def _write_archive(rows, file_path):
+    """與既有的封存檔合併後寫到暫存檔 (還沒取代正式檔案)，回傳 (暫存檔, 合併後的 DataFrame)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.Table.from_pylist(rows, schema=_archive_schema())
+    if os.path.exists(file_path):
+        table = pa.concat_tables([pq.read_table(file_path, schema=_archive_schema()), table])
+    table = table.sort_by([('Race_Date', 'ascending'), ('Race_Name', 'ascending'), ('Position', 'ascending')])
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    tmp_path = f'{file_path}.tmp-{uuid.uuid4().hex}'
+    pq.write_table(table, tmp_path, compression=ARCHIVE_COMPRESSION, row_group_size=ARCHIVE_ROW_GROUP_ROWS)
+    return tmp_path, table.to_pandas()
+
+def archive_season(Session, season, force=False):
+    """封存一個賽季，回傳摘要 dict；失敗時丟出 ArchiveError (熱資料庫不變)"""
+    for _ in range(ARCHIVE_ATTEMPTS):
+        update_ratings(Session)
+        session = Session()
+        tmp_path, committed = None, False
+        try:
+            # 先取得寫鎖；評分已經處理到最新的變更才能直接略過這次的刪除
+            last_seq = claim_checkpoint(session, RATING_CONSUMER)
+            if last_seq != latest_seq(session):
+                session.rollback()
+                continue
+            seasons = season_counts(session)
+            if season not in seasons:
+                raise ArchiveError(f'熱資料庫中沒有 {season} 賽季的比賽')
+            if season == max(seasons) and not force:
+                raise ArchiveError(f'{season} 是最新的賽季 (可能還在進行)；確定已結束請加上 --force')
+
+            race_ids = _season_race_ids(session, season)
+            rows = _season_rows(session, race_ids)
+            file_path = archive_path(season)
+            tmp_path, df = _write_archive(rows, file_path)
+            # 已封存過的賽季：保留原本的評分，這次有比賽的車手才更新
+            ratings = {s.name: s.rating for s in session.scalars(
+                select(SeasonSummary).where(SeasonSummary.season == season, SeasonSummary.kind == 'driver'))}
+            ratings.update(_season_end_ratings(session, race_ids))
+
+            session.execute(delete(SeasonSummary).where(SeasonSummary.season == season))
+            summaries = summarize_season(df, season, ratings, file_path)
+            session.add_all(SeasonSummary(**row) for row in summaries)
+            session.execute(delete(RatingHistory).where(RatingHistory.race_id.in_(race_ids)))
+            session.execute(delete(Result).where(Result.race_id.in_(race_ids)))
+            session.execute(delete(Race).where(Race.race_id.in_(race_ids)))
+            session.flush()
+            session.execute(update(ChangeCheckpoint)
+                            .where(ChangeCheckpoint.consumer == RATING_CONSUMER)
+                            .values(last_seq=latest_seq(session)))
+            session.commit()
+            committed = True
+            # 資料庫 commit 成功後才換上新的封存檔 (同一檔案系統內的 rename 是原子操作)
+            os.replace(tmp_path, file_path)
+            return {'season': season, 'races': len(race_ids), 'results': len(rows),
+                    'archived_results': len(df), 'summaries': len(summaries), 'file': file_path}
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+            # commit 之後暫存檔就是唯一的一份資料，不能刪除
+            if tmp_path is not None and not committed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    raise ArchiveError('評分一直有新的變更，無法取得一致的檢查點；請稍後再試')
+
+
+# ----------------------------------------------------
+# 4. 讀取封存：彙總 (熱資料庫) 與單場成績 (Parquet，只在需要時讀取)
+# ----------------------------------------------------
+def archived_position_counts(session, kind, season=None):
+    """
+    與 app.get_driver_position_counts / get_team_position_counts 相同欄位的名次彙總 (countback 用)：
+    每個對象一列積分 (Position 為空) + 每個名次一列次數。
+    車手使用目前的車隊 (與熱資料庫的積分榜相同)，已不存在的車手使用封存時的車隊。
+    """
+    import pandas as pd
+    stmt = (select(SeasonSummary.name, func.coalesce(Driver.team, SeasonSummary.team),
+                   SeasonSummary.points, SeasonSummary.position_counts)
+            .outerjoin(Driver, (Driver.name == SeasonSummary.name) & (SeasonSummary.kind == 'driver'))
+            .where(SeasonSummary.kind == kind))
+    if season is not None:
+        stmt = stmt.where(SeasonSummary.season == season)
+    rows = []
+    for name, team, points, position_counts in session.execute(stmt):
+        rows.append((name, team, None, 0, points))
+        rows.extend((name, team, int(p), count, 0) for p, count in json.loads(position_counts).items())
+    df = pd.DataFrame(rows, columns=['Driver', 'Team', 'Position', 'Count', 'Points'])
+    return df if kind == 'driver' else df.drop(columns='Driver')
+
+def season_standings(session, season, kind):
+    """一個封存賽季的積分榜 (依 countback 排序)，回傳 list[dict]"""
+    from standings_ranking import countback_standings
+    keys = ['Driver', 'Team'] if kind == 'driver' else ['Team']
+    summaries = {s.name: s for s in session.scalars(
+        select(SeasonSummary).where(SeasonSummary.season == season, SeasonSummary.kind == kind))}
+    if not summaries:
+        return []
+    counts = archived_position_counts(session, kind, season)
+    # 封存賽季的車隊以當時為準
+    counts['Team'] = counts[keys[0]].map(lambda name: summaries[name].team)
+    table = countback_standings(counts, keys)
+    records = []
+    for row in table.to_dict('records'):
+        summary = summaries[row[keys[0]]]
+        position_counts = {int(p): c for p, c in json.loads(summary.position_counts).items()}
+        record = {'Rank': row['Rank'], **{key: row[key] for key in keys}, 'Total_Points': row['Total_Points'],
+                  'Races': summary.races, 'Wins': position_counts.get(1, 0),
+                  'Podiums': sum(c for p, c in position_counts.items() if p <= 3)}
+        record.update({f'{race_type}_Points': p for race_type, p in sorted(json.loads(summary.type_points).items())})
+        if kind == 'driver':
+            record['Rating'] = round(summary.rating, 1) if summary.rating is not None else None
+        record['Tiebreak'] = row['Tiebreak']
+        records.append(record)
+    return records
+
+def archived_races(season):
+    """封存檔內的比賽 (依日期排序)；只讀比賽欄位"""
+    import pyarrow.parquet as pq
+    table = pq.read_table(archive_path(season), columns=['Race_Name'])
+    return list(dict.fromkeys(table.column('Race_Name').to_pylist()))
+
+def archived_race_results(season, race_name):
+    """封存檔內一場比賽的成績 (只讀取可能包含這場的 row group)"""
+    import pyarrow.parquet as pq
+    table = pq.read_table(archive_path(season), filters=[('Race_Name', '=', race_name)])
+    return table.sort_by([('Position', 'ascending')]).to_pylist()
+
+
+# ----------------------------------------------------
+# 5. 命令列
+# ----------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='封存已結束的賽季')
+    # --league 寫在子命令之後 (python season_archive.py archive 2025 --league 名稱)，每個子命令共用
+    league_parser = argparse.ArgumentParser(add_help=False)
+    league_parser.add_argument('--league', default=DEFAULT_LEAGUE, help='聯賽名稱 (預設為主要聯賽)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', parents=[league_parser], help='列出各賽季')
+    archive_parser = subparsers.add_parser('archive', parents=[league_parser], help='封存一個賽季')
+    archive_parser.add_argument('season', help='賽季 (比賽日期的年份)')
+    archive_parser.add_argument('--force', action='store_true', help='允許封存最新的賽季')
+    args = parser.parse_args()
+
+    if not league_exists(args.league):
+        sys.exit(f'找不到聯賽: {args.league}')
+    with use_league(args.league):
+        Session = current_league().Session
+        if args.command == 'list':
+            with Session() as session:
+                live = season_counts(session)
+                archived = set(archived_seasons(session))
+            for season in sorted(set(live) | archived):
+                status = '已封存' if season in archived else ''
+                print(f'{season}  熱資料庫比賽 {live.get(season, 0):>5}  {status}')
+            return
+        try:
+            summary = archive_season(Session, args.season, force=args.force)
+        except ArchiveError as e:
+            sys.exit(f'❌ {e}')
+        print(f"✅ 已封存 {summary['season']} 賽季：{summary['races']} 場比賽、{summary['results']} 筆成績 → {summary['file']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import uuid
+
+# ====================================================================
+# 共用快照檔：多個 gunicorn worker 共用同一份資料 (Arrow / Feather + mmap)
+# ====================================================================
+#
+# 第一個發現資料版本改變的 worker 負責計算並寫出：
+#   <F1_SNAPSHOT_DIR>/v<版本>.f<格式>/<DataFrame 名稱>.feather  (SNAPSHOT_FRAMES，未壓縮，才能直接 mmap)
+#   <F1_SNAPSHOT_DIR>/v<版本>.f<格式>/views.json              (圖表 JSON、選單、文字等小型欄位)
+# 其他 worker (包括之後才啟動的) 只要讀取 data_version，版本相符就直接 mmap 這些檔案，
+# 不再查詢 results / races / drivers。DataFrame 使用 pyarrow 型別 (pd.ArrowDtype)，
+# 欄位資料直接指向 mmap 的記憶體，所有 worker 透過作業系統的 page cache 共用同一份。
+# 可以從 DataFrame 算出的大型欄位不寫進 views.json (否則每個 worker 都會 json 解析出一份私有的複本)：
+#   - 詳細表格直接從 df_final_table 分頁 (league_view.table_page)，不另外存一份 records
+#   - results_compact 等 SNAPSHOT_DERIVED 欄位在第一次使用時才從 DataFrame 計算 (LazySnapshot)
+#
+# pyarrow 是選用套件：沒有安裝時所有函數都回傳 None / 不做事，退回原本各自計算的方式。
+
+SNAPSHOT_DIR = os.environ.get('F1_SNAPSHOT_DIR', '.snapshot')
+SNAPSHOT_FRAMES = ('df_detailed', 'df_standings', 'df_team_standings', 'df_final_table', 'df_type_rollup',
+                   'df_rating_history')
+SNAPSHOT_VIEWS = ('ranking_fig', 'team_ranking_fig', 'data_source_text', 'table_columns',
+                  'total_grand_prix_count', 'driver_options', 'race_options', 'race_drilldown_options',
+                  'type_standings', 'driver_stats', 'teammate_battles', 'rating_fig', 'driver_bump_fig', 'team_bump_fig')
+KEEP_VERSIONS = 2
+# 快照內容的格式編號：新增 / 修改欄位時 +1，舊格式的檔案就不會被讀取
+SNAPSHOT_FORMAT = 10
+
+
+class LazySnapshot(dict):
+    """
+    讀取共用快照時使用的 dict：derived 內的欄位 (名稱 → 函數(snapshot)) 第一次被讀取時才計算並保留
+    (只有用到的 worker 才計算；重複計算的結果相同，所以不必上鎖)
+    """
+    def __init__(self, *args, derived=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.derived = derived or {}
+
+    def __missing__(self, key):
+        if key not in self.derived:
+            raise KeyError(key)
+        value = self[key] = self.derived[key](self)
+        return value
+
+
+def _version_dir(version, base_dir):
+    return os.path.join(base_dir, f'v{version}.f{SNAPSHOT_FORMAT}')
+
+def _pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ----------------------------------------------------
+# 1. 寫出快照 (先寫到暫存資料夾，再一次 rename，其他 worker 不會讀到寫一半的檔案)
+# ----------------------------------------------------
+def save_shared_snapshot(version, snapshot, base_dir=SNAPSHOT_DIR):
+    """把快照寫成共用檔案；回傳是否寫入成功"""
+    if not _pyarrow_available():
+        return False
+    import plotly.io as pio
+    import pyarrow.feather as feather
+
+    final_dir = _version_dir(version, base_dir)
+    if os.path.isdir(final_dir):
+        return True
+    tmp_dir = os.path.join(base_dir, f'.tmp-{uuid.uuid4().hex}')
+    os.makedirs(tmp_dir)
+    try:
+        for name in SNAPSHOT_FRAMES:
+            feather.write_feather(snapshot[name], os.path.join(tmp_dir, f'{name}.feather'), compression='uncompressed')
+        views = {}
+        for name in SNAPSHOT_VIEWS:
+            value = snapshot[name]
+            # plotly Figure 物件先轉成 JSON 相容的 dict
+            views[name] = json.loads(pio.to_json(value)) if hasattr(value, 'to_plotly_json') else value
+        with open(os.path.join(tmp_dir, 'views.json'), 'w', encoding='utf-8') as f:
+            json.dump(views, f, ensure_ascii=False, default=str)
+        try:
+            os.rename(tmp_dir, final_dir)
+        except OSError:
+            # 另一個 worker 已經搶先寫好同一個版本
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    prune_shared_snapshots(base_dir)
+    return True
+
+
+# ----------------------------------------------------
+# 2. 讀取快照 (memory-map，不複製資料)
+# ----------------------------------------------------
+def load_shared_snapshot(version, base_dir=SNAPSHOT_DIR, derived=None):
+    """讀取指定版本的共用快照 (LazySnapshot，derived 見上)；不存在時回傳 None"""
+    version_dir = _version_dir(version, base_dir)
+    if not os.path.isdir(version_dir) or not _pyarrow_available():
+        return None
+    import pandas as pd
+    import pyarrow.feather as feather
+
+    try:
+        snapshot = LazySnapshot(derived=derived)
+        for name in SNAPSHOT_FRAMES:
+            table = feather.read_table(os.path.join(version_dir, f'{name}.feather'), memory_map=True)
+            # split_blocks：每欄各自一個 block，不合併成 2D block (寬表格合併時會配置大量私有記憶體)
+            snapshot[name] = table.to_pandas(types_mapper=pd.ArrowDtype, split_blocks=True)
+        with open(os.path.join(version_dir, 'views.json'), encoding='utf-8') as f:
+            snapshot.update(json.load(f))
+    except (OSError, ValueError):
+        # 檔案在讀取途中被清除 (版本已過期)，交給呼叫端重新計算
+        return None
+    return snapshot
+
+
+# ----------------------------------------------------
+# 3. 清除舊版本 (只保留最近幾個版本)
+# ----------------------------------------------------
+def prune_shared_snapshots(base_dir=SNAPSHOT_DIR, keep=KEEP_VERSIONS):
+    versions = []
+    for entry in os.listdir(base_dir):
+        version, _, fmt = entry[1:].partition('.f')
+        if not entry.startswith('v') or not version.isdigit():
+            continue
+        if fmt != str(SNAPSHOT_FORMAT):
+            # 舊格式的快照直接清除
+            shutil.rmtree(os.path.join(base_dir, entry), ignore_errors=True)
+        else:
+            versions.append(int(version))
+    for version in sorted(versions)[:-keep]:
+        # 已經 mmap 的 worker 仍可繼續讀取 (Linux 上刪除檔案不影響已開啟的對應)
+        shutil.rmtree(_version_dir(version, base_dir), ignore_errors=True)
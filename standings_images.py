@@ -0,0 +1,172 @@
+import threading
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import BytesIO
+
+from flask import Response, abort, request
+
+from league_pool import current_league_name
+from league_view import CHART_TOP_N, compact_view
+
+# ====================================================================
+# 排名圖片 (PNG / SVG)：賽後直接貼到群組，不必再截圖
+# ====================================================================
+#
+# GET /images/standings/drivers.png?width=1000&height=600
+# GET /images/standings/teams.svg
+#
+# 資料與 create_ranking_figure / create_team_ranking_figure 相同 (依比賽日期堆疊、車隊顏色、
+# 右側總分)，來源是快照中的 results_compact，所以使用預先輸出的檔案時也不必載入 pandas。
+# 與網頁上的圖表一樣只畫前 CHART_TOP_N 名車手 / 車隊 (league_view.compact_view)。
+# 以 (聯賽, 資料版本, 車手/車隊, 格式, 寬, 高) 為 key 快取，同樣的請求直接回傳快取，不會重新繪製。
+
+IMAGE_KINDS = ('drivers', 'teams')
+IMAGE_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+DEFAULT_SIZE = (1000, 600)
+MIN_SIZE, MAX_SIZE = 300, 2400
+DPI = 100
+MAX_CACHED_IMAGES = 32
+# 中文標題需要 CJK 字型；依序嘗試常見的字型，都沒有時退回 DejaVu Sans
+CJK_FONTS = ['Microsoft JhengHei', 'Noto Sans CJK TC', 'PingFang TC', 'Heiti TC', 'DejaVu Sans']
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_render_lock = threading.Lock()
+
+
+# ----------------------------------------------------
+# 1. 繪圖 (使用 Figure 物件，不經過 pyplot 的全域狀態)
+# ----------------------------------------------------
+def _segments(compact, kind):
+    """
+    compact 為 compact_view 的結果，只畫 driver_charted / team_charted 標示的車手 / 車隊
+    回傳 (類別名稱清單 [高分在前], 每筆成績的 類別索引 / 起點 / 長度 / 車隊代碼, 總分)
+    """
+    if kind == 'drivers':
+        names = compact['drivers']
+        category_of = list(range(len(names)))
+        charted = compact['driver_charted']
+    else:
+        names = compact['teams']
+        category_of = compact['driver_team']
+        charted = compact['team_charted']
+    totals = [0] * len(names)
+    rows = []
+    for d, p in zip(compact['d'], compact['p']):
+        c = category_of[d]
+        if not charted[c]:
+            continue
+        rows.append((c, totals[c], p, compact['driver_team'][d]))
+        totals[c] += p
+    # drivers / teams 已依排名 (countback) 排序，同分時維持這個順序
+    order = sorted((c for c in range(len(names)) if charted[c]), key=lambda c: -totals[c])
+    return [names[c] for c in order], order, rows, totals
+
+def render_standings_image(compact, kind, fmt, width, height):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Patch
+
+    names, order, rows, totals = _segments(compact, kind)
+    # Plotly 由下往上畫，這裡也一樣：最高分放在最上面
+    y_of = {c: len(order) - 1 - i for i, c in enumerate(order)}
+    team_colors = [color or f'C{t}' for t, color in enumerate(compact['team_colors'])]
+
+    fig = Figure(figsize=(width / DPI, height / DPI), dpi=DPI, layout='constrained')
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    with _font_context():
+        if rows:
+            ax.barh(
+                [y_of[c] for c, _, _, _ in rows],
+                [p for _, _, p, _ in rows],
+                left=[left for _, left, _, _ in rows],
+                color=[team_colors[t] for _, _, _, t in rows],
+                edgecolor='white',
+                linewidth=0.5,
+            )
+        for c in order:
+            ax.annotate(f'{totals[c]}', (totals[c], y_of[c]), xytext=(6, 0), textcoords='offset points',
+                        va='center', fontsize=12, fontweight='bold')
+        ax.set_yticks([y_of[c] for c in order], names)
+        ax.set_xlim(0, max(totals or [0]) * (1.15 if kind == 'drivers' else 1.1) or 1)
+        ax.set_xlabel('累積總積分' if kind == 'drivers' else '總積分')
+        ax.set_title('車手積分排名' if kind == 'drivers' else '車隊總積分排名', fontweight='bold')
+        fig.legend(
+            handles=[Patch(color=team_colors[t], label=compact['teams'][t]) for t in sorted({t for *_, t in rows})],
+            title='車隊', loc='outside right upper', frameon=False,
+        )
+        for spine in ('top', 'right'):
+            ax.spines[spine].set_visible(False)
+
+        buffer = BytesIO()
+        fig.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+@contextmanager
+def _font_context():
+    from matplotlib import rc_context
+
+    with rc_context({'font.family': 'sans-serif', 'font.sans-serif': CJK_FONTS, 'svg.fonttype': 'none'}), \
+            warnings.catch_warnings():
+        # 沒有 CJK 字型時 matplotlib 會對每個字警告一次，這裡略過
+        warnings.filterwarnings('ignore', message='Glyph .* missing from')
+        warnings.filterwarnings('ignore', message='findfont')
+        yield
+
+
+# ----------------------------------------------------
+# 2. 快取 (每個 資料版本 + 尺寸 只繪製一次)
+# ----------------------------------------------------
+def get_standings_image(version, compact, kind, fmt, width, height, top_n=CHART_TOP_N):
+    key = (current_league_name(), version, kind, fmt, width, height, top_n)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    with _render_lock:
+        # 等待鎖的期間可能已經有別的請求畫好了
+        with _cache_lock:
+            if key in _cache:
+                return _cache[key]
+        image = render_standings_image(compact_view(compact, top_n=top_n), kind, fmt, width, height)
+        with _cache_lock:
+            _cache[key] = image
+            while len(_cache) > MAX_CACHED_IMAGES:
+                _cache.popitem(last=False)
+    return image
+
+
+# ----------------------------------------------------
+# 3. 註冊路由
+# ----------------------------------------------------
+def _size_arg(name, default):
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        abort(400)
+    return max(MIN_SIZE, min(MAX_SIZE, value))
+
+def register_image_routes(server, get_snapshot):
+    """get_snapshot() 回傳 (資料版本, 快照)，與 app.get_dashboard_snapshot 相同"""
+
+    @server.route('/images/standings/<kind>.<fmt>')
+    def standings_image(kind, fmt):
+        if kind not in IMAGE_KINDS or fmt not in IMAGE_FORMATS:
+            abort(404)
+        width = _size_arg('width', DEFAULT_SIZE[0])
+        height = _size_arg('height', DEFAULT_SIZE[1])
+        version, snapshot = get_snapshot()
+
+        etag = f'"v{version}-{kind}-{width}x{height}.{fmt}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = Response(status=304)
+        else:
+            image = get_standings_image(version, snapshot['results_compact'], kind, fmt, width, height)
+            response = Response(image, mimetype=IMAGE_FORMATS[fmt])
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return standings_image
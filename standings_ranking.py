@@ -0,0 +1,109 @@
+# ====================================================================
+# 積分榜排序 (F1 countback)：同分時比冠軍次數，再比亞軍次數，依此類推
+# ====================================================================
+#
+# 1. 每位車手 (車隊) 建立名次直方圖：P1 次數、P2 次數、...
+# 2. 以 [總積分, P1, P2, ...] 做一次字典序排序 (DataFrame.sort_values，全部由大到小)
+# 3. 排序鍵完全相同才算並列，並列者共用名次 (Rank)
+# Tiebreak 欄位說明同分者是靠哪些名次分出勝負 (例如 "P1×2 P2×1")，顯示在排名圖的總分標籤旁。
+#
+# 每站賽後的排名 (standings_trajectory) 也使用同一規則：rank_rounds 對 (站次 x 車手) 矩陣
+# 逐一加入 P1、P2... 的累積次數 (numpy 整數排序鍵)，所有站都沒有同分時就提早結束。
+
+STANDINGS_COLUMNS = ['Total_Points', 'Rank', 'Tiebreak']
+
+
+def _position_column(position):
+    return f'P{int(position)}'
+
+def countback_standings(df_by_position, keys):
+    """
+    df_by_position：每個 (車手或車隊, 名次) 一列，欄位為 keys + Position / Count / Points
+    回傳 keys + Total_Points / Rank / Tiebreak，依 countback 排序
+    """
+    import pandas as pd
+    keys = list(keys)
+    totals = df_by_position.groupby(keys, sort=False)['Points'].sum()
+    histogram = (df_by_position.dropna(subset=['Position'])
+                 .pivot_table(index=keys, columns='Position', values='Count', aggfunc='sum', fill_value=0)
+                 .reindex(totals.index, fill_value=0))
+    histogram = histogram[sorted(histogram.columns)]
+    histogram.columns = [_position_column(p) for p in histogram.columns]
+    position_columns = list(histogram.columns)
+
+    table = histogram.assign(Total_Points=totals).reset_index()
+    sort_columns = ['Total_Points'] + position_columns
+    table = table.sort_values(sort_columns + keys, ascending=[False] * len(sort_columns) + [True] * len(keys),
+                              kind='stable').reset_index(drop=True)
+
+    # 排序鍵與上一列不同時才換名次 (完全相同者並列)
+    changed = table[sort_columns].ne(table[sort_columns].shift()).any(axis=1)
+    table['Rank'] = pd.Series(range(1, len(table) + 1)).where(changed).ffill().astype(int)
+    table['Tiebreak'] = _tiebreak_text(table, position_columns)
+    return table[keys + STANDINGS_COLUMNS]
+
+def _tiebreak_text(table, position_columns):
+    """同分的車手列出比到第幾名才分出勝負，例如 "P1×2 P2×1" """
+    text = [''] * len(table)
+    tied = table['Total_Points'].eq(table['Total_Points'].shift()) | table['Total_Points'].eq(table['Total_Points'].shift(-1))
+    if not tied.any() or not position_columns:
+        return text
+    counts = table[position_columns].to_numpy()
+    for _, group in table[tied].groupby('Total_Points', sort=False):
+        rows = group.index.tolist()
+        # 比到哪一欄才分出勝負 (相鄰兩列第一個不同的名次欄位)
+        depth = 1
+        for a, b in zip(rows, rows[1:]):
+            differs = (counts[a] != counts[b]).nonzero()[0]
+            depth = max(depth, differs[0] + 1 if len(differs) else len(position_columns))
+        for row in rows:
+            text[row] = ' '.join(f'{position_columns[i]}×{counts[row][i]}' for i in range(depth))
+    return text
+
+
+def rank_rounds(cumulative, count_matrices):
+    """
+    cumulative：(站次 x 對象) 的累積積分 numpy 矩陣 (還沒出賽為 NaN)
+    count_matrices：依名次由小到大產生 (站次 x 對象) 的累積次數矩陣 (只需產生有人拿過的名次)
+    回傳同形狀的名次矩陣 (並列者同名次，還沒出賽為 NaN)
+    """
+    import numpy as np
+    started = ~np.isnan(cumulative)
+    max_count = cumulative.shape[0] + 1
+    # 排序鍵以 int64 表示：每加入一個名次就 key * max_count - 次數，
+    # 數值快溢位前重新壓縮成每列的 dense rank (同時檢查是否還有同分)
+    bits_left = 62 - np.log2(cumulative.shape[1] + 2)
+    steps = max(1, int(bits_left // np.log2(max_count + 1)))
+    key, order, new_group = _dense_rows(np.where(started, -cumulative, np.inf))
+    count_matrices = iter(count_matrices)
+    exhausted = False
+    while not exhausted and _has_ties(started, order, new_group):
+        for _ in range(steps):
+            counts = next(count_matrices, None)
+            if counts is None:
+                exhausted = True
+                break
+            key = key * max_count - counts
+        key, order, new_group = _dense_rows(key)
+
+    # 名次 = 同一列中排序鍵比自己小的 (已出賽) 對象數 + 1 (未出賽的排序鍵最大，排在最後)
+    columns = np.arange(key.shape[1])
+    first_of_group = np.maximum.accumulate(np.where(new_group, columns, 0), axis=1)
+    position = np.empty(key.shape)
+    np.put_along_axis(position, order, first_of_group + 1, axis=1)
+    return np.where(started, position, np.nan)
+
+def _dense_rows(key):
+    """每一列各自的 dense rank (int64)，以及排序順序與「是否為新的一組」"""
+    import numpy as np
+    order = np.argsort(key, axis=1, kind='stable')
+    sorted_key = np.take_along_axis(key, order, axis=1)
+    new_group = np.ones(key.shape, dtype=bool)
+    new_group[:, 1:] = sorted_key[:, 1:] != sorted_key[:, :-1]
+    dense = np.empty(key.shape, dtype=np.int64)
+    np.put_along_axis(dense, order, np.cumsum(new_group, axis=1), axis=1)
+    return dense, order, new_group
+
+def _has_ties(started, order, new_group):
+    import numpy as np
+    return bool((~new_group & np.take_along_axis(started, order, axis=1)).any())
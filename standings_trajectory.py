@@ -0,0 +1,90 @@
+# ====================================================================
+# 每站賽後的排名走勢 (bump chart)：一次向量化計算，不必每場比賽各查一次總排名
+# ====================================================================
+#
+# 1. 比賽依日期排序成「站次」(同一天先衝刺賽)，樞紐成 (站次 x 車手) 的積分矩陣 (沒出賽為 0)
+# 2. 沿站次做 cumsum 得到每站賽後的累積積分
+# 3. 每一列 (同一站) 做 rank 得到當時的名次；同分依 countback (standings_ranking.rank_rounds)
+# 還沒出賽過的車手 (例如季中加入) 在第一次出賽前不列入排名。
+# 車隊使用同一套計算，只是把車手換成車隊。
+
+from standings_ranking import rank_rounds
+
+TRAJECTORY_COLUMNS = ['Round', 'Race_Name', 'Race_Date', 'Cumulative_Points', 'Position']
+
+
+def race_rounds(df_detailed):
+    """每場比賽一列，依日期排序並編上站次 (同一天先衝刺賽、後正賽)"""
+    races = df_detailed[['Race_Name', 'Race_Date', 'Race_Type']].drop_duplicates('Race_Name')
+    races = (races.assign(_main_race=races['Race_Type'] != 'Sprint')
+             .sort_values(['Race_Date', '_main_race', 'Race_Name'], kind='stable')
+             [['Race_Name', 'Race_Date']]
+             .reset_index(drop=True))
+    # 每場比賽一列，日期轉成顯示用的字串
+    races['Race_Date'] = races['Race_Date'].dt.strftime('%Y-%m-%d')
+    races['Round'] = range(1, len(races) + 1)
+    return races
+
+def compute_position_trajectory(df_detailed, key='Driver'):
+    """key = 'Driver' 或 'Team'；回傳每站賽後每位車手 (車隊) 的累積積分與名次"""
+    import pandas as pd
+    races = race_rounds(df_detailed)
+    points = df_detailed.pivot_table(index='Race_Name', columns=key, values='Points', aggfunc='sum', fill_value=0,
+                                     observed=True)
+    points = points.reindex(races['Race_Name'], fill_value=0)
+    started = df_detailed.pivot_table(index='Race_Name', columns=key, values='Points', aggfunc='size', fill_value=0,
+                                      observed=True)
+    started = started.reindex(index=races['Race_Name'], columns=points.columns, fill_value=0).cumsum() > 0
+
+    cumulative = points.cumsum().where(started)
+    position = rank_rounds(cumulative.to_numpy(dtype=float), _position_count_matrices(df_detailed, races, points.columns, key))
+    position = pd.DataFrame(position, index=cumulative.index, columns=cumulative.columns)
+
+    df = pd.DataFrame({
+        'Cumulative_Points': cumulative.stack(),
+        'Position': position.stack(),
+    }).reset_index()
+    df = df.merge(races, on='Race_Name', how='left')
+    df['Cumulative_Points'] = df['Cumulative_Points'].astype(int)
+    df['Position'] = df['Position'].astype(int)
+    return df.sort_values(['Round', 'Position', key], kind='stable')[[key] + TRAJECTORY_COLUMNS].reset_index(drop=True)
+
+
+def _position_count_matrices(df_detailed, races, columns, key):
+    """依名次由小到大，產生 (站次 x 對象) 的累積次數矩陣 (countback 用)"""
+    import numpy as np
+    import pandas as pd
+    finishes = df_detailed.dropna(subset=['Position'])
+    round_index = pd.Index(races['Race_Name']).get_indexer(finishes['Race_Name'])
+    column_index = pd.Index(columns).get_indexer(finishes[key])
+    positions = finishes['Position'].astype('int64').to_numpy()
+    order = np.argsort(positions, kind='stable')
+    boundaries = np.flatnonzero(np.diff(positions[order])) + 1
+    for rows in np.split(order, boundaries):
+        if not len(rows):
+            continue
+        counts = np.zeros((len(races), len(columns)), dtype=np.int64)
+        np.add.at(counts, (round_index[rows], column_index[rows]), 1)
+        yield counts.cumsum(axis=0)
+
+
+def create_bump_figure(df_trajectory, key, title, color_map=None):
+    """名次走勢圖：第一名在最上面，X 軸依站次排列"""
+    import plotly.express as px
+    race_order = df_trajectory.sort_values('Round')['Race_Name'].drop_duplicates().tolist()
+    fig = px.line(
+        df_trajectory,
+        x='Race_Name',
+        y='Position',
+        color=key,
+        markers=True,
+        title=title,
+        hover_data={'Round': True, 'Race_Date': True, 'Cumulative_Points': True},
+        category_orders={'Race_Name': race_order},
+        color_discrete_map=color_map or {},
+        height=500,
+    )
+    max_position = int(df_trajectory['Position'].max()) if len(df_trajectory) else 1
+    fig.update_yaxes(range=[max_position + 0.5, 0.5], dtick=1, title_text='名次')
+    fig.update_layout(xaxis_title='比賽 (依日期)', legend_title_text='車手' if key == 'Driver' else '車隊')
+    return fig
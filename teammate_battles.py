@@ -0,0 +1,55 @@
+# ====================================================================
+# 隊友對決：同車隊的兩位車手在同一場比賽中誰的名次較前
+# ====================================================================
+#
+# 在快照的 df_detailed 上做一次 self-merge (依 比賽 + 車隊)，得到每場比賽的 (車手, 隊友) 組合，
+# 再以一次 groupby 算出每組的統計 (不用 Python 迴圈逐組比較)：
+#   Races            兩人同場的比賽數
+#   Ahead / Behind   名次在隊友之前 / 之後的次數 (任一方沒有名次的比賽不計)
+#   Points           自己在這些比賽的積分；Teammate_Points 為隊友的積分
+#   Points_Share     自己佔兩人合計積分的比例 (%)
+#   Avg_Position_Gap 平均名次差 (自己 - 隊友，負數代表平均領先隊友)
+# 每組會出現兩次 (從兩位車手各自的角度)，隨快照每個資料版本計算一次。
+
+TEAMMATE_COLUMNS = ['Team', 'Driver', 'Teammate', 'Races', 'Ahead', 'Behind',
+                    'Points', 'Teammate_Points', 'Points_Share', 'Avg_Position_Gap']
+
+
+def compute_teammate_battles(df_detailed, driver_order=None):
+    """driver_order (例如總分排名) 決定列的順序：車隊依其最高名次車手排序，隊內也依排名"""
+    import pandas as pd
+    results = df_detailed[['Race_Name', 'Team', 'Driver', 'Points', 'Position']]
+    pairs = results.merge(results, on=['Race_Name', 'Team'], suffixes=('', '_Mate'))
+    pairs = pairs[pairs['Driver'].astype(str) != pairs['Driver_Mate'].astype(str)]
+    if pairs.empty:
+        return pd.DataFrame(columns=TEAMMATE_COLUMNS)
+
+    gap = pairs['Position'].astype('float64') - pairs['Position_Mate'].astype('float64')
+    pairs = pairs.assign(
+        Ahead=(gap < 0).astype('int64'),
+        Behind=(gap > 0).astype('int64'),
+        Gap=gap,
+        Points=pairs['Points'].astype('int64'),
+        Points_Mate=pairs['Points_Mate'].astype('int64'),
+    )
+    battles = (pairs.groupby(['Team', 'Driver', 'Driver_Mate'], observed=True, sort=False)
+               .agg(Races=('Gap', 'size'), Ahead=('Ahead', 'sum'), Behind=('Behind', 'sum'),
+                    Points=('Points', 'sum'), Teammate_Points=('Points_Mate', 'sum'),
+                    Avg_Position_Gap=('Gap', 'mean'))
+               .reset_index()
+               .rename(columns={'Driver_Mate': 'Teammate'}))
+    total = battles['Points'] + battles['Teammate_Points']
+    battles['Points_Share'] = (battles['Points'] / total.where(total > 0) * 100).round(1)
+    battles['Avg_Position_Gap'] = battles['Avg_Position_Gap'].round(2)
+    for col in ('Team', 'Driver', 'Teammate'):
+        battles[col] = battles[col].astype(str)
+
+    if driver_order is not None:
+        rank = {driver: i for i, driver in enumerate(driver_order)}
+        driver_rank = battles['Driver'].map(rank).fillna(len(rank))
+        battles = battles.assign(
+            _team_rank=driver_rank.groupby(battles['Team']).transform('min'),
+            _driver_rank=driver_rank,
+            _mate_rank=battles['Teammate'].map(rank).fillna(len(rank)),
+        ).sort_values(['_team_rank', 'Team', '_driver_rank', '_mate_rank'], kind='stable')
+    return battles[TEAMMATE_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,315 @@
+from sqlalchemy import select, tuple_
+
+from database_setup import Race, Result, Driver
+
+# ====================================================================
+# 假設情境 (what-if)：在沙盒中修改單場成績，只用差異更新積分榜與圖表
+# ====================================================================
+#
+# 修改內容 (edits) 只存在瀏覽器的 dcc.Store，資料庫完全不變，格式為：
+#   {"driver": "mimicethan", "race": "匈牙利正賽", "points": 18, "position": 2, "disqualified": false}
+#   points / position 為 None 代表不修改；disqualified 為 true 時積分歸零、沒有名次
+#
+# 1. 一次查詢取出被修改成績的原始值 (fetch_original_results，只查修改的那幾筆)
+# 2. 每筆修改產生兩列差異：原名次 (次數 -1、積分 -原積分) + 新名次 (次數 +1、積分 +新積分)
+# 3. 快取的 countback 索引 (每位車手的總分與名次直方圖、原本的排序) 只更新受影響的車手，
+#    再以二分搜尋插回已排序的名單 → 不必重新讀取成績，也不必重新排序全部車手；
+#    同分判定 (Tiebreak) 只重算總分受影響的同分組 (比較的名次出現或消失時全部重算)
+# 4. 圖表：只修改 results-store 中對應那幾筆的積分與分類彙總 (apply_edits_to_compact)
+# 確定要寫入時，把同樣的 JSON 送到 POST /api/results/edits (write_api.apply_result_edits)。
+
+WHATIF_COLUMNS = ['Rank', 'Rank_Change', 'Total_Points', 'Points_Change', 'Tiebreak']
+
+
+# ----------------------------------------------------
+# 1. 修改內容的驗證與合併
+# ----------------------------------------------------
+def _optional_int(value, name, minimum):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value) or value < minimum:
+        raise ValueError(f'{name} 必須是{"非負" if minimum == 0 else "正"}整數')
+    return int(value)
+
+def normalize_edit(edit):
+    """檢查並整理一筆修改 (回傳新的 dict)；格式錯誤時丟出 ValueError"""
+    if not isinstance(edit, dict):
+        raise ValueError('修改必須是物件')
+    driver, race = edit.get('driver'), edit.get('race')
+    if not driver or not isinstance(driver, str):
+        raise ValueError('缺少車手 driver')
+    if not race or not isinstance(race, str):
+        raise ValueError('缺少比賽 race')
+    disqualified = bool(edit.get('disqualified'))
+    points = None if disqualified else _optional_int(edit.get('points'), 'points', 0)
+    position = None if disqualified else _optional_int(edit.get('position'), 'position', 1)
+    if not disqualified and points is None and position is None:
+        raise ValueError(f'{driver} / {race}：沒有要修改的積分或名次')
+    return {'driver': driver, 'race': race, 'points': points, 'position': position,
+            'disqualified': disqualified}
+
+def upsert_edit(edits, edit):
+    """同一筆成績 (車手 + 比賽) 只保留最後一次修改"""
+    key = (edit['driver'], edit['race'])
+    return [e for e in edits or [] if (e['driver'], e['race']) != key] + [edit]
+
+def edited_result(edit, points, position):
+    """套用修改後的 (積分, 名次)；points / position 為原本的值"""
+    if edit['disqualified']:
+        return 0, None
+    return (points if edit['points'] is None else edit['points'],
+            position if edit['position'] is None else edit['position'])
+
+
+# ----------------------------------------------------
+# 2. 原始成績 (只查被修改的那幾筆)
+# ----------------------------------------------------
+def fetch_original_results(session, edits):
+    """回傳 {(車手, 比賽): (車隊, 積分, 名次)}；找不到的成績不會出現在結果中"""
+    pairs = list({(e['driver'], e['race']) for e in edits or []})
+    if not pairs:
+        return {}
+    stmt = (select(Driver.name, Race.name, Driver.team, Result.points, Result.position)
+            .join(Result, Driver.driver_id == Result.driver_id)
+            .join(Race, Race.race_id == Result.race_id)
+            .where(tuple_(Driver.name, Race.name).in_(pairs))
+            .order_by(Result.result_id))
+    originals = {}
+    for driver, race, team, points, position in session.execute(stmt):
+        # 同一場重複的成績只取第一筆 (與詳細表格相同)
+        originals.setdefault((driver, race), (team, points or 0, position))
+    return originals
+
+
+# ----------------------------------------------------
+# 3. 積分榜：快取的 countback 索引 + 差異 → 只重新排序被修改的對象
+# ----------------------------------------------------
+def whatif_delta_rows(edits, originals):
+    """回傳 (差異 DataFrame, 找不到的修改)；欄位與名次彙總相同 (Driver / Team / Position / Count / Points)"""
+    import pandas as pd
+    rows, missing = [], []
+    for edit in edits or []:
+        original = originals.get((edit['driver'], edit['race']))
+        if original is None:
+            missing.append(edit)
+            continue
+        team, points, position = original
+        new_points, new_position = edited_result(edit, points, position)
+        rows.append((edit['driver'], team, position, -1, -points))
+        rows.append((edit['driver'], team, new_position, 1, new_points))
+    return pd.DataFrame(rows, columns=['Driver', 'Team', 'Position', 'Count', 'Points']), missing
+
+class CountbackKey:
+    """countback 排序鍵 (總分、P1、P2... 由大到小，最後依名稱)；名次直方圖為稀疏 dict {名次: 次數}"""
+    __slots__ = ('total', 'histogram', 'key')
+
+    def __init__(self, total, histogram, key):
+        self.total = total
+        self.histogram = histogram
+        self.key = key
+
+    def first_difference(self, other):
+        """第一個次數不同的名次；None 代表所有名次次數都相同"""
+        for position in sorted(self.histogram.keys() | other.histogram.keys()):
+            if self.histogram.get(position, 0) != other.histogram.get(position, 0):
+                return position
+        return None
+
+    def ties(self, other):
+        return self.total == other.total and self.first_difference(other) is None
+
+    def __lt__(self, other):
+        if self.total != other.total:
+            return self.total > other.total
+        position = self.first_difference(other)
+        if position is None:
+            return self.key < other.key
+        return self.histogram.get(position, 0) > other.histogram.get(position, 0)
+
+def _tiebreak_depth(differences, positions):
+    """同分組要比到第幾個名次欄位 (differences 為相鄰兩位第一個不同的名次)"""
+    column = {p: i for i, p in enumerate(positions)}
+    return max([1] + [len(positions) if p is None else column[p] + 1 for p in differences])
+
+def countback_index(counts, standings, keys):
+    """
+    每個資料版本建立一次 (由 app 快取)：
+    counts 為名次彙總 (keys + Position / Count / Points)，standings 為 countback_standings 的結果
+    """
+    import pandas as pd
+    keys = list(keys)
+    histograms = {}
+    for *key, position, count in counts[keys + ['Position', 'Count']].itertuples(index=False, name=None):
+        if pd.notna(position):
+            histogram = histograms.setdefault(tuple(key), {})
+            histogram[int(position)] = histogram.get(int(position), 0) + int(count)
+    order = list(standings[keys].itertuples(index=False, name=None))
+    total = dict(zip(order, standings['Total_Points'].tolist()))
+    sort_keys = {key: CountbackKey(total[key], histograms.get(key, {}), key) for key in order}
+    # 全聯賽各名次的次數：假設情境套用差異後，次數歸零的名次就不再比較
+    position_counts = {}
+    for histogram in histograms.values():
+        for position, count in histogram.items():
+            position_counts[position] = position_counts.get(position, 0) + count
+    positions = sorted(p for p, count in position_counts.items() if count > 0)
+
+    # 同分的相鄰兩位第一個不同的名次 (決定 Tiebreak 要列到第幾個名次)
+    difference, groups = {}, {}
+    for prev, key in zip(order, order[1:]):
+        if total[prev] == total[key]:
+            difference[key] = sort_keys[key].first_difference(sort_keys[prev])
+            groups.setdefault(total[key], []).append(difference[key])
+    depth = {value: _tiebreak_depth(group, positions) for value, group in groups.items()}
+    return {
+        'keys': keys,
+        'order': order,
+        'row': {key: i for i, key in enumerate(order)},
+        'total': total,
+        'rank': dict(zip(order, standings['Rank'].tolist())),
+        'tiebreak': dict(zip(order, standings['Tiebreak'].tolist())),
+        'sort_keys': sort_keys,
+        'positions': positions,
+        'position_counts': position_counts,
+        'difference': difference,
+        'depth': depth,
+    }
+
+def whatif_standings(index, delta):
+    """
+    index：countback_index；delta：whatif_delta_rows 的差異列
+    只有出現在差異中的對象需要重新計算總分與名次直方圖，再以二分搜尋插回原本已排序的名單；
+    名次只在插入點附近重新比較，Tiebreak 只重算總分受影響的同分組。
+    回傳 keys + WHATIF_COLUMNS (依假設情境的名次排序)
+    """
+    import bisect
+    import pandas as pd
+    keys, order = index['keys'], index['order']
+    changed = {}
+    position_counts = dict(index['position_counts'])
+    for *key, position, count, points in delta[keys + ['Position', 'Count', 'Points']].itertuples(index=False, name=None):
+        key = tuple(key)
+        if key not in changed:
+            base = index['sort_keys'].get(key) or CountbackKey(0, {}, key)
+            changed[key] = CountbackKey(base.total, dict(base.histogram), key)
+        changed[key].total += int(points)
+        if pd.notna(position):
+            histogram = changed[key].histogram
+            histogram[int(position)] = histogram.get(int(position), 0) + int(count)
+            position_counts[int(position)] = position_counts.get(int(position), 0) + int(count)
+    for changed_key in changed.values():
+        changed_key.histogram = {p: count for p, count in changed_key.histogram.items() if count}
+    # 比較的名次以套用差異後的次數為準 (新出現的名次加入、沒有人再拿到的名次移除)
+    positions = sorted(p for p, count in position_counts.items() if count > 0)
+
+    def sort_key(key):
+        return changed.get(key) or index['sort_keys'][key]
+
+    def adjacent_before(prev, key):
+        """原本就相鄰且都沒有修改的兩位"""
+        return key not in changed and prev not in changed and index['row'][key] == index['row'][prev] + 1
+
+    # 未受影響的對象維持原本的順序；受影響的依序插入
+    others = [key for key in order if key not in changed]
+    final, start = [], 0
+    for key in sorted(changed, key=sort_key):
+        at = bisect.bisect_left(others, changed[key], lo=start, key=sort_key)
+        final.extend(others[start:at])
+        final.append(key)
+        start = at
+    final.extend(others[start:])
+
+    ranks = []
+    for i, key in enumerate(final):
+        if i == 0:
+            tied = False
+        elif adjacent_before(final[i - 1], key):
+            tied = index['rank'][key] == index['rank'][final[i - 1]]
+        else:
+            tied = sort_key(key).ties(sort_key(final[i - 1]))
+        ranks.append(ranks[-1] if tied else i + 1)
+
+    # Tiebreak：只有總分受影響的同分組要重新計算 (同分者在名單中相鄰)；
+    # 比較的名次出現或消失時，所有同分組的文字都會改變
+    touched = {index['total'][key] for key in changed if key in index['total']} | {k.total for k in changed.values()}
+    all_touched = positions != index['positions']
+    tiebreak = {}
+    for i, key in enumerate(final):
+        total = sort_key(key).total
+        if total not in touched and not all_touched:
+            tiebreak[key] = index['tiebreak'][key]
+        elif i == 0 or sort_key(final[i - 1]).total != total:
+            group = [key]
+            while i + len(group) < len(final) and sort_key(final[i + len(group)]).total == total:
+                group.append(final[i + len(group)])
+            tiebreak.update(_group_tiebreak(index, group, changed, sort_key, adjacent_before, positions))
+
+    return pd.DataFrame({
+        **{col: [key[i] for key in final] for i, col in enumerate(keys)},
+        'Rank': ranks,
+        'Rank_Change': [index['rank'][key] - rank if key in index['rank'] else 0 for key, rank in zip(final, ranks)],
+        'Total_Points': [sort_key(key).total for key in final],
+        'Points_Change': [sort_key(key).total - index['total'].get(key, 0) for key in final],
+        'Tiebreak': [tiebreak[key] for key in final],
+    }, columns=keys + WHATIF_COLUMNS)
+
+def _group_tiebreak(index, group, changed, sort_key, adjacent_before, positions):
+    """同一總分的一組 (已排序)：與 standings_ranking 相同的 "P1×2 P2×1" 文字"""
+    if len(group) < 2:
+        return {key: '' for key in group}
+    differences = [index['difference'][key] if adjacent_before(prev, key)
+                   else sort_key(key).first_difference(sort_key(prev))
+                   for prev, key in zip(group, group[1:])]
+    depth = _tiebreak_depth(differences, positions)
+
+    def text(key):
+        histogram = sort_key(key).histogram
+        return ' '.join(f'P{p}×{histogram.get(p, 0)}' for p in positions[:depth])
+
+    # 比較深度不變時，沒有修改的車手沿用原本的文字
+    if depth == index['depth'].get(sort_key(group[0]).total) and positions == index['positions']:
+        return {key: text(key) if key in changed else index['tiebreak'][key] for key in group}
+    return {key: text(key) for key in group}
+
+
+# ----------------------------------------------------
+# 4. 圖表：只修改 results-store 中被修改的那幾筆
+# ----------------------------------------------------
+def apply_edits_to_compact(compact, edits):
+    """
+    compact：league_view.compact_view 的結果 (只含要送到瀏覽器的車手)
+    回傳新的 dict，p / pos / driver_type_points / type_position_counts 已套用修改 (其他欄位共用原本的 list)
+    只掃描這份精簡資料 (前 N 名的成績)，找齊所有被修改的成績就停止
+    """
+    if not compact or not edits:
+        return compact
+    driver_code = {name: d for d, name in enumerate(compact['drivers'])}
+    race_code = {name: r for r, name in enumerate(compact['races'])}
+    # 不在這份資料中的車手 (前 N 名以外) 不會出現在圖表上
+    targets = {(driver_code[e['driver']], race_code[e['race']]): e for e in edits
+               if e['driver'] in driver_code and e['race'] in race_code}
+    if not targets:
+        return compact
+    points = list(compact['p'])
+    positions = list(compact['pos'])
+    type_points = [list(row) for row in compact['driver_type_points']]
+    # 全聯賽的名次次數也要更新 (countback 比較的名次可能出現或消失)
+    position_counts = [dict(pairs) for pairs in compact['type_position_counts']]
+    for i, key in enumerate(zip(compact['d'], compact['r'])):
+        edit = targets.pop(key, None)
+        if edit is None:
+            continue
+        new_points, new_position = edited_result(edit, points[i], positions[i])
+        race_type = compact['race_type'][key[1]]
+        type_points[key[0]][race_type] += new_points - points[i]
+        counts = position_counts[race_type]
+        if positions[i] is not None:
+            counts[positions[i]] -= 1
+        if new_position is not None:
+            counts[new_position] = counts.get(new_position, 0) + 1
+        points[i], positions[i] = new_points, new_position
+        if not targets:
+            break
+    type_position_counts = [[[position, count] for position, count in sorted(counts.items()) if count > 0]
+                            for counts in position_counts]
+    return dict(compact, p=points, pos=positions, driver_type_points=type_points,
+                type_position_counts=type_position_counts)
@@ -0,0 +1,326 @@
+import contextvars
+import functools
+import hmac
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from datetime import date
+
+from flask import jsonify, request
+
+from sqlalchemy import select, tuple_
+
+from database_setup import Race, Result, Driver, get_data_version
+from whatif import edited_result, normalize_edit
+
+# ====================================================================
+# 批次寫入 API：一次送出整個比賽週末的成績
+# ====================================================================
+#
+# POST /api/results   (Authorization: Bearer <F1_ADMIN_TOKEN>)
+# {
+#   "races": [
+#     {"name": "匈牙利衝刺賽", "type": "Sprint", "date": "2026-01-08",
+#      "results": [{"driver_name": "mimicethan", "points": 8, "position": 1}, ...]},
+#     {"name": "匈牙利正賽", "type": "Race", "date": "2026-01-08", "results": [...]}
+#   ]
+# }
+#
+# 1. 先一次查出所有車手 / 比賽，做整批驗證 (任何錯誤都整批拒絕)
+# 2. 通過後在同一個 transaction 內寫入 (已存在的成績會被覆寫，方便修正判罰)；
+#    比賽以 (名稱, 類型, 日期) 對應，同名但日期不同 (下一個賽季) 會建立新的比賽，不會改動舊的
+# 3. 所有寫入都交給單一 writer thread 排隊執行，網頁讀取不會被卡住
+#
+# POST /api/results/edits   (同樣需要 Authorization)
+# {"edits": [{"driver": "mimicethan", "race": "匈牙利正賽", "points": 18, "position": 2, "disqualified": false}]}
+# 把儀表板「假設情境」沙盒中的修改寫入資料庫 (格式與沙盒相同，見 whatif.py)
+
+RACE_TYPES = ('Sprint', 'Race')
+ADMIN_TOKEN_ENV = 'F1_ADMIN_TOKEN'
+
+
+class PayloadError(ValueError):
+    """整批資料驗證失敗 (errors 內含每一筆錯誤訊息)"""
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+# ----------------------------------------------------
+# 1. 單一寫入佇列 (所有寫入依序執行，避免 SQLite 寫鎖互相競爭)
+# ----------------------------------------------------
+class WriterQueue:
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='f1-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            func, future = self._jobs.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func())
+                except Exception as e:
+                    future.set_exception(e)
+            self._jobs.task_done()
+
+    def submit(self, func):
+        """把寫入工作排進佇列，回傳 Future (在呼叫端的 context 內執行，才會寫入同一個聯賽)"""
+        self._ensure_started()
+        future = Future()
+        self._jobs.put((functools.partial(contextvars.copy_context().run, func), future))
+        return future
+
+
+writer_queue = WriterQueue()
+
+
+# ----------------------------------------------------
+# 2. 整批驗證
+# ----------------------------------------------------
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def race_key(name, race_type, race_date):
+    """比賽以 (名稱, 類型, 日期) 對應：同名但日期不同 (例如下一個賽季) 是另一場比賽"""
+    return name, race_type, race_date.isoformat() if isinstance(race_date, date) else race_date
+
+def validate_payload(session, payload):
+    """驗證整個週末的資料，回傳 (races, drivers_by_name)；有錯誤時丟出 PayloadError"""
+    errors = []
+    races = payload.get('races') if isinstance(payload, dict) else None
+    if not isinstance(races, list) or not races:
+        raise PayloadError(['payload 必須包含非空的 "races" 陣列'])
+
+    seen_races = set()
+    driver_names = set()
+    for i, race_info in enumerate(races):
+        label = f'races[{i}]'
+        if not isinstance(race_info, dict):
+            errors.append(f'{label}: 必須是物件')
+            continue
+        # 先檢查型別再放進 set (list / dict 無法雜湊，不能讓它變成 500)
+        valid = True
+        race_name, race_type = race_info.get('name'), race_info.get('type')
+        if not isinstance(race_name, str) or not race_name:
+            errors.append(f'{label}: 比賽名稱 name 必須是非空字串')
+            valid = False
+        if not isinstance(race_type, str) or race_type not in RACE_TYPES:
+            errors.append(f'{label}: type 必須是 {" / ".join(RACE_TYPES)}')
+            valid = False
+        try:
+            race_info['date'] = _parse_date(race_info.get('date'))
+        except (TypeError, ValueError):
+            errors.append(f'{label}: date 必須是 YYYY-MM-DD 格式')
+            valid = False
+        if valid:
+            key = race_key(race_name, race_type, race_info['date'])
+            if key in seen_races:
+                errors.append(f'{label}: 比賽 {race_name} ({race_type}, {key[2]}) 重複出現')
+            seen_races.add(key)
+
+        results = race_info.get('results')
+        if not isinstance(results, list) or not results:
+            errors.append(f'{label}: results 必須是非空陣列')
+            continue
+        seen_drivers, seen_positions = set(), set()
+        for j, result_info in enumerate(results):
+            rlabel = f'{label}.results[{j}]'
+            if not isinstance(result_info, dict):
+                errors.append(f'{rlabel}: 必須是物件')
+                continue
+            name = result_info.get('driver_name')
+            if not isinstance(name, str) or not name:
+                errors.append(f'{rlabel}: driver_name 必須是非空字串')
+            elif name in seen_drivers:
+                errors.append(f'{rlabel}: 車手 {name} 在同一場比賽重複出現')
+            else:
+                seen_drivers.add(name)
+                driver_names.add(name)
+            points, position = result_info.get('points'), result_info.get('position')
+            if not _is_int(points) or points < 0:
+                errors.append(f'{rlabel}: points 必須是非負整數')
+            if not _is_int(position) or position < 1:
+                errors.append(f'{rlabel}: position 必須是正整數')
+            elif position in seen_positions:
+                errors.append(f'{rlabel}: 名次 {position} 重複')
+            else:
+                seen_positions.add(position)
+
+    # 一次查出所有車手 (而不是每筆成績查一次)
+    drivers = session.query(Driver).filter(Driver.name.in_(driver_names)).all() if driver_names else []
+    drivers_by_name = {d.name: d for d in drivers}
+    for name in sorted(driver_names - set(drivers_by_name)):
+        errors.append(f'錯誤：找不到車手 {name}')
+
+    if errors:
+        raise PayloadError(errors)
+    return races, drivers_by_name
+
+
+# ----------------------------------------------------
+# 3. 單一 transaction 寫入
+# ----------------------------------------------------
+def apply_race_weekend(Session, payload):
+    """驗證並寫入整個週末的成績 (全部成功或全部失敗)"""
+    session = Session()
+    try:
+        races, drivers_by_name = validate_payload(session, payload)
+
+        # 一次查出已存在的比賽與成績
+        race_names = {r['name'] for r in races}
+        existing_races = {
+            race_key(race.name, race.type, race.date): race
+            for race in session.query(Race).filter(Race.name.in_(race_names)).all()
+        }
+        inserted = updated = 0
+        for race_info in races:
+            race = existing_races.get(race_key(race_info['name'], race_info['type'], race_info['date']))
+            if race is None:
+                race = Race(name=race_info['name'], type=race_info['type'], date=race_info['date'].isoformat())
+                session.add(race)
+                session.flush()
+                existing_results = {}
+            else:
+                existing_results = {
+                    result.driver_id: result
+                    for result in session.query(Result).filter_by(race_id=race.race_id).all()
+                }
+
+            for result_info in race_info['results']:
+                driver = drivers_by_name[result_info['driver_name']]
+                result = existing_results.get(driver.driver_id)
+                if result is None:
+                    session.add(Result(
+                        driver_id=driver.driver_id,
+                        race_id=race.race_id,
+                        points=result_info['points'],
+                        position=result_info['position']
+                    ))
+                    inserted += 1
+                elif (result.points, result.position) != (result_info['points'], result_info['position']):
+                    result.points = result_info['points']
+                    result.position = result_info['position']
+                    updated += 1
+
+        session.commit()
+        version = get_data_version(session.connection())
+        return {'races': len(races), 'inserted': inserted, 'updated': updated, 'version': version}
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def apply_result_edits(Session, payload):
+    """寫入假設情境的修改 (只能修改已存在的成績；全部成功或全部失敗)"""
+    edits = payload.get('edits') if isinstance(payload, dict) else None
+    if not isinstance(edits, list) or not edits:
+        raise PayloadError(['payload 必須包含非空的 "edits" 陣列'])
+    errors, normalized = [], {}
+    for i, edit in enumerate(edits):
+        try:
+            edit = normalize_edit(edit)
+        except ValueError as e:
+            errors.append(f'edits[{i}]: {e}')
+            continue
+        normalized[(edit['driver'], edit['race'])] = edit
+    if errors:
+        raise PayloadError(errors)
+
+    session = Session()
+    try:
+        # 一次查出所有要修改的成績
+        stmt = (select(Driver.name, Race.name, Result)
+                .join(Result, Driver.driver_id == Result.driver_id)
+                .join(Race, Race.race_id == Result.race_id)
+                .where(tuple_(Driver.name, Race.name).in_(list(normalized)))
+                .order_by(Result.result_id))
+        results = {}
+        for driver_name, race_name, result in session.execute(stmt):
+            results.setdefault((driver_name, race_name), result)
+        for driver_name, race_name in normalized.keys() - results.keys():
+            errors.append(f'錯誤：找不到 {driver_name} 在 {race_name} 的成績')
+        if errors:
+            raise PayloadError(sorted(errors))
+
+        updated = 0
+        for key, edit in normalized.items():
+            result = results[key]
+            points, position = edited_result(edit, result.points, result.position)
+            if (result.points, result.position) != (points, position):
+                result.points, result.position = points, position
+                updated += 1
+        session.commit()
+        version = get_data_version(session.connection())
+        return {'edits': len(normalized), 'updated': updated, 'version': version}
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+# ----------------------------------------------------
+# 4. 註冊 HTTP 路由
+# ----------------------------------------------------
+def _authorized():
+    token = os.environ.get(ADMIN_TOKEN_ENV)
+    if not token:
+        return False
+    supplied = request.headers.get('Authorization', '')
+    return hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode())
+
+def register_write_api(server, Session, on_commit=None, timeout=30):
+    """在 Flask server 上註冊 POST /api/results 與 /api/results/edits；on_commit 用來刷新衍生快取"""
+
+    def handle_write(apply):
+        if not os.environ.get(ADMIN_TOKEN_ENV):
+            return jsonify(error=f'寫入 API 未啟用 (未設定 {ADMIN_TOKEN_ENV})'), 503
+        if not _authorized():
+            return jsonify(error='未授權'), 401
+        payload = request.get_json(silent=True)
+        if payload is None:
+            return jsonify(error='請求內容必須是 JSON'), 400
+
+        def job():
+            summary = apply(Session, payload)
+            # 資料已經寫入：快取刷新失敗只記錄下來，不能回 500 (用戶端會重送而重複寫入)
+            if on_commit is not None:
+                try:
+                    on_commit()
+                except Exception:
+                    server.logger.exception('寫入後刷新快取失敗')
+            return summary
+
+        try:
+            summary = writer_queue.submit(job).result(timeout=timeout)
+        except PayloadError as e:
+            return jsonify(error='資料驗證失敗', details=e.errors), 400
+        except TimeoutError:
+            return jsonify(error='寫入仍在佇列中處理，請稍後確認資料版本'), 202
+        return jsonify(summary), 200
+
+    @server.route('/api/results', methods=['POST'])
+    def post_race_results():
+        return handle_write(apply_race_weekend)
+
+    @server.route('/api/results/edits', methods=['POST'])
+    def post_result_edits():
+        return handle_write(apply_result_edits)
+
+    return post_race_results